@@ -1,18 +1,130 @@
 import logging
-from typing import List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
 
 import faiss
-import torch
-import torch.nn.functional as F
+import numpy as np
 
-from auto_align.encoders.encoder_factory import get_encoder
+from auto_align.checkpoint import AlignmentCheckpoint, sentences_digest
+from auto_align.embedding_store import EmbeddingStore
+from auto_align.prefilter import CandidateFilter
+from auto_align.encoders.base_encoder import as_embedding_matrix
+from auto_align.encoders.encoder_factory import get_encoder, resolve_encoder_name
+from auto_align.profiling import maybe_stage
+from auto_align.progress import AlignmentObserver, make_reporter
+from auto_align.reduction import apply_reduction, check_reduction, transform_digest
+
+# Sentences per encode call when progress is being reported.
+_PROGRESS_CHUNK = 4096
+# Target rows converted and added to the index at a time when they are not
+# already an in-memory float32 matrix (e.g. memory-mapped float16 shards).
+_ADD_CHUNK = 65536
 
 logger = logging.getLogger(__name__)
 
 
+def encode_normalized(encoder, sentences: List[str], lang: str) -> np.ndarray:
+    """
+    Encode sentences and return L2-normalized float32 embeddings as a NumPy array,
+    ready for inner-product (cosine) search. The encoder's buffer is normalized
+    in place, so no copy is made when it follows the BaseEncoder contract.
+    """
+    embeddings = as_embedding_matrix(encoder.encode(sentences, lang=lang))
+    faiss.normalize_L2(embeddings)
+    return embeddings
+
+
+def search_aligned(src_emb: np.ndarray, tgt_emb: np.ndarray, threshold: float = 0.7,
+                   topk=5, batch_size=512,
+                   checkpoint: Optional[AlignmentCheckpoint] = None,
+                   profiler=None, reporter=None,
+                   prefilter: Optional[CandidateFilter] = None,
+                   collect: bool = True) -> List[Tuple[int, int, float]]:
+    """
+    Exact inner-product search of normalized source embeddings against target embeddings.
+    Either side may also be an embedding_store.EmbeddingStore, read block by block.
+    With a checkpoint, every finished source block is saved and blocks saved
+    by an earlier run are reused instead of searched again. A progress.ProgressReporter,
+    if given, is updated after every block. Retrieved pairs rejected by `prefilter`
+    are left out of the result and collected in prefilter.dropped. With
+    collect=False pairs only reach the reporter and an empty list is returned.
+    :return: List of tuples (src_index, tgt_index, score) with score >= threshold,
+             at most topk per source row.
+    """
+    if len(src_emb) == 0 or len(tgt_emb) == 0:
+        return []
+
+    with maybe_stage(profiler, "index_build", items=len(tgt_emb)):
+        d = src_emb.shape[1]
+        idx = faiss.IndexFlatIP(d)
+        if isinstance(tgt_emb, np.ndarray) and tgt_emb.dtype == np.float32:
+            idx.add(tgt_emb)
+        else:
+            for start in range(0, len(tgt_emb), _ADD_CHUNK):
+                idx.add(np.ascontiguousarray(tgt_emb[start:start + _ADD_CHUNK], dtype=np.float32))
+
+    with maybe_stage(profiler, "search", items=len(src_emb)):
+        return _search_blocks(idx, src_emb, threshold, topk, batch_size, checkpoint, reporter, prefilter, collect)
+
+
+def _search_blocks(idx, src_emb, threshold, topk, batch_size, checkpoint, reporter, prefilter, collect=True):
+    aligned = []
+    if reporter is not None:
+        reporter.start_search(-(-len(src_emb) // batch_size))
+
+    for i in range(0, len(src_emb), batch_size):
+        if checkpoint is not None:
+            saved = checkpoint.load_block(i // batch_size)
+            if saved is not None:
+                saved = _prefiltered(prefilter, saved)
+                if collect:
+                    aligned.extend(saved)
+                if reporter is not None:
+                    reporter.searched(min(batch_size, len(src_emb) - i), saved)
+                continue
+
+        block = src_emb[i:i + batch_size]
+        D, I = idx.search(block, topk)
+        block_pairs = []
+        for bi, row in enumerate(D):
+            src_i = i + bi
+            for rank, score in enumerate(row):
+                if score < threshold:
+                    break
+                tgt_j = int(I[bi, rank])
+                block_pairs.append((src_i, tgt_j, float(score)))
+
+        if checkpoint is not None:
+            checkpoint.save_block(i // batch_size, block_pairs)
+        block_pairs = _prefiltered(prefilter, block_pairs)
+        if collect:
+            aligned.extend(block_pairs)
+        if reporter is not None:
+            reporter.searched(len(block), block_pairs)
+
+    return aligned
+
+
+def _prefiltered(prefilter, pairs):
+    # Applied after checkpointing, so saved blocks stay valid with other prefilter settings
+    if prefilter is None:
+        return pairs
+    kept, dropped = prefilter.filter_pairs(pairs)
+    prefilter.dropped.extend(dropped)
+    return kept
+
+
 def align_sentences(source_sentences: List[str], target_sentences: List[str],
                    src_lang: str, tgt_lang: str, encoder_name: str = None,
-                   threshold: float = 0.7, topk=5, batch_size=512) -> List[Tuple[int, int, float]]:
+                   threshold: float = 0.7, topk=5, batch_size=512,
+                   checkpoint_dir: Optional[str] = None, shard_size: int = 50000,
+                   profiler=None,
+                   observer: Optional[AlignmentObserver] = None,
+                   src_embeddings=None, tgt_embeddings=None,
+                   reduction=None,
+                   prefilter: Optional[CandidateFilter] = None,
+                   collect: bool = True) -> List[Tuple[int, int, float]]:
     """
     Align sentences from source and target lists using the specified encoder.
     :param source_sentences: List of sentences in the source language.
@@ -23,43 +135,209 @@ def align_sentences(source_sentences: List[str], target_sentences: List[str],
     :param threshold: Similarity threshold for considering a pair as aligned (0 <= threshold <= 1 for cosine similarity).
     :param topk: Number of nearest neighbors to consider.
     :param batch_size: Batch size for processing.
+    :param checkpoint_dir: Optional work directory; embeddings (in shards of shard_size
+                           sentences) and finished search blocks are saved there, and a rerun
+                           with the same inputs and parameters resumes from them.
+    :param shard_size: Sentences per checkpointed embedding shard.
+    :param profiler: Optional profiling.StageProfiler recording encoding, index build and search.
+    :param observer: Optional progress.AlignmentObserver notified as sentences are encoded
+                     and source blocks are searched. Without one no progress is tracked.
+    :param src_embeddings: Optional precomputed source embeddings: an embedding store
+                           directory written by `auto-align embed` (or an open EmbeddingStore).
+                           That side is then read from memory-mapped shards instead of being
+                           encoded; source_sentences may be None, and if given must be exactly
+                           the embedded sentences. With both sides precomputed no model is loaded.
+    :param tgt_embeddings: Same for the target side.
+    :param reduction: Optional fitted PCA/OPQ transform (faiss.VectorTransform or the path of
+                      one saved by `auto-align fit-reduction`) applied to both sides before indexing.
+    :param prefilter: Optional prefilter.CandidateFilter built on the same sentence lists. Retrieved
+                      pairs it rejects (length ratio, number/URL anchors) are dropped from the result;
+                      its stats() give the pruning ratio and its `dropped` list the removed pairs.
+    :param collect: With False, pairs are not kept in memory: they are only passed, block by block,
+                    to the observer's on_pairs (e.g. a writers.PairWriter) and an empty list is returned.
     :return: List of tuples (src_index, tgt_index, score) for each aligned pair,
              where indices refer to positions in the input lists, and score is the cosine similarity.
     """
-    logger.info(f"Starting alignment: {len(source_sentences)} source sentences, {len(target_sentences)} target sentences")
+    if not collect and observer is None:
+        raise ValueError("collect=False needs an observer to receive the aligned pairs")
+    src_store = _open_store(src_embeddings, source_sentences, "source", src_lang)
+    tgt_store = _open_store(tgt_embeddings, target_sentences, "target", tgt_lang)
+    stores = [store for store in (src_store, tgt_store) if store is not None]
+    if stores:
+        encoder_name = _store_encoder(stores, encoder_name, (src_lang, tgt_lang))
+    num_src = len(src_store) if src_store is not None else len(source_sentences)
+    num_tgt = len(tgt_store) if tgt_store is not None else len(target_sentences)
+
+    logger.info(f"Starting alignment: {num_src} source sentences, {num_tgt} target sentences")
     logger.info(f"Using encoder: {encoder_name or 'auto-selected'} (src_lang={src_lang}, tgt_lang={tgt_lang})")
 
-    encoder = get_encoder(encoder_name, languages=(src_lang, tgt_lang))
-    
-    src_embeddings = encoder.encode(source_sentences, lang=src_lang)
-    tgt_embeddings = encoder.encode(target_sentences, lang=tgt_lang)
+    encoder = None
+    if len(stores) < 2:
+        encoder = get_encoder(encoder_name, languages=(src_lang, tgt_lang))
+    reporter = make_reporter(observer, num_src, num_tgt)
 
-    if not isinstance(src_embeddings, torch.Tensor):
-        src_embeddings = torch.tensor(src_embeddings)
-    if not isinstance(tgt_embeddings, torch.Tensor):
-        tgt_embeddings = torch.tensor(tgt_embeddings)
-        
-    device = src_embeddings.device
-    tgt_embeddings = tgt_embeddings.to(device)
+    encoder_key = resolve_encoder_name(encoder_name, languages=(src_lang, tgt_lang))
+    transform = None
+    if reduction is not None:
+        transform = check_reduction(reduction, encoder_key, stores[0].shape[1] if stores else None)
 
-    src_emb = F.normalize(src_embeddings, dim=1).cpu().numpy().astype('float32')
-    tgt_emb = F.normalize(tgt_embeddings, dim=1).cpu().numpy().astype('float32')
+    checkpoint = None
+    if checkpoint_dir is not None:
+        if shard_size < 1:
+            raise ValueError(f"shard_size must be at least 1, got {shard_size}")
+        fingerprint = {
+            "source": src_store.digest() if src_store is not None else sentences_digest(source_sentences),
+            "target": tgt_store.digest() if tgt_store is not None else sentences_digest(target_sentences),
+            "src_lang": src_lang,
+            "tgt_lang": tgt_lang,
+            "encoder": encoder_key,
+            "threshold": threshold,
+            "topk": topk,
+            "batch_size": batch_size,
+            "shard_size": shard_size,
+        }
+        if transform is not None:
+            fingerprint["reduction"] = transform_digest(transform)
+        checkpoint = AlignmentCheckpoint(checkpoint_dir, fingerprint)
 
-    d = src_emb.shape[1]
-    idx = faiss.IndexFlatIP(d)
-    idx.add(tgt_emb)
+    def encode(sentences, lang, side):
+        store = src_store if side == "src" else tgt_store
+        if store is not None:
+            if reporter is not None:
+                reporter.encoded(len(store))
+            return store
+        if checkpoint is not None:
+            return checkpoint.encode_sharded(lambda batch: encode_normalized(encoder, batch, lang),
+                                             sentences, side, shard_size,
+                                             on_shard=reporter.encoded if reporter else None)
+        if reporter is None or not sentences:
+            return encode_normalized(encoder, sentences, lang)
+        chunks = []
+        for start in range(0, len(sentences), _PROGRESS_CHUNK):
+            chunks.append(encode_normalized(encoder, sentences[start:start + _PROGRESS_CHUNK], lang))
+            reporter.encoded(len(chunks[-1]))
+        return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
 
-    aligned = []
+    with maybe_stage(profiler, "encoding", items=num_src + num_tgt):
+        src_emb = encode(source_sentences, src_lang, "src")
+        tgt_emb = encode(target_sentences, tgt_lang, "tgt")
 
-    for i in range(0, len(src_emb), batch_size):
-        block = src_emb[i:i + batch_size]
-        D, I = idx.search(block, topk)
-        for bi, row in enumerate(D):
-            src_i = i + bi
-            for rank, score in enumerate(row):
-                if score < threshold:
-                    break
-                tgt_j = int(I[bi, rank])
-                aligned.append((src_i, tgt_j, float(score)))
+    if transform is not None:
+        check_reduction(transform, dim=src_emb.shape[1])
+        with maybe_stage(profiler, "reduction", items=num_src + num_tgt):
+            src_emb = apply_reduction(transform, src_emb)
+            tgt_emb = apply_reduction(transform, tgt_emb)
+        logger.info(f"Reduced embeddings from {transform.d_in} to {transform.d_out} dimensions")
 
+    aligned = search_aligned(src_emb, tgt_emb, threshold=threshold, topk=topk, batch_size=batch_size,
+                             checkpoint=checkpoint, profiler=profiler, reporter=reporter,
+                             prefilter=prefilter, collect=collect)
+    if prefilter is not None:
+        emitted = len(aligned) if collect else reporter.stats["pairs_emitted"]
+        logger.info(f"Prefilter dropped {len(prefilter.dropped)} of {emitted + len(prefilter.dropped)} "
+                    f"retrieved pairs ({prefilter.pruning_ratio:.1%} of checked candidates)")
+    if reporter is not None:
+        reporter.finish()
     return aligned
+
+
+def align_one_to_many(source_sentences: List[str], targets: Dict[str, List[str]], src_lang: str,
+                      encoder_name: str = None, threshold: float = 0.7, topk=5, batch_size=512,
+                      workers: Optional[int] = None,
+                      on_result: Optional[Callable[[str, List[Tuple[int, int, float]]], None]] = None,
+                      timings: Optional[Dict[str, float]] = None) -> Dict[str, List[Tuple[int, int, float]]]:
+    """
+    Align one source document against translations in several languages.
+    The source is encoded once per encoder in use (once in total unless
+    languages auto-select different encoders); each target language is then
+    encoded and searched against it in its own thread.
+    :param source_sentences: List of sentences in the source language.
+    :param targets: Target language code -> list of sentences in that language.
+    :param src_lang: Source language code.
+    :param encoder_name: Optional encoder for all pairs; by default selected per language pair.
+    :param threshold: Similarity threshold for considering a pair as aligned.
+    :param topk: Number of nearest neighbors to consider.
+    :param batch_size: Batch size for processing.
+    :param workers: Target languages processed at once. Default: all of them.
+    :param on_result: Optional callback(tgt_lang, pairs) called as soon as a language is done,
+                      e.g. to write its output while the others are still running.
+    :param timings: Optional dict filled with the seconds spent encoding the source
+                    ("encode_source") and encoding/searching each target ("encode_<lang>", "search_<lang>").
+    :return: Target language code -> list of tuples (src_index, tgt_index, score).
+    """
+    timings = {} if timings is None else timings
+    if not source_sentences:
+        return {lang: [] for lang in targets}
+    keys = {lang: resolve_encoder_name(encoder_name, languages=(src_lang, lang)) for lang in targets}
+    logger.info(f"Aligning {len(source_sentences)} {src_lang} sentences against {len(targets)} languages: "
+                + ", ".join(f"{lang} ({len(sents)}, {keys[lang]})" for lang, sents in targets.items()))
+
+    source_embeddings = {}
+    for key in dict.fromkeys(keys.values()):
+        started = time.perf_counter()
+        source_embeddings[key] = encode_normalized(get_encoder(key), source_sentences, src_lang)
+        timings["encode_source"] = timings.get("encode_source", 0.0) + time.perf_counter() - started
+
+    def align_target(lang):
+        if not targets[lang] or not source_sentences:
+            return []
+        started = time.perf_counter()
+        tgt_emb = encode_normalized(get_encoder(keys[lang]), targets[lang], lang)
+        encoded = time.perf_counter()
+        pairs = search_aligned(source_embeddings[keys[lang]], tgt_emb, threshold=threshold, topk=topk,
+                               batch_size=batch_size)
+        timings[f"encode_{lang}"] = encoded - started
+        timings[f"search_{lang}"] = time.perf_counter() - encoded
+        return pairs
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers or max(len(targets), 1)) as pool:
+        futures = {pool.submit(align_target, lang): lang for lang in targets}
+        for future in as_completed(futures):
+            lang = futures[future]
+            results[lang] = future.result()
+            logger.info(f"{src_lang}->{lang}: {len(results[lang])} aligned pairs")
+            if on_result is not None:
+                on_result(lang, results[lang])
+    return {lang: results[lang] for lang in targets}
+
+
+def _open_store(embeddings, sentences: Optional[List[str]], side: str, lang: str) -> Optional[EmbeddingStore]:
+    if embeddings is None:
+        if sentences is None:
+            raise ValueError(f"Either {side} sentences or precomputed {side} embeddings are required")
+        return None
+    store = embeddings if isinstance(embeddings, EmbeddingStore) else EmbeddingStore(embeddings)
+    if sentences is not None:
+        store.verify(sentences)
+    if store.lang != lang:
+        logger.warning(f"Precomputed {side} embeddings are for language '{store.lang}', not '{lang}'")
+    logger.info(f"Using precomputed {side} embeddings: {store}")
+    return store
+
+
+def alignment_encoder(encoder_name: Optional[str], languages: Tuple[str, str],
+                      stores: Tuple[Optional[EmbeddingStore], ...] = ()) -> str:
+    """
+    Registry key of the encoder an alignment runs with: the one the given
+    precomputed stores were made with (they must agree with each other and
+    with encoder_name), else the one resolve_encoder_name selects.
+    """
+    stores = [store for store in stores if store is not None]
+    if stores:
+        return _store_encoder(stores, encoder_name, languages)
+    return resolve_encoder_name(encoder_name, languages=languages)
+
+
+def _store_encoder(stores: List[EmbeddingStore], encoder_name: Optional[str], languages) -> str:
+    """The encoder every precomputed store agrees on; it must also match encoder_name if one is given."""
+    names = {store.encoder for store in stores}
+    if len(names) > 1:
+        raise ValueError(f"Precomputed embeddings come from different encoders: {', '.join(sorted(names))}")
+    dims = {store.shape[1] for store in stores}
+    if len(dims) > 1:
+        raise ValueError(f"Precomputed embeddings have different dimensions: {', '.join(map(str, sorted(dims)))}")
+    name = names.pop()
+    if encoder_name and resolve_encoder_name(encoder_name, languages) != name:
+        raise ValueError(f"Precomputed embeddings were made with '{name}', not '{encoder_name}'")
+    return name
@@ -1,17 +1,19 @@
 import logging
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 import torch
-import torch.nn.functional as F
 
+from auto_align.encoders.base_encoder import as_embedding_matrix, l2_normalize_
 from auto_align.encoders.encoder_factory import get_encoder
+from auto_align.prefilter import CandidateFilter
 
 logger = logging.getLogger(__name__)
 
 
 def align_sentences_no_faiss(source_sentences: List[str], target_sentences: List[str],
                            src_lang: str, tgt_lang: str, encoder_name: str = None,
-                           threshold: float = 0.7, topk=5, batch_size=512) -> List[Tuple[int, int, float]]:
+                           threshold: float = 0.7, topk=5, batch_size=512,
+                           prefilter: Optional[CandidateFilter] = None) -> List[Tuple[int, int, float]]:
     """
     Align sentences using direct cosine similarity computation without FAISS.
     Uses the same interface as the original align_sentences function.
@@ -23,6 +25,10 @@ def align_sentences_no_faiss(source_sentences: List[str], target_sentences: List
     :param threshold: Similarity threshold for considering a pair as aligned (0 <= threshold <= 1 for cosine similarity).
     :param topk: Number of nearest neighbors to consider.
     :param batch_size: Batch size for processing.
+    :param prefilter: Optional prefilter.CandidateFilter built on the same sentence lists. Pairs it
+                      rejects are masked out of each similarity block before top-k selection, so
+                      the top-k is taken among plausible candidates only. Pairs that would have
+                      been returned without it are collected in prefilter.dropped.
     :return: List of tuples (src_index, tgt_index, score) for each aligned pair,
              where indices refer to positions in the input lists, and score is the cosine similarity.
     """
@@ -31,19 +37,13 @@ def align_sentences_no_faiss(source_sentences: List[str], target_sentences: List
 
     encoder = get_encoder(encoder_name, languages=(src_lang, tgt_lang))
 
-    src_embeddings = encoder.encode(source_sentences, lang=src_lang)
-    tgt_embeddings = encoder.encode(target_sentences, lang=tgt_lang)
+    src_embeddings = l2_normalize_(as_embedding_matrix(encoder.encode(source_sentences, lang=src_lang)))
+    tgt_embeddings = l2_normalize_(as_embedding_matrix(encoder.encode(target_sentences, lang=tgt_lang)))
 
-    if not isinstance(src_embeddings, torch.Tensor):
-        src_embeddings = torch.tensor(src_embeddings)
-    if not isinstance(tgt_embeddings, torch.Tensor):
-        tgt_embeddings = torch.tensor(tgt_embeddings)
-    
-    device = src_embeddings.device
-    tgt_embeddings = tgt_embeddings.to(device)
-
-    src_emb = F.normalize(src_embeddings, dim=1)
-    tgt_emb = F.normalize(tgt_embeddings, dim=1)
+    # from_numpy shares the normalized buffers; only a GPU run copies them (to the device)
+    device = _search_device(encoder)
+    src_emb = torch.from_numpy(src_embeddings).to(device)
+    tgt_emb = torch.from_numpy(tgt_embeddings).to(device)
 
     aligned = []
 
@@ -51,6 +51,8 @@ def align_sentences_no_faiss(source_sentences: List[str], target_sentences: List
         src_batch = src_emb[i:i + batch_size]
         
         similarity = torch.mm(src_batch, tgt_emb.t())
+        if prefilter is not None:
+            similarity = _mask_candidates(prefilter, similarity, i, topk, threshold)
         
         for bi, scores in enumerate(similarity):
             src_i = i + bi
@@ -63,4 +65,30 @@ def align_sentences_no_faiss(source_sentences: List[str], target_sentences: List
                     break
                 aligned.append((src_i, int(tgt_j), score))
 
-    return aligned 
\ No newline at end of file
+    if prefilter is not None:
+        logger.info(f"Prefilter masked {prefilter.pruning_ratio:.1%} of {prefilter.checked} candidate pairs; "
+                    f"{len(prefilter.dropped)} pairs of the unrestricted search were excluded")
+    return aligned
+
+
+def _search_device(encoder) -> torch.device:
+    """The device the encoder's model runs on, else the best available one (mps, cuda, cpu)."""
+    device = getattr(getattr(encoder, "model", None), "device", None)
+    if device is not None:
+        return torch.device(device)
+    if torch.backends.mps.is_available():
+        return torch.device("mps")
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+
+def _mask_candidates(prefilter: CandidateFilter, similarity: torch.Tensor, start: int, topk: int,
+                     threshold: float) -> torch.Tensor:
+    allowed = torch.from_numpy(prefilter.block_mask(start, start + len(similarity))).to(similarity.device)
+    # Record what the unrestricted top-k would have returned, for the recall comparison
+    scores, indices = torch.topk(similarity, min(topk, similarity.shape[1]), dim=1)
+    rejected = (scores >= threshold) & ~torch.gather(allowed, 1, indices)
+    for bi, rank in rejected.nonzero().tolist():
+        prefilter.dropped.append((start + bi, int(indices[bi, rank]), float(scores[bi, rank])))
+    return similarity.masked_fill_(~allowed, float("-inf"))
@@ -0,0 +1,158 @@
+"""
+Manifest-driven batch alignment of many document pairs in one process.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Dict, List, Optional
+
+from auto_align.aligner import encode_normalized, search_aligned
+from auto_align.data import load_and_preprocess, infer_language
+from auto_align.encoders.encoder_factory import encoder_cache_stats, get_encoder, resolve_encoder_name
+from auto_align.writers import open_writer
+
+logger = logging.getLogger(__name__)
+
+
+def load_manifest(path: str, default_encoder: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Read a JSONL manifest with one document pair per line:
+    {"src": ..., "tgt": ..., "output": ..., "src_lang": ..., "tgt_lang": ..., "encoder": ...}
+    src, tgt and output are required; languages are inferred from file names when missing.
+    Entries without an encoder use default_encoder, else the one auto-selected for their languages.
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"{path}:{lineno}: invalid JSON: {e}") from e
+            missing = [key for key in ("src", "tgt", "output") if not entry.get(key)]
+            if missing:
+                raise ValueError(f"{path}:{lineno}: missing required field(s) {', '.join(missing)}")
+            entry["src_lang"] = (entry.get("src_lang") or infer_language(entry["src"])).lower()
+            entry["tgt_lang"] = (entry.get("tgt_lang") or infer_language(entry["tgt"])).lower()
+            entry["encoder"] = resolve_encoder_name(entry.get("encoder") or default_encoder,
+                                                    languages=(entry["src_lang"], entry["tgt_lang"]))
+            entries.append(entry)
+    logger.info(f"Loaded {len(entries)} document pairs from {path}")
+    return entries
+
+
+def _load_chunk(chunk, workers, cache_dir, near_dup_threshold):
+    docs = []
+    for entry in chunk:
+        try:
+            src = load_and_preprocess(entry["src"], workers=workers, cache_dir=cache_dir,
+                                      near_dup_threshold=near_dup_threshold)
+            tgt = load_and_preprocess(entry["tgt"], workers=workers, cache_dir=cache_dir,
+                                      near_dup_threshold=near_dup_threshold)
+            docs.append((src, tgt, None))
+        except Exception as e:
+            docs.append(([], [], f"{type(e).__name__}: {e}"))
+    return docs
+
+
+def _group_chunks(entries, group_size):
+    """Pairs sharing encoder and languages, in chunks of at most group_size."""
+    def key(entry):
+        return entry["encoder"], entry["src_lang"], entry["tgt_lang"]
+
+    for group_key, group in groupby(sorted(entries, key=key), key=key):
+        group = list(group)
+        for start in range(0, len(group), group_size):
+            yield group_key, group[start:start + group_size]
+
+
+def run_manifest(entries: List[Dict[str, str]], threshold: float = 0.7, topk=5, batch_size=512,
+                 group_size: int = 16, workers: int = 1, cache_dir: Optional[str] = None,
+                 near_dup_threshold: Optional[float] = None,
+                 summary_path: Optional[str] = None, output_format: str = "tsv") -> Dict[str, object]:
+    """
+    Align every manifest entry, keeping encoders loaded across pairs.
+    Pairs are grouped by (encoder, src_lang, tgt_lang); each chunk of up to
+    group_size pairs is encoded in one call per side, and the next chunk's
+    documents are extracted in a background thread while the current one is
+    encoded and searched. Each pair is written to its own output file, in
+    output_format (one of writers.OUTPUT_FORMATS); missing directories are created.
+    :return: summary with one record per pair plus totals (also written to summary_path).
+    """
+    started = time.perf_counter()
+    chunks = list(_group_chunks(entries, group_size))
+    records = []
+    encode_seconds = 0.0
+
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(_load_chunk, chunks[0][1], workers, cache_dir,
+                                  near_dup_threshold) if chunks else None
+        for n, ((encoder_key, src_lang, tgt_lang), chunk) in enumerate(chunks):
+            docs = pending.result()
+            if n + 1 < len(chunks):
+                pending = prefetch.submit(_load_chunk, chunks[n + 1][1], workers, cache_dir,
+                                          near_dup_threshold)
+
+            logger.info(f"Batch {n + 1}/{len(chunks)}: {len(chunk)} pairs, "
+                        f"encoder={encoder_key}, {src_lang}->{tgt_lang}")
+            src_all = [s for src, _, _ in docs for s in src]
+            tgt_all = [s for _, tgt, _ in docs for s in tgt]
+            t0 = time.perf_counter()
+            try:
+                encoder = get_encoder(encoder_key)
+                src_emb = encode_normalized(encoder, src_all, src_lang) if src_all else None
+                tgt_emb = encode_normalized(encoder, tgt_all, tgt_lang) if tgt_all else None
+            except Exception as e:
+                logger.error(f"Encoding batch {n + 1} failed: {e}")
+                docs = [(src, tgt, error or f"{type(e).__name__}: {e}") for src, tgt, error in docs]
+            encode_seconds += time.perf_counter() - t0
+
+            src_off = tgt_off = 0
+            for entry, (src, tgt, error) in zip(chunk, docs):
+                record = {key: entry[key] for key in ("src", "tgt", "output", "src_lang", "tgt_lang", "encoder")}
+                record.update(num_src=len(src), num_tgt=len(tgt), num_pairs=0)
+                if error is None and src and tgt:
+                    try:
+                        aligned = search_aligned(src_emb[src_off:src_off + len(src)],
+                                                 tgt_emb[tgt_off:tgt_off + len(tgt)],
+                                                 threshold=threshold, topk=topk, batch_size=batch_size)
+                        with open_writer(output_format, entry["output"], src, tgt,
+                                         entry["src_lang"], entry["tgt_lang"]) as writer:
+                            writer.write(aligned)
+                        record["num_pairs"] = len(aligned)
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                elif error is None:
+                    error = "no sentences after preprocessing"
+                record["status"] = "ok" if error is None else "error"
+                if error is not None:
+                    record["error"] = error
+                    logger.error(f"{entry['src']} -> {entry['tgt']}: {error}")
+                records.append(record)
+                src_off += len(src)
+                tgt_off += len(tgt)
+
+    summary = {
+        "pairs": records,
+        "total_pairs": len(records),
+        "failed": sum(1 for r in records if r["status"] != "ok"),
+        "aligned_pairs": sum(r["num_pairs"] for r in records),
+        "encode_seconds": encode_seconds,
+        "elapsed_seconds": time.perf_counter() - started,
+        "encoder_cache": encoder_cache_stats(),
+    }
+    logger.info(f"Batch finished: {summary['total_pairs']} document pairs, {summary['failed']} failed, "
+                f"{summary['aligned_pairs']} aligned sentence pairs in {summary['elapsed_seconds']:.1f}s")
+    if summary_path:
+        directory = os.path.dirname(summary_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Batch summary saved to {summary_path}")
+    return summary
@@ -0,0 +1,98 @@
+"""
+Work-directory checkpoints that let an interrupted alignment run resume.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def sentences_digest(sentences: List[str]) -> str:
+    h = hashlib.sha256()
+    for s in sentences:
+        h.update(s.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class AlignmentCheckpoint:
+    """
+    Stores encoded embedding shards and completed source search blocks under
+    work_dir/<fingerprint>, where the fingerprint covers the inputs and every
+    parameter that affects the output. A rerun with the same inputs and
+    parameters reuses what is there; anything else starts a fresh directory.
+    """
+
+    def __init__(self, work_dir: str, fingerprint: Dict[str, object]):
+        key = json.dumps(fingerprint, sort_keys=True)
+        self.fingerprint = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        self.root = os.path.join(work_dir, self.fingerprint[:16])
+        os.makedirs(self.root, exist_ok=True)
+        meta = os.path.join(self.root, "fingerprint.json")
+        if not os.path.exists(meta):
+            with open(meta, "w", encoding="utf-8") as f:
+                json.dump(fingerprint, f, indent=2)
+        logger.info(f"Checkpoint directory: {self.root}")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.npy")
+
+    def load(self, name: str) -> Optional[np.ndarray]:
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable checkpoint {path}: {e}")
+            return None
+
+    def save(self, name: str, array: np.ndarray):
+        # Write then rename, so a crash never leaves a truncated file behind.
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+
+    def encode_sharded(self, encode: Callable[[List[str]], np.ndarray], sentences: List[str],
+                       side: str, shard_size: int,
+                       on_shard: Optional[Callable[[int], None]] = None) -> np.ndarray:
+        """
+        Encode sentences shard by shard, reusing shards saved by an earlier run.
+        on_shard, if given, is called with each shard's sentence count.
+        """
+        if not sentences:
+            # Nothing to shard; the encoder still gives the (0, dim) array callers expect
+            return encode(sentences)
+        shards = []
+        reused = 0
+        for k, start in enumerate(range(0, len(sentences), shard_size)):
+            name = f"{side}_emb_{k:05d}"
+            shard = self.load(name)
+            if shard is None:
+                shard = encode(sentences[start:start + shard_size])
+                self.save(name, shard)
+            else:
+                reused += 1
+            shards.append(shard)
+            if on_shard is not None:
+                on_shard(len(shard))
+        if reused:
+            logger.info(f"Resumed {reused}/{len(shards)} {side} embedding shards from checkpoint")
+        return np.concatenate(shards) if len(shards) > 1 else shards[0]
+
+    def load_block(self, block: int) -> Optional[List[Tuple[int, int, float]]]:
+        rows = self.load(f"block_{block:06d}")
+        if rows is None:
+            return None
+        return [(int(i), int(j), float(score)) for i, j, score in rows]
+
+    def save_block(self, block: int, pairs: List[Tuple[int, int, float]]):
+        # float64 holds the indices and the float32 search scores exactly.
+        self.save(f"block_{block:06d}", np.array(pairs, dtype=np.float64).reshape(-1, 3))
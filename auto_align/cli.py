@@ -1,25 +1,355 @@
 import argparse
 import logging
+import os
+import random
 import sys
+import time
 from pathlib import Path
+from typing import List, Tuple
 
-from auto_align import aligner, evaluation
-from auto_align.data import parse_tmx, load_and_preprocess
+import numpy as np
+
+from auto_align import aligner, batch, collection, evaluation, hierarchical, matching, reduction
+from auto_align.profiling import StageProfiler, maybe_stage
+from auto_align.prefilter import CandidateFilter
+from auto_align.progress import ConsoleProgress, ObserverGroup
+from auto_align.writers import OUTPUT_FORMATS, open_writer
+from auto_align.embedding_store import EmbeddingStore, write_embedding_store
+from auto_align.encoders.encoder_factory import configure_encoder_cache, get_encoder, resolve_encoder_name
+from auto_align.data import BLOCK_LEVELS, parse_tmx, load_and_preprocess, load_structured, infer_language
 
 import nltk
 nltk.download('punkt_tab')
 
+# The hash-based stub encoder produces no meaningful alignments; it is offered
+# only when UKRAA_STUB_ENCODER=1 is set, for tests and benchmarks
+ENCODER_CHOICES = ["labse", "laser", "laser2", "sbert"]
+if os.environ.get("UKRAA_STUB_ENCODER") == "1":
+    ENCODER_CHOICES.append("stub")
+
+def embed_main(argv):
+    parser = argparse.ArgumentParser(prog="auto-align embed",
+                                     description="Encode a document once and save its embeddings as "
+                                                 "memory-mappable shards for later alignment runs.")
+    parser.add_argument("input", help="Document to embed (any format accepted by --src-file)")
+    parser.add_argument("--output-dir", "-o", required=True, help="Directory for the shards and manifest.json")
+    parser.add_argument("--lang", "-l", help="Language code of the document. Default: inferred from the file name")
+    parser.add_argument("--other-lang",
+                        help="Language it will be aligned with; picks the same encoder alignment would "
+                             "auto-select for the pair. Ignored with --encoder")
+    parser.add_argument("--encoder", "-e", choices=ENCODER_CHOICES,
+                        help="Which encoder to use. Default: auto-selected as for alignment")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16",
+                        help="Stored precision. Default=float16 (half the disk and page cache)")
+    parser.add_argument("--shard-size", type=int, default=50000, help="Sentences per shard. Default=50000")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Worker processes for extraction, segmentation and preprocessing. Default=1")
+    parser.add_argument("--near-dup-threshold", type=float, default=None,
+                        help="Same as for alignment; must match the alignment run's setting")
+    parser.add_argument("--cache-dir", default=os.environ.get("UKRAA_CACHE_DIR"),
+                        help="Directory for cached extracted sentences. Default=$UKRAA_CACHE_DIR")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging (debug mode).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    if not Path(args.input).exists():
+        logger.error(f"Input not found: {args.input}")
+        sys.exit(1)
+    lang = (args.lang or infer_language(args.input) or "").lower()
+    if not lang:
+        logger.error("Could not infer the language; please supply --lang.")
+        sys.exit(1)
+
+    sentences = load_and_preprocess(args.input, workers=args.workers, cache_dir=args.cache_dir,
+                                    near_dup_threshold=args.near_dup_threshold)
+    languages = (lang, args.other_lang.lower()) if args.other_lang else None
+    encoder_key = resolve_encoder_name(args.encoder, languages=languages)
+    try:
+        encoder = get_encoder(encoder_key)
+        write_embedding_store(args.output_dir, lambda batch: encoder.encode(batch, lang=lang), sentences,
+                              encoder_key, lang, shard_size=args.shard_size, dtype=args.dtype)
+    except ImportError as ie:
+        logger.error(f"Embedding failed due to missing dependency or model: {ie}")
+        sys.exit(1)
+
+
+def _paired_sample(num_src: int, num_tgt: int, size: int, rng: random.Random) -> Tuple[List[int], List[int]]:
+    """
+    Sorted sentence positions to sample from each side of a parallel pair,
+    taken at the same relative positions of both documents (identical when
+    they have equally many sentences), so sampled translations stay together.
+    """
+    if num_src <= size and num_tgt <= size:
+        return list(range(num_src)), list(range(num_tgt))
+    longer = max(num_src, num_tgt)
+    picks = rng.sample(range(longer), size)
+    return sorted({p * num_src // longer for p in picks}), sorted({p * num_tgt // longer for p in picks})
+
+
+def fit_reduction_main(argv):
+    parser = argparse.ArgumentParser(prog="auto-align fit-reduction",
+                                     description="Fit a PCA/OPQ reduction for a language pair on sample "
+                                                 "documents and report its quality/speed trade-off.")
+    parser.add_argument("--src-file", "-s", required=True, help="Sample source document")
+    parser.add_argument("--tgt-file", "-t", required=True, help="Sample target document")
+    parser.add_argument("--src-lang", "-sl", help="Source language code. Default: inferred from the file name")
+    parser.add_argument("--tgt-lang", "-tl", help="Target language code. Default: inferred from the file name")
+    parser.add_argument("--encoder", "-e", choices=ENCODER_CHOICES,
+                        help="Which encoder to use. Default: auto-selected as for alignment")
+    parser.add_argument("--method", choices=list(reduction.METHODS), default="pca", help="Default=pca")
+    parser.add_argument("--dim", type=int, default=256, help="Reduced dimension. Default=256")
+    parser.add_argument("--sample-size", type=int, default=20000,
+                        help="Sentences per side used for fitting and the report. Default=20000")
+    parser.add_argument("--threshold", "-th", type=float, default=0.7, help="Threshold for the report. Default=0.7")
+    parser.add_argument("--topk", "-k", type=int, default=5)
+    parser.add_argument("--output-dir", "-o", default=os.environ.get("UKRAA_REDUCTION_DIR", "reductions"),
+                        help="Where to save the transform and its JSON report. "
+                             "Default=$UKRAA_REDUCTION_DIR or ./reductions")
+    parser.add_argument("--workers", "-w", type=int, default=1)
+    parser.add_argument("--cache-dir", default=os.environ.get("UKRAA_CACHE_DIR"))
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging (debug mode).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    src_lang = (args.src_lang or infer_language(args.src_file) or "").lower()
+    tgt_lang = (args.tgt_lang or infer_language(args.tgt_file) or "").lower()
+    if not (src_lang and tgt_lang):
+        logger.error("Could not infer languages; please supply --src-lang and --tgt-lang.")
+        sys.exit(1)
+
+    documents = [load_and_preprocess(path, workers=args.workers, cache_dir=args.cache_dir)
+                 for path in (args.src_file, args.tgt_file)]
+    positions = _paired_sample(len(documents[0]), len(documents[1]), args.sample_size, random.Random(0))
+    samples = [[sentences[k] for k in picks] for sentences, picks in zip(documents, positions)]
+
+    encoder_key = resolve_encoder_name(args.encoder, languages=(src_lang, tgt_lang))
+    try:
+        encoder = get_encoder(encoder_key)
+        src_emb = aligner.encode_normalized(encoder, samples[0], src_lang)
+        tgt_emb = aligner.encode_normalized(encoder, samples[1], tgt_lang)
+        transform = reduction.fit_reduction(np.concatenate([src_emb, tgt_emb]), method=args.method, dim=args.dim)
+    except (ImportError, ValueError) as e:
+        logger.error(f"Fitting the reduction failed: {e}")
+        sys.exit(1)
+
+    report = reduction.reduction_report(transform, src_emb, tgt_emb, threshold=args.threshold, topk=args.topk)
+    report.update(encoder=encoder_key, src_lang=src_lang, tgt_lang=tgt_lang, method=args.method)
+    path = os.path.join(args.output_dir,
+                        reduction.reduction_filename(encoder_key, src_lang, tgt_lang, args.method, args.dim))
+    reduction.save_reduction(transform, path, report)
+    if reduction.preferred_reduction(src_lang, tgt_lang) != (args.method, args.dim):
+        logger.info(f"To use it automatically, add ({src_lang!r}, {tgt_lang!r}): ({args.method!r}, {args.dim}) "
+                    f"to PREFERRED_REDUCTION, or pass --reduction {path}")
+
+
+def mine_main(argv):
+    parser = argparse.ArgumentParser(prog="auto-align mine",
+                                     description="Mine sentence pairs from two folders of documents with no "
+                                                 "known pairing: documents are matched first, then sentences "
+                                                 "are aligned within candidate document pairs.")
+    parser.add_argument("src_dir", help="Folder of source-language documents (searched recursively)")
+    parser.add_argument("tgt_dir", help="Folder of target-language documents")
+    parser.add_argument("--src-lang", "-sl", required=True, help="Source language code")
+    parser.add_argument("--tgt-lang", "-tl", required=True, help="Target language code")
+    parser.add_argument("--encoder", "-e", choices=ENCODER_CHOICES,
+                        help="Which encoder to use. Default: auto-selected for the language pair")
+    parser.add_argument("--threshold", "-th", type=float, default=0.7,
+                        help="Sentence similarity threshold. Default=0.7")
+    parser.add_argument("--topk", "-k", type=int, default=5,
+                        help="Nearest target sentences considered per source sentence. Default=5")
+    parser.add_argument("--batch-size", "-b", type=int, default=512, help="Default=512")
+    parser.add_argument("--doc-topk", type=int, default=2,
+                        help="Nearest documents (in both directions) kept as candidates. Default=2")
+    parser.add_argument("--doc-threshold", type=float, default=0.5,
+                        help="Minimum cosine similarity of two document vectors (mean sentence "
+                             "embeddings) for a candidate pair. Default=0.5")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Processes for loading documents and threads for aligning candidate pairs. Default=1")
+    parser.add_argument("--embeddings-dir", default=os.environ.get("UKRAA_EMBEDDINGS_DIR"),
+                        help="Cache of per-document sentence embeddings, so reruns and growing collections "
+                             "only encode new documents. Default=$UKRAA_EMBEDDINGS_DIR, disabled if unset")
+    parser.add_argument("--near-dup-threshold", type=float, default=None,
+                        help="Same as for alignment")
+    parser.add_argument("--cache-dir", default=os.environ.get("UKRAA_CACHE_DIR"),
+                        help="Directory for cached extracted sentences. Default=$UKRAA_CACHE_DIR")
+    parser.add_argument("--output", "-o", default="mined_pairs.tsv",
+                        help="Output: src_doc, tgt_doc, src, tgt, score per line. Default='mined_pairs.tsv'")
+    parser.add_argument("--summary", default="mine_summary.json",
+                        help="Summary JSON with every candidate document pair. Default='mine_summary.json'")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging (debug mode).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    for folder in (args.src_dir, args.tgt_dir):
+        if not os.path.isdir(folder):
+            logger.error(f"Not a directory: {folder}")
+            sys.exit(1)
+    try:
+        collection.run_collection(args.src_dir, args.tgt_dir, args.src_lang.lower(), args.tgt_lang.lower(),
+                                  args.output,
+                                  encoder_name=args.encoder,
+                                  threshold=args.threshold,
+                                  topk=args.topk,
+                                  batch_size=args.batch_size,
+                                  doc_topk=args.doc_topk,
+                                  doc_threshold=args.doc_threshold,
+                                  workers=args.workers,
+                                  cache_dir=args.cache_dir,
+                                  embeddings_dir=args.embeddings_dir,
+                                  near_dup_threshold=args.near_dup_threshold,
+                                  summary_path=args.summary)
+    except ImportError as ie:
+        logger.error(f"Mining failed due to missing dependency or model: {ie}")
+        sys.exit(1)
+
+
+def evaluate_main(argv):
+    parser = argparse.ArgumentParser(prog="auto-align evaluate",
+                                     description="Score an alignment written with --output-format index "
+                                                 "against a gold alignment, without re-parsing text output.")
+    parser.add_argument("pairs", help="Binary index file of aligned pairs and their sentences")
+    parser.add_argument("--gold", "-g", required=True, help="Path to gold alignment file")
+    parser.add_argument("--gold-format", choices=["text", "index"], default="text",
+                        help="Gold file format, as for alignment. Default='text'")
+    parser.add_argument("--no-bertscore", action="store_true", help="Skip BERTScore (no model is loaded)")
+    parser.add_argument("--no-text-metrics", action="store_true",
+                        help="Only report precision/recall/F1 (skip TER, BLEU and chrF)")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Processes for TER/BLEU/chrF. Default=1")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging (debug mode).")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, format="%(levelname)s: %(message)s")
+    logger = logging.getLogger(__name__)
+
+    for path in (args.pairs, args.gold):
+        if not Path(path).exists():
+            logger.error(f"Not found: {path}")
+            sys.exit(1)
+    try:
+        predicted, source_sentences, target_sentences = evaluation.load_predicted_index(args.pairs)
+    except ValueError as ve:
+        logger.error(f"Could not read {args.pairs}: {ve}")
+        sys.exit(1)
+    if args.gold_format == "index":
+        gold_pairs = evaluation.load_gold_index_alignment(args.gold)
+    else:
+        gold_pairs = evaluation.load_gold_alignment(args.gold)
+    metrics = evaluation.evaluate_alignment(predicted, source_sentences, target_sentences, gold_pairs,
+                                            text_metrics=not args.no_text_metrics,
+                                            bertscore=not args.no_bertscore,
+                                            workers=args.workers)
+    for name, value in metrics.items():
+        print(f"{name}\t{value:.4f}")
+
+
+def language_output_path(path: str, lang: str) -> str:
+    """Output file for one target language: '{lang}' in path is replaced, else '.<lang>' goes before the suffix."""
+    if "{lang}" in path:
+        return path.replace("{lang}", lang)
+    root, ext = os.path.splitext(path)
+    return f"{root}.{lang}{ext}"
+
+
+def one_to_many_main(args, logger):
+    if not args.src_file:
+        logger.error("--tgt-files needs --src-file")
+        sys.exit(1)
+    paths = [args.src_file] + args.tgt_files
+    missing = [path for path in paths if not Path(path).exists()]
+    if missing:
+        logger.error(f"Not found: {', '.join(missing)}")
+        sys.exit(1)
+    if args.tgt_langs and len(args.tgt_langs) != len(args.tgt_files):
+        logger.error("--tgt-langs needs one language code per file in --tgt-files")
+        sys.exit(1)
+    src_lang = (args.src_lang or infer_language(args.src_file)).lower()
+    tgt_langs = [lang.lower() for lang in args.tgt_langs or [infer_language(path) for path in args.tgt_files]]
+    if not src_lang or not all(tgt_langs):
+        logger.error("Could not infer languages; please supply --src-lang and --tgt-langs.")
+        sys.exit(1)
+    if len(set(tgt_langs)) != len(tgt_langs):
+        logger.error(f"Target languages must differ, got {', '.join(tgt_langs)}")
+        sys.exit(1)
+    ignored = [flag for flag, value in (("--gold", args.gold), ("--checkpoint-dir", args.checkpoint_dir),
+                                        ("--src-emb", args.src_emb), ("--tgt-emb", args.tgt_emb),
+                                        ("--hierarchical", args.hierarchical), ("--prefilter", args.prefilter))
+               if value]
+    if ignored:
+        logger.warning(f"{', '.join(ignored)} not used with --tgt-files")
+
+    def load(path):
+        return load_and_preprocess(path, workers=args.workers, cache_dir=args.cache_dir,
+                                   near_dup_threshold=args.near_dup_threshold)
+
+    source_sentences = load(args.src_file)
+    targets = {lang: load(path) for lang, path in zip(tgt_langs, args.tgt_files)}
+
+    def write(lang, pairs):
+        output_path = language_output_path(args.output, lang)
+        try:
+            with open_writer(args.output_format, output_path, source_sentences, targets[lang],
+                             src_lang, lang) as writer:
+                writer.write(pairs)
+            logger.info(f"{src_lang}->{lang}: aligned pairs saved to {output_path} (total {len(pairs)} pairs).")
+        except Exception as e:
+            logger.error(f"Failed to write output file {output_path}: {e}")
+
+    timings = {}
+    try:
+        aligner.align_one_to_many(source_sentences, targets, src_lang,
+                                  encoder_name=args.encoder,
+                                  threshold=args.threshold,
+                                  topk=args.topk,
+                                  batch_size=args.batch_size,
+                                  on_result=write,
+                                  timings=timings)
+    except ImportError as ie:
+        logger.error(f"Alignment failed due to missing dependency or model: {ie}")
+        sys.exit(1)
+    except ValueError as ve:
+        logger.error(f"Alignment failed: {ve}")
+        sys.exit(1)
+    logger.info("Timings: " + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items()))
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "embed":
+        return embed_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "fit-reduction":
+        return fit_reduction_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "mine":
+        return mine_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "evaluate":
+        return evaluate_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(prog="ukraa-align", 
                                      description="Align sentences from a source and target text file using UKRAA aligner.")
 
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--src-file", "-s", help="Plain-text source file")
     group.add_argument("--tmx-file", "-x", help="TMX file (contains both sides)")
+    group.add_argument("--manifest", "-m",
+                       help="JSONL manifest of document pairs to align in one run "
+                            "(fields: src, tgt, output, optional src_lang, tgt_lang, encoder)")
     parser.add_argument("--tgt-file", "-t", help="Plain-text target file (ignored if --tmx-file is used)")
+    parser.add_argument("--tgt-files", nargs="+",
+                        help="Several translations of --src-file (instead of --tgt-file): the source is "
+                             "loaded and encoded once, the targets are encoded and searched concurrently, "
+                             "and one output per language is written")
+    parser.add_argument("--tgt-langs", nargs="+",
+                        help="Language codes of --tgt-files, in the same order. Default: inferred from file names")
+    parser.add_argument("--tmx-dedup", action="store_true",
+                        help="Drop repeated translation units while streaming the TMX file.")
     parser.add_argument("--src-lang", "-sl", help="Source language code (e.g. 'en'). Required for LASER/LASER2 encoders.")
     parser.add_argument("--tgt-lang", "-tl", help="Target language code (e.g. 'fr'). Required for LASER/LASER2 encoders.")
-    parser.add_argument("--encoder", "-e", choices=["labse", "laser", "laser2", "sbert"], 
+    parser.add_argument("--encoder", "-e", choices=ENCODER_CHOICES,
                         help="Which encoder to use. If not provided, selects automatically based on languages.")
     parser.add_argument("--threshold", "-th", type=float, default=0.7, 
                         help="Cosine similarity threshold for alignment (0 to 1). Default=0.7")
@@ -27,8 +357,90 @@ def main():
                         help="Number of nearest neighbors to consider for each source sentence. Default=5")
     parser.add_argument("--batch-size", "-b", type=int, default=512,
                         help="Batch size for processing embeddings. Default=512")
+    parser.add_argument("--checkpoint-dir",
+                        help="Work directory for resumable runs: embedding shards and finished search "
+                             "blocks are saved there, and rerunning with the same inputs and parameters "
+                             "resumes from the last completed block.")
+    parser.add_argument("--shard-size", type=int, default=50000,
+                        help="Sentences per embedding shard saved in --checkpoint-dir. A run only resumes "
+                             "from a checkpoint written with the same value. Default=50000")
+    parser.add_argument("--src-emb",
+                        help="Precomputed source embeddings (directory written by `auto-align embed`); "
+                             "the source is then not encoded. Its sentences must match --src-file after preprocessing")
+    parser.add_argument("--tgt-emb", help="Precomputed target embeddings, as --src-emb")
+    parser.add_argument("--reduction",
+                        help="Fitted PCA/OPQ transform (from `auto-align fit-reduction`) applied to both "
+                             "sides before indexing. Default: the one PREFERRED_REDUCTION configures for the "
+                             "language pair, if fitted in --reduction-dir")
+    parser.add_argument("--reduction-dir", default=os.environ.get("UKRAA_REDUCTION_DIR"),
+                        help="Directory of fitted reductions. Default=$UKRAA_REDUCTION_DIR")
+    parser.add_argument("--hierarchical", action="store_true",
+                        help="Keep paragraph/section structure, match blocks first by their mean embedding "
+                             "and align sentences only within matched blocks (for structured documents "
+                             "such as contracts; not with --tmx-file)")
+    parser.add_argument("--block-level", choices=BLOCK_LEVELS, default="section",
+                        help="With --hierarchical, align sections (opened by numbered or short heading "
+                             "paragraphs, falling back to paragraphs) or paragraphs. Default='section'")
+    parser.add_argument("--block-topk", type=int, default=2,
+                        help="With --hierarchical, target blocks matched to each source block. Default=2")
+    parser.add_argument("--block-window", type=int, default=1,
+                        help="With --hierarchical, neighbouring target blocks also searched on each side "
+                             "of a matched block. Default=1")
+    parser.add_argument("--prefilter", action="store_true",
+                        help="Drop retrieved pairs whose lengths differ too much or whose numbers/URLs do "
+                             "not match, and log the pruning ratio (and the recall cost, with --gold)")
+    parser.add_argument("--max-length-ratio", type=float, default=3.0,
+                        help="With --prefilter, the largest allowed length ratio of a pair after "
+                             "correcting for the corpus-wide ratio. Default=3.0")
+    parser.add_argument("--prefilter-punctuation", action="store_true",
+                        help="With --prefilter, also reject pairs where only one side is a question")
+    parser.add_argument("--workers", "-w", type=int, default=1,
+                        help="Worker processes for extraction, segmentation, preprocessing and "
+                             "evaluation metrics. Default=1")
+    parser.add_argument("--near-dup-threshold", type=float, default=None,
+                        help="Also drop near-duplicate sentences whose estimated Jaccard similarity "
+                             "(MinHash over character shingles) is at least this value, e.g. 0.8. "
+                             "Default: only exact duplicates are removed")
+    parser.add_argument("--cache-dir", default=os.environ.get("UKRAA_CACHE_DIR"),
+                        help="Directory for cached extracted sentences (keyed by file content). "
+                             "Default=$UKRAA_CACHE_DIR, caching disabled if unset")
+    parser.add_argument("--one-to-one", choices=matching.METHODS,
+                        help="Resolve the top-k candidates into a one-to-one alignment: 'greedy' (most similar "
+                             "pairs first, fastest) or 'lsa' (sparse linear assignment maximizing total "
+                             "similarity, needs scipy). Default: keep every pair above the threshold")
+    parser.add_argument("--save-graph",
+                        help="Save the candidate pairs as a sparse CSR similarity graph (.npz) before any "
+                             "one-to-one resolution")
     parser.add_argument("--output", "-o", default="aligned_output.txt", help="Output file path for aligned pairs. Default='aligned_output.txt'")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="tsv",
+                        help="Format of the aligned pairs: 'tsv' (src<TAB>tgt<TAB>score), 'jsonl', 'tmx', "
+                             "'parquet' or 'arrow' (need pyarrow), or 'index' (compact binary pairs of "
+                             "sentence indices plus a sentence table, read by `auto-align evaluate`). "
+                             "Pairs are written as each search block finishes unless they are needed "
+                             "afterwards (--gold, --one-to-one, --save-graph, --hierarchical). Default='tsv'")
+    parser.add_argument("--summary", default="batch_summary.json",
+                        help="Summary JSON written in --manifest mode. Default='batch_summary.json'")
+    parser.add_argument("--encoder-cache-mb", type=float, default=None,
+                        help="Memory budget (MB) for loaded encoder models; least recently used models "
+                             "are unloaded when it is exceeded. Default=$UKRAA_ENCODER_CACHE_MB, unbounded if unset")
+    parser.add_argument("--group-size", type=int, default=16,
+                        help="Document pairs encoded together in --manifest mode. Default=16")
     parser.add_argument("--gold", "-g", help="Path to gold alignment file (for evaluation). Optional.")
+    parser.add_argument("--gold-format", choices=["text", "index"], default="text",
+                        help="Gold file format: 'text' (src<TAB>tgt or src ||| tgt sentences) or "
+                             "'index' (src_idx<TAB>tgt_idx sentence positions). Default='text'")
+    parser.add_argument("--no-bertscore", action="store_true",
+                        help="Skip BERTScore during evaluation (no model is loaded); "
+                             "precision/recall/F1, TER, BLEU and chrF are still reported.")
+    parser.add_argument("--profile",
+                        help="Write a per-stage profile (wall/CPU time, peak RSS, throughput) to this "
+                             "JSON file and log it as a table.")
+    parser.add_argument("--profile-dump",
+                        help="With --profile, also write cProfile stats (pstats format) of the "
+                             "slowest stage to this file.")
+    parser.add_argument("--no-progress", action="store_true",
+                        help="Do not draw the encoding/search progress bar (it is only shown when "
+                             "stderr is a terminal).")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging (debug mode).")
     args = parser.parse_args()
 
@@ -38,15 +450,50 @@ def main():
     logger = logging.getLogger(__name__)
     logger.info("UKRAA Sentence Aligner CLI started.")
 
-    def infer_lang(path: Path):
-        stem = path.stem.lower()
-        return "".join(ch for ch in stem if ch.isalpha())
+    if args.encoder_cache_mb is not None:
+        configure_encoder_cache(args.encoder_cache_mb)
+
+    if args.manifest:
+        ignored = [flag for flag, value in (("--gold", args.gold), ("--checkpoint-dir", args.checkpoint_dir),
+                                            ("--src-emb", args.src_emb), ("--tgt-emb", args.tgt_emb),
+                                            ("--reduction", args.reduction), ("--hierarchical", args.hierarchical),
+                                            ("--prefilter", args.prefilter), ("--one-to-one", args.one_to_one),
+                                            ("--save-graph", args.save_graph), ("--profile", args.profile))
+                   if value]
+        if ignored:
+            logger.warning(f"{', '.join(ignored)} not used with --manifest")
+        try:
+            entries = batch.load_manifest(args.manifest, default_encoder=args.encoder)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read manifest: {e}")
+            sys.exit(1)
+        summary = batch.run_manifest(entries,
+                                     threshold=args.threshold,
+                                     topk=args.topk,
+                                     batch_size=args.batch_size,
+                                     group_size=args.group_size,
+                                     workers=args.workers,
+                                     cache_dir=args.cache_dir,
+                                     near_dup_threshold=args.near_dup_threshold,
+                                     summary_path=args.summary,
+                                     output_format=args.output_format)
+        sys.exit(1 if summary["failed"] else 0)
+
+    if args.tgt_files:
+        return one_to_many_main(args, logger)
+
+    if args.block_topk < 1 or args.block_window < 0:
+        logger.error("--block-topk must be at least 1 and --block-window at least 0")
+        sys.exit(1)
 
     # Determine language codes
     src_lang = args.src_lang
     tgt_lang = args.tgt_lang
 
     if args.tmx_file:
+        if args.hierarchical:
+            logger.error("--hierarchical needs document structure; use --src-file and --tgt-file")
+            sys.exit(1)
         if not (args.src_lang and args.tgt_lang):
             logger.error("When using --tmx-file you must also specify --src-lang and --tgt-lang")
             sys.exit(1)
@@ -64,9 +511,9 @@ def main():
             sys.exit(1)
 
         if not src_lang:
-            src_lang = infer_lang(src_path)
+            src_lang = infer_language(str(src_path))
         if not tgt_lang:
-            tgt_lang = infer_lang(tgt_path)
+            tgt_lang = infer_language(str(tgt_path))
 
     if not (src_lang and tgt_lang):
         logger.error("Could not infer languages; please supply --src-lang and --tgt-lang.")
@@ -76,43 +523,156 @@ def main():
     tgt_lang = tgt_lang.lower()
     logger.debug(f"Using languages: src={src_lang}, tgt={tgt_lang}")
 
+    profiler = StageProfiler(profile_code=bool(args.profile_dump)) if args.profile else None
+
     if args.tmx_file:
         logger.info(f"Reading TMX file {args.tmx_file}")
 
     if args.tmx_file:
         logger.info(f"Parsing TMX: {args.tmx_file}")
         logger.info(f"Parsing TMX: {args.tmx_file}")
-        source_sentences, target_sentences = parse_tmx(args.tmx_file, src_lang, tgt_lang)
+        with maybe_stage(profiler, "extraction") as stage:
+            source_sentences, target_sentences = parse_tmx(args.tmx_file, src_lang, tgt_lang,
+                                                           dedup=args.tmx_dedup)
+            stage["items"] = len(source_sentences)
+    elif args.hierarchical:
+        logger.info("Loading and preprocessing source with its structure…")
+        source_sentences, source_blocks = load_structured(args.src_file, workers=args.workers,
+                                                          cache_dir=args.cache_dir,
+                                                          near_dup_threshold=args.near_dup_threshold,
+                                                          level=args.block_level, profiler=profiler)
+        logger.info("Loading and preprocessing target with its structure…")
+        target_sentences, target_blocks = load_structured(args.tgt_file, workers=args.workers,
+                                                          cache_dir=args.cache_dir,
+                                                          near_dup_threshold=args.near_dup_threshold,
+                                                          level=args.block_level, profiler=profiler)
     else:
         logger.info("Loading and preprocessing source…")
-        source_sentences = load_and_preprocess(args.src_file)
+        source_sentences = load_and_preprocess(args.src_file, workers=args.workers,
+                                               cache_dir=args.cache_dir,
+                                               near_dup_threshold=args.near_dup_threshold,
+                                               profiler=profiler)
         logger.info("Loading and preprocessing target…")
-        target_sentences = load_and_preprocess(args.tgt_file)
+        target_sentences = load_and_preprocess(args.tgt_file, workers=args.workers,
+                                               cache_dir=args.cache_dir,
+                                               near_dup_threshold=args.near_dup_threshold,
+                                               profiler=profiler)
     logger.info(f"Source: {len(source_sentences)} sentences after cleanup")
     logger.info(f"Target: {len(target_sentences)} sentences after cleanup")
 
+    observer = ConsoleProgress() if sys.stderr.isatty() and not args.no_progress else None
+    output_path = Path(args.output)
+
+    # The reduction must match the encoder the embeddings come from, which for
+    # precomputed stores is recorded in their manifests (hierarchical runs use none)
+    src_store = tgt_store = reduction_path = None
+    if not args.hierarchical:
+        try:
+            src_store = EmbeddingStore(args.src_emb) if args.src_emb else None
+            tgt_store = EmbeddingStore(args.tgt_emb) if args.tgt_emb else None
+            encoder_key = aligner.alignment_encoder(args.encoder, (src_lang, tgt_lang), (src_store, tgt_store))
+            reduction_path = args.reduction or reduction.resolve_reduction(args.reduction_dir, encoder_key,
+                                                                           src_lang, tgt_lang)
+            if reduction_path:
+                store = src_store or tgt_store
+                reduction.check_reduction(reduction_path, encoder_key, store.shape[1] if store else None)
+        except ValueError as ve:
+            logger.error(f"Incompatible embeddings: {ve}")
+            sys.exit(1)
+
+    # Without post-processing, pairs go straight from each search block to the output file
+    writer = None
+    if not (args.hierarchical or args.gold or args.one_to_one or args.save_graph):
+        try:
+            writer = open_writer(args.output_format, output_path, source_sentences, target_sentences,
+                                 src_lang, tgt_lang, profiler=profiler)
+        except (ImportError, OSError, ValueError) as e:
+            logger.error(f"Failed to open output file {output_path}: {e}")
+            sys.exit(1)
+        observer = ObserverGroup([observer, writer]) if observer is not None else writer
+    aligned = False
     try:
-        aligned_pairs = aligner.align_sentences(source_sentences, target_sentences,
-                                               src_lang, tgt_lang,
-                                               encoder_name=args.encoder,
-                                               threshold=args.threshold,
-                                               topk=args.topk,
-                                               batch_size=args.batch_size)
+        prefilter = None
+        if args.prefilter:
+            prefilter = CandidateFilter(source_sentences, target_sentences,
+                                        max_length_ratio=args.max_length_ratio,
+                                        punctuation=args.prefilter_punctuation)
+        if args.hierarchical:
+            ignored = [flag for flag, value in (("--checkpoint-dir", args.checkpoint_dir), ("--src-emb", args.src_emb),
+                                                ("--tgt-emb", args.tgt_emb), ("--reduction", args.reduction))
+                       if value]
+            if ignored:
+                logger.warning(f"{', '.join(ignored)} not used with --hierarchical")
+            aligned_pairs = hierarchical.align_hierarchical(source_sentences, target_sentences,
+                                                            source_blocks, target_blocks,
+                                                            src_lang, tgt_lang,
+                                                            encoder_name=args.encoder,
+                                                            threshold=args.threshold,
+                                                            topk=args.topk,
+                                                            block_topk=args.block_topk,
+                                                            block_window=args.block_window,
+                                                            batch_size=args.batch_size,
+                                                            profiler=profiler,
+                                                            observer=observer,
+                                                            prefilter=prefilter)
+        else:
+            aligned_pairs = aligner.align_sentences(source_sentences, target_sentences,
+                                                   src_lang, tgt_lang,
+                                                   encoder_name=args.encoder,
+                                                   threshold=args.threshold,
+                                                   topk=args.topk,
+                                                   batch_size=args.batch_size,
+                                                   checkpoint_dir=args.checkpoint_dir,
+                                                   shard_size=args.shard_size,
+                                                   profiler=profiler,
+                                                   observer=observer,
+                                                   src_embeddings=src_store,
+                                                   tgt_embeddings=tgt_store,
+                                                   reduction=reduction_path,
+                                                   prefilter=prefilter,
+                                                   collect=writer is None)
+        aligned = True
     except ImportError as ie:
         logger.error(f"Alignment failed due to missing dependency or model: {ie}")
         exit(1)
+    except ValueError as ve:
+        logger.error(f"Alignment failed: {ve}")
+        exit(1)
     except Exception as e:
         logger.error(f"An unexpected error occurred during alignment: {e}")
         exit(1)
+    finally:
+        # A streamed file is finalized (closing tags, footer) only when alignment succeeded;
+        # otherwise the partial file is removed rather than left looking complete
+        if writer is not None:
+            if aligned:
+                with maybe_stage(profiler, "writing"):
+                    writer.close()
+            else:
+                writer.abort()
+
+    if args.save_graph or args.one_to_one:
+        graph = matching.SimilarityGraph.from_pairs(aligned_pairs, len(source_sentences), len(target_sentences))
+        if args.save_graph:
+            graph.save(args.save_graph)
+            logger.info(f"Similarity graph ({graph.nnz} pairs) saved to {args.save_graph}")
+        if args.one_to_one:
+            started = time.perf_counter()
+            try:
+                with maybe_stage(profiler, "resolution", items=graph.nnz):
+                    aligned_pairs = matching.resolve_one_to_one(graph, method=args.one_to_one)
+            except ImportError as ie:
+                logger.error(f"One-to-one resolution failed due to missing dependency: {ie}")
+                exit(1)
+            logger.info(f"One-to-one resolution took {time.perf_counter() - started:.2f}s")
 
-    output_path = Path(args.output)
     try:
-        with open(output_path, 'w', encoding='utf-8') as out:
-            for i, j, score in aligned_pairs:
-                src_text = source_sentences[i]
-                tgt_text = target_sentences[j]
-                out.write(f"{src_text}\t{tgt_text}\t{score:.4f}\n")
-        logger.info(f"Aligned pairs saved to {output_path} (total {len(aligned_pairs)} pairs).")
+        if writer is None:
+            with maybe_stage(profiler, "writing", items=len(aligned_pairs)), \
+                    open_writer(args.output_format, output_path, source_sentences, target_sentences,
+                                src_lang, tgt_lang) as writer:
+                writer.write(aligned_pairs)
+        logger.info(f"Aligned pairs saved to {output_path} (total {writer.count} pairs).")
     except Exception as e:
         logger.error(f"Failed to write output file: {e}")
 
@@ -121,40 +681,57 @@ def main():
         if not gold_path.exists():
             logger.error(f"Gold file not found: {gold_path}")
         else:
-            gold_pairs = evaluation.load_gold_alignment(str(gold_path))
-            metrics = evaluation.evaluate_alignment(
-                aligned_pairs,
-                source_sentences,
-                target_sentences,
-                gold_pairs
-            )
+            if args.gold_format == "index":
+                gold_pairs = evaluation.load_gold_index_alignment(str(gold_path))
+            else:
+                gold_pairs = evaluation.load_gold_alignment(str(gold_path))
+            with maybe_stage(profiler, "evaluation", items=len(gold_pairs)):
+                metrics = evaluation.evaluate_alignment(
+                    aligned_pairs,
+                    source_sentences,
+                    target_sentences,
+                    gold_pairs,
+                    bertscore=not args.no_bertscore,
+                    workers=args.workers
+                )
+
+            if prefilter is not None and metrics:
+                unfiltered = evaluation.evaluate_alignment(aligned_pairs + prefilter.dropped, source_sentences,
+                                                           target_sentences, gold_pairs,
+                                                           text_metrics=False, bertscore=False)
+                logger.info(f"Prefilter effect: recall {unfiltered['recall']:.3f} -> {metrics['recall']:.3f}, "
+                            f"precision {unfiltered['precision']:.3f} -> {metrics['precision']:.3f}")
 
             if not metrics:
                 logger.warning("No metrics were calculated. Gold file might be empty or in wrong format.")
             else:
-                precision = metrics.get('precision', 0.0)
-                recall = metrics.get('recall', 0.0)
-                f1 = metrics.get('f1', 0.0)
-                ter = metrics.get('ter', 1.0)
-                bleu = metrics.get('bleu', 0.0)
-                chrf = metrics.get('chrf', 0.0)
-                bert_p = metrics.get('bertscore_precision', 0.0)
-                bert_r = metrics.get('bertscore_recall', 0.0)
-                bert_f1 = metrics.get('bertscore_f1', 0.0)
-
-                with open(output_path, 'a', encoding='utf-8') as out:
-                    out.write(
-                        f"# "
-                        f"Precision={precision:.3f}, "
-                        f"Recall={recall:.3f}, "
-                        f"F1={f1:.3f}, "
-                        f"TER={ter:.3f}, "
-                        f"BLEU={bleu:.3f}, "
-                        f"CHRF={chrf:.3f}, "
-                        f"BERT-P={bert_p:.3f}, "
-                        f"BERT-R={bert_r:.3f}, "
-                        f"BERT-F1={bert_f1:.3f}\n"
-                    )
+                labels = [
+                    ('precision', 'Precision'),
+                    ('recall', 'Recall'),
+                    ('f1', 'F1'),
+                    ('ter', 'TER'),
+                    ('bleu', 'BLEU'),
+                    ('chrf', 'CHRF'),
+                    ('bertscore_precision', 'BERT-P'),
+                    ('bertscore_recall', 'BERT-R'),
+                    ('bertscore_f1', 'BERT-F1'),
+                ]
+                summary = ", ".join(f"{label}={metrics[key]:.3f}" for key, label in labels if key in metrics)
+
+                if args.output_format == "tsv":
+                    with open(output_path, 'a', encoding='utf-8') as out:
+                        out.write(f"# {summary}\n")
+                else:
+                    logger.info(f"Summary: {summary}")
+
+    if profiler is not None:
+        logger.info("Stage profile:\n" + profiler.format_table())
+        profiler.write_json(args.profile)
+        logger.info(f"Profile report saved to {args.profile}")
+        if args.profile_dump:
+            stage = profiler.dump_hottest(args.profile_dump)
+            if stage:
+                logger.info(f"cProfile stats for slowest stage '{stage}' saved to {args.profile_dump}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,219 @@
+"""
+Mining aligned sentences from two document collections with no known pairing.
+
+Every document is encoded once (optionally cached on disk by content), its
+document vector is the normalized mean of its sentence embeddings, candidate
+document pairs are retrieved from a flat index of document vectors, and
+sentences are aligned only within candidate pairs. The cost grows with the
+number of candidate pairs instead of with the square of all sentences.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from auto_align.aligner import encode_normalized, search_aligned
+from auto_align.checkpoint import sentences_digest
+from auto_align.data import format_extension, load_and_preprocess
+from auto_align.encoders.encoder_factory import encoder_cache_stats, get_encoder, resolve_encoder_name
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTENSIONS = (".txt", ".pdf", ".docx", ".csv", ".html", ".htm")
+# Sentences of several documents are encoded together, about this many per call
+_ENCODE_CHUNK = 4096
+
+
+def list_documents(folder: str) -> List[str]:
+    """Supported documents under folder (recursively, possibly compressed), sorted by path."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if format_extension(path) in DOCUMENT_EXTENSIONS:
+                paths.append(path)
+    return sorted(paths)
+
+
+def _load_document(path, cache_dir, near_dup_threshold):
+    try:
+        return load_and_preprocess(path, cache_dir=cache_dir, near_dup_threshold=near_dup_threshold)
+    except Exception as e:
+        logger.warning(f"Skipping {path}: {type(e).__name__}: {e}")
+        return []
+
+
+def load_documents(paths: List[str], workers: int = 1, cache_dir: Optional[str] = None,
+                   near_dup_threshold: Optional[float] = None) -> List[List[str]]:
+    """Preprocessed sentences of each document, loaded in `workers` processes; unreadable ones are empty."""
+    args = (paths, [cache_dir] * len(paths), [near_dup_threshold] * len(paths))
+    if workers <= 1:
+        return list(map(_load_document, *args))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_load_document, *args, chunksize=8))
+
+
+def embed_documents(docs: List[List[str]], encoder, encoder_key: str, lang: str,
+                    embeddings_dir: Optional[str] = None) -> List[Optional[np.ndarray]]:
+    """
+    Normalized sentence embeddings of each document (None for empty ones).
+    With embeddings_dir, they are cached there as float16 .npy files named by
+    the encoder, language and sentences, and cached ones are memory-mapped
+    instead of encoded again.
+    """
+    out: List[Optional[np.ndarray]] = [None] * len(docs)
+    paths = [None] * len(docs)
+    todo = []
+    for k, sentences in enumerate(docs):
+        if not sentences:
+            continue
+        if embeddings_dir:
+            paths[k] = os.path.join(embeddings_dir, encoder_key, lang, f"{sentences_digest(sentences)}.npy")
+            if os.path.exists(paths[k]):
+                out[k] = np.load(paths[k], mmap_mode="r")
+                continue
+        todo.append(k)
+    logger.info(f"{lang}: {len(todo)} documents to encode, {sum(e is not None for e in out)} cached")
+
+    group, size = [], 0
+    for position, k in enumerate(todo):
+        group.append(k)
+        size += len(docs[k])
+        if size < _ENCODE_CHUNK and position + 1 < len(todo):
+            continue
+        embeddings = encode_normalized(encoder, [s for g in group for s in docs[g]], lang)
+        offset = 0
+        for g in group:
+            out[g] = embeddings[offset:offset + len(docs[g])]
+            offset += len(docs[g])
+            if paths[g]:
+                # Use the stored precision right away, so a cached rerun gives the same scores
+                out[g] = out[g].astype(np.float16)
+                os.makedirs(os.path.dirname(paths[g]), exist_ok=True)
+                tmp = f"{paths[g]}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, out[g])
+                os.replace(tmp, paths[g])
+        group, size = [], 0
+    return out
+
+
+def document_vectors(embeddings: List[np.ndarray]) -> np.ndarray:
+    """Normalized mean sentence embedding of each document."""
+    vectors = np.stack([np.asarray(e, dtype=np.float32).mean(axis=0) for e in embeddings])
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def candidate_pairs(src_vectors: np.ndarray, tgt_vectors: np.ndarray, doc_topk: int = 2,
+                    doc_threshold: float = 0.5) -> List[Tuple[int, int, float]]:
+    """
+    Document pairs (src, tgt, score) where either document is among the
+    other's doc_topk nearest neighbours with cosine similarity >= doc_threshold.
+    """
+    pairs = {}
+    for queries, base, flip in ((src_vectors, tgt_vectors, False), (tgt_vectors, src_vectors, True)):
+        idx = faiss.IndexFlatIP(base.shape[1])
+        idx.add(base)
+        D, I = idx.search(queries, min(doc_topk, len(base)))
+        for q, (scores, hits) in enumerate(zip(D, I)):
+            for score, hit in zip(scores, hits):
+                if score < doc_threshold:
+                    break
+                pairs[(int(hit), q) if flip else (q, int(hit))] = float(score)
+    return sorted((s, t, score) for (s, t), score in pairs.items())
+
+
+def run_collection(src_dir: str, tgt_dir: str, src_lang: str, tgt_lang: str, output: str,
+                   encoder_name: Optional[str] = None, threshold: float = 0.7, topk=5, batch_size=512,
+                   doc_topk: int = 2, doc_threshold: float = 0.5, workers: int = 1,
+                   cache_dir: Optional[str] = None, embeddings_dir: Optional[str] = None,
+                   near_dup_threshold: Optional[float] = None,
+                   summary_path: Optional[str] = None) -> Dict[str, object]:
+    """
+    Mine sentence pairs between the documents of src_dir and tgt_dir.
+    Documents are loaded in `workers` processes and candidate pairs are
+    aligned in `workers` threads. Pairs are written to `output` as
+    src_doc<TAB>tgt_doc<TAB>src<TAB>tgt<TAB>score lines, in candidate order.
+    :return: summary with one record per candidate document pair plus totals
+             and stage timings (also written to summary_path).
+    """
+    started = time.perf_counter()
+    timings = {}
+    src_paths, tgt_paths = list_documents(src_dir), list_documents(tgt_dir)
+    logger.info(f"Collection: {len(src_paths)} {src_lang} documents in {src_dir}, "
+                f"{len(tgt_paths)} {tgt_lang} documents in {tgt_dir}")
+
+    t0 = time.perf_counter()
+    src_docs = load_documents(src_paths, workers, cache_dir, near_dup_threshold)
+    tgt_docs = load_documents(tgt_paths, workers, cache_dir, near_dup_threshold)
+    timings["loading_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    encoder_key = resolve_encoder_name(encoder_name, languages=(src_lang, tgt_lang))
+    encoder = get_encoder(encoder_key)
+    src_emb = embed_documents(src_docs, encoder, encoder_key, src_lang, embeddings_dir)
+    tgt_emb = embed_documents(tgt_docs, encoder, encoder_key, tgt_lang, embeddings_dir)
+    timings["encoding_s"] = time.perf_counter() - t0
+
+    # Candidate search only sees documents with sentences; map back to positions in the folders
+    src_ids = [k for k, e in enumerate(src_emb) if e is not None]
+    tgt_ids = [k for k, e in enumerate(tgt_emb) if e is not None]
+    t0 = time.perf_counter()
+    candidates = []
+    if src_ids and tgt_ids:
+        candidates = [(src_ids[s], tgt_ids[t], score) for s, t, score in candidate_pairs(
+            document_vectors([src_emb[k] for k in src_ids]), document_vectors([tgt_emb[k] for k in tgt_ids]),
+            doc_topk=doc_topk, doc_threshold=doc_threshold)]
+    timings["document_matching_s"] = time.perf_counter() - t0
+    compared = sum(len(src_docs[s]) * len(tgt_docs[t]) for s, t, _ in candidates)
+    exhaustive = sum(map(len, src_docs)) * sum(map(len, tgt_docs))
+    logger.info(f"{len(candidates)} candidate document pairs; {compared} of {exhaustive} sentence pairs to compare")
+
+    def align(candidate):
+        s, t, _ = candidate
+        return search_aligned(np.ascontiguousarray(src_emb[s], dtype=np.float32),
+                              np.ascontiguousarray(tgt_emb[t], dtype=np.float32),
+                              threshold=threshold, topk=topk, batch_size=batch_size)
+
+    t0 = time.perf_counter()
+    records = []
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for (s, t, doc_score), aligned in zip(candidates, pool.map(align, candidates)):
+            src_name, tgt_name = os.path.relpath(src_paths[s], src_dir), os.path.relpath(tgt_paths[t], tgt_dir)
+            for i, j, score in aligned:
+                out.write(f"{src_name}\t{tgt_name}\t{src_docs[s][i]}\t{tgt_docs[t][j]}\t{score:.4f}\n")
+            records.append({"src": src_paths[s], "tgt": tgt_paths[t], "doc_score": doc_score,
+                            "num_src": len(src_docs[s]), "num_tgt": len(tgt_docs[t]), "num_pairs": len(aligned)})
+    timings["alignment_s"] = time.perf_counter() - t0
+
+    summary = {
+        "documents": {"src": len(src_paths), "tgt": len(tgt_paths),
+                      "empty_src": len(src_paths) - len(src_ids), "empty_tgt": len(tgt_paths) - len(tgt_ids)},
+        "candidates": records,
+        "candidate_pairs": len(records),
+        "aligned_pairs": sum(r["num_pairs"] for r in records),
+        "sentence_pairs_compared": compared,
+        "sentence_pairs_exhaustive": exhaustive,
+        "timings": timings,
+        "elapsed_seconds": time.perf_counter() - started,
+        "encoder_cache": encoder_cache_stats(),
+    }
+    logger.info(f"Mined {summary['aligned_pairs']} sentence pairs from {len(records)} document pairs "
+                f"in {summary['elapsed_seconds']:.1f}s; written to {output}")
+    if summary_path:
+        directory = os.path.dirname(summary_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        logger.info(f"Collection summary saved to {summary_path}")
+    return summary
@@ -102,3 +102,11 @@ PREFERRED_ENCODER = {
 }
 
 DEFAULT_ENCODER = "labse"
+
+# Optional learned reduction of embeddings before indexing, per language pair:
+# (method, dimension) with method "pca" or "opq". The transform itself is
+# fitted with `auto-align fit-reduction` and looked up in --reduction-dir.
+# Pairs not listed are searched at the encoder's full dimension.
+PREFERRED_REDUCTION = {
+    # ("uk","en"): ("pca", 256),
+}
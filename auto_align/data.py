@@ -1,97 +1,622 @@
+import io
 import os
+import re
+import bz2
 import csv
+import gzip
+import json
+import lzma
+import hashlib
 import logging
-import docx2txt
+import zipfile
 
 from lxml import etree
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pdfminer.high_level import extract_text as pdf_extract
-from bs4 import BeautifulSoup
+from pdfminer.pdfpage import PDFPage
 
 import nltk
+from nltk.tokenize.punkt import PunktTokenizer
+
+from auto_align.near_dedup import remove_near_duplicates
+from auto_align.profiling import maybe_stage
+
 logger = logging.getLogger(__name__)
 
+# A blank line (optionally containing spaces/tabs) separates paragraphs;
+# raw text is only ever split for parallel segmentation at these points.
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n\s*")
+# Below this size the process pool costs more than it saves.
+_PARALLEL_MIN_CHARS = 200_000
+_CHUNKS_PER_WORKER = 4
+
+# Paragraphs that open a section in load_structured: numbered clauses
+# ("3.", "3.2", "IV."), keyword + number ("Article 5", "Стаття 5", "§ 2"),
+# and short unpunctuated lines, as HTML/DOCX headings usually are.
+_SECTION_HEADING = re.compile(
+    r"^\s*(?:(?:section|article|chapter|part|clause|schedule|annex|appendix|"
+    r"розділ|стаття|глава|частина|пункт|додаток|§)\s*[\dIVXLC]+|"
+    r"\d+(?:\.\d+)*\.(?=\s)|\d+(?:\.\d+)+(?=\s)|[IVXLC]+\.(?=\s))",
+    re.IGNORECASE)
+_HEADING_MAX_CHARS = 120
+BLOCK_LEVELS = ("section", "paragraph")
+
+# Bump whenever extraction or preprocessing output changes, so cached
+# sentence lists from older versions are never reused.
+EXTRACTOR_VERSION = "3"
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_DOCX_HEADER = re.compile(r"word/header[0-9]*\.xml")
+_DOCX_FOOTER = re.compile(r"word/footer[0-9]*\.xml")
+_HTML_SKIP_TAGS = {"script", "style", "template", "noscript"}
+# Block-level HTML elements; their boundaries become paragraph breaks.
+_HTML_BLOCK_TAGS = {"p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "li", "ul", "ol", "dl", "dt", "dd",
+                    "table", "tr", "section", "article", "header", "footer", "main", "nav", "aside",
+                    "blockquote", "pre", "figure", "figcaption", "form", "hr", "br", "body", "title"}
+_READ_CHUNK = 1 << 20
+
+# Compression is detected from magic bytes; these suffixes are only stripped
+# to find the underlying format extension (e.g. corpus.txt.zst -> .txt).
+COMPRESSED_SUFFIXES = {".gz", ".xz", ".zst", ".bz2"}
+_COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", "gzip"),
+    (b"\xfd7zXZ\x00", "xz"),
+    (b"\x28\xb5\x2f\xfd", "zstd"),
+    (b"BZh", "bz2"),
+)
+
+
+def _detect_compression(path):
+    with open(path, "rb") as f:
+        head = f.read(6)
+    for magic, kind in _COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def open_binary(path: str):
+    """Open path for binary reading, streaming-decompressing gzip/xz/zstd/bz2 content."""
+    kind = _detect_compression(path)
+    if kind is None:
+        return open(path, "rb")
+    logger.debug(f"Reading {kind}-compressed input {path}")
+    if kind == "gzip":
+        return gzip.open(path, "rb")
+    if kind == "xz":
+        return lzma.open(path, "rb")
+    if kind == "bz2":
+        return bz2.open(path, "rb")
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Reading zstd-compressed input requires the 'zstandard' package. "
+                          "Install it with `pip install zstandard`.") from e
+    return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True,
+                                                      closefd=True)
+
+
+def open_text(path: str, newline=None):
+    return io.TextIOWrapper(open_binary(path), encoding="utf-8", newline=newline)
+
+
+def format_extension(path: str) -> str:
+    """Lower-cased format extension, ignoring a trailing compression suffix."""
+    root, ext = os.path.splitext(path)
+    if ext.lower() in COMPRESSED_SUFFIXES:
+        ext = os.path.splitext(root)[1]
+    return ext.lower()
+
+
+def _pdf_page_count(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in PDFPage.get_pages(f))
+
+
+def _extract_pdf_pages(path, pages):
+    return pdf_extract(path, page_numbers=pages)
+
+
+def _extract_pdf(path, workers=1):
+    """Extract a PDF page-range by page-range in a process pool, in page order."""
+    if workers <= 1:
+        return pdf_extract(path)
+    num_pages = _pdf_page_count(path)
+    if num_pages < 2:
+        return pdf_extract(path)
+    step = -(-num_pages // (workers * _CHUNKS_PER_WORKER))
+    ranges = [list(range(i, min(i + step, num_pages))) for i in range(0, num_pages, step)]
+    logger.debug(f"Extracting {num_pages} PDF pages in {len(ranges)} ranges with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return "".join(pool.map(_extract_pdf_pages, [path] * len(ranges), ranges))
+
+
+def _docx_part_text(data):
+    """Stream one WordprocessingML part; same output as docx2txt.xml2text."""
+    parts = []
+    for event, el in etree.iterparse(io.BytesIO(data), events=("start", "end")):
+        tag = el.tag
+        if event == "start":
+            if tag == _W_NS + "p":
+                parts.append("\n\n")
+            elif tag == _W_NS + "tab":
+                parts.append("\t")
+            elif tag in (_W_NS + "br", _W_NS + "cr"):
+                parts.append("\n")
+        else:
+            if tag == _W_NS + "t":
+                parts.append(el.text or "")
+            el.clear(keep_tail=True)
+    return "".join(parts)
+
+
+def _extract_docx(path):
+    """Headers, body and footers of a .docx without building a DOM."""
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+        text = "".join(_docx_part_text(zf.read(n)) for n in names if _DOCX_HEADER.match(n))
+        text += _docx_part_text(zf.read("word/document.xml"))
+        text += "".join(_docx_part_text(zf.read(n)) for n in names if _DOCX_FOOTER.match(n))
+    return text.strip()
+
+
+class _HtmlTextCollector:
+    """lxml parser target that keeps text nodes outside script/style."""
+
+    def __init__(self):
+        self.strings = []
+        self._current = []
+        self._skip = 0
+
+    def _flush(self):
+        if self._current:
+            self.strings.append("".join(self._current))
+            self._current = []
+
+    def _break(self, tag):
+        # An empty string joins to a blank line, i.e. a paragraph break
+        if tag in _HTML_BLOCK_TAGS and self.strings and self.strings[-1]:
+            self.strings.append("")
 
-def extract_text(path: str) -> str:
-    ext = os.path.splitext(path)[1].lower()
+    def start(self, tag, attrib):
+        self._flush()
+        tag = tag.lower()
+        self._break(tag)
+        if tag in _HTML_SKIP_TAGS:
+            self._skip += 1
+
+    def end(self, tag):
+        self._flush()
+        tag = tag.lower()
+        self._break(tag)
+        if tag in _HTML_SKIP_TAGS and self._skip:
+            self._skip -= 1
+
+    def data(self, data):
+        if not self._skip:
+            self._current.append(data)
+
+    def close(self):
+        self._flush()
+        return "\n".join(self.strings)
+
+
+def _extract_html(f):
+    parser = etree.HTMLParser(target=_HtmlTextCollector(), encoding="utf-8")
+    for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+        parser.feed(chunk)
+    return parser.close()
+
+
+def _in_memory_if_compressed(path):
+    # PDF and DOCX readers need random access; decompress those into memory.
+    if _detect_compression(path) is None:
+        return path
+    with open_binary(path) as f:
+        return io.BytesIO(f.read())
+
+
+def infer_language(path: str) -> str:
+    """Guess a language code from a file name, e.g. data/uk.txt.gz -> 'uk'."""
+    name = os.path.basename(path)
+    root, ext = os.path.splitext(name)
+    if ext.lower() in COMPRESSED_SUFFIXES:
+        name = root
+    stem = os.path.splitext(name)[0].lower()
+    return "".join(ch for ch in stem if ch.isalpha())
+
+
+def save_aligned_pairs(path: str, aligned_pairs, source_sentences, target_sentences):
+    """Write aligned pairs as src<TAB>tgt<TAB>score lines."""
+    with open(path, 'w', encoding='utf-8') as out:
+        for i, j, score in aligned_pairs:
+            out.write(f"{source_sentences[i]}\t{target_sentences[j]}\t{score:.4f}\n")
+
+
+def extract_text(path: str, workers: int = 1) -> str:
+    """
+    Extract plain text from a .txt/.pdf/.docx/.csv/.html file.
+    gzip, xz, zstd and bz2 input (detected by magic bytes) is decompressed
+    while streaming, without intermediate files.
+    """
+    ext = format_extension(path)
     if ext == ".txt":
-        return open(path, "r", encoding="utf-8").read()
+        with open_text(path) as f:
+            return f.read()
     elif ext == ".pdf":
-        return pdf_extract(path)
+        source = _in_memory_if_compressed(path)
+        if not isinstance(source, str):
+            return pdf_extract(source)
+        return _extract_pdf(source, workers)
     elif ext == ".docx":
-        return docx2txt.process(path)
+        return _extract_docx(_in_memory_if_compressed(path))
     elif ext == ".csv":
-        with open(path, newline="", encoding="utf-8") as f:
+        with open_text(path, newline="") as f:
             reader = csv.reader(f)
             return "\n".join(row[0] for row in reader if row)
     elif ext in {".html", ".htm"}:
-        html = open(path, "r", encoding="utf-8").read()
-        return BeautifulSoup(html, "lxml").get_text(separator="\n")
+        with open_binary(path) as f:
+            return _extract_html(f)
     else:
         raise ValueError(f"Unsupported extension: {ext}")
 
 
-def preprocess(sentences, min_len=3, max_symbol_ratio=0.5):
-    """
-    - drop sent < min_len
-    - drop if non-alnum ratio > max_symbol_ratio
-    - dedup
-    """
+def _check_sentence(s, min_len, max_symbol_ratio):
+    """Return (reason, stripped) where reason is None for a kept sentence."""
+    s = s.strip()
+    if len(s) < min_len:
+        return "short", s
+    symbols = sum(1 for c in s if not c.isalnum() and not c.isspace())
+    if symbols / len(s) > max_symbol_ratio:
+        return "noisy", s
+    return None, s
+
+
+def _dedup_checked(checked, near_dup_threshold=None):
     stats = {"short": 0, "noisy": 0}
     filtered = []
-    for s in sentences:
-        s = s.strip()
-        if len(s) < min_len:
-            stats["short"] += 1
-            continue
-        symbols = sum(1 for c in s if not c.isalnum() and not c.isspace())
-        if symbols / len(s) > max_symbol_ratio:
-            stats["noisy"] += 1
+    for reason, s in checked:
+        if reason is not None:
+            stats[reason] += 1
             continue
         filtered.append(s)
     deduped = list(OrderedDict.fromkeys(filtered))
     stats["deduped"] = len(filtered) - len(deduped)
-    logger.info(
+    message = (
         f"Preprocess: removed {stats['short']} short, "
         f"{stats['noisy']} noisy, "
         f"{stats['deduped']} duplicates"
     )
+    if near_dup_threshold is not None:
+        kept = remove_near_duplicates(deduped, threshold=near_dup_threshold)
+        stats["near_duplicates"] = len(deduped) - len(kept)
+        deduped = kept
+        message += f", {stats['near_duplicates']} near-duplicates"
+    logger.info(message)
     return deduped
 
 
-def load_and_preprocess(path: str):
-    raw = extract_text(path)
-    sents = nltk.tokenize.sent_tokenize(raw)
-    return preprocess(sents)
+def preprocess(sentences, min_len=3, max_symbol_ratio=0.5, near_dup_threshold=None):
+    """
+    - drop sent < min_len
+    - drop if non-alnum ratio > max_symbol_ratio
+    - dedup
+    - if near_dup_threshold is set, drop near-duplicates (MinHash/LSH over
+      character shingles, estimated Jaccard >= near_dup_threshold)
+    """
+    return _dedup_checked((_check_sentence(s, min_len, max_symbol_ratio) for s in sentences),
+                          near_dup_threshold)
 
 
-def parse_tmx(path: str, src_code: str, tgt_code: str):
+@lru_cache(maxsize=None)
+def _punkt(language="english"):
+    return PunktTokenizer(language)
 
-    XML_NS = "http://www.w3.org/XML/1998/namespace"
-    tree = etree.parse(path)
-    root = tree.getroot()
 
-    src_sents, tgt_sents = [], []
-    for tu in root.findall(".//{*}tu"):
+def _split_paragraph_chunks(raw, num_chunks):
+    """
+    Split raw text into roughly num_chunks pieces, cutting only at blank lines.
+    Returns a list of (offset, chunk) with offsets into raw.
+    """
+    target = max(len(raw) // max(num_chunks, 1), 1)
+    chunks = []
+    start = 0
+    while start < len(raw):
+        m = _PARAGRAPH_BREAK.search(raw, start + target)
+        if m is None:
+            chunks.append((start, raw[start:]))
+            break
+        chunks.append((start, raw[start:m.start()]))
+        start = m.end()
+    return chunks
+
+
+def _segment_chunk(offset, chunk, min_len, max_symbol_ratio):
+    """Worker: sentence-split one chunk and filter each sentence."""
+    spans = []
+    for s, e in _punkt().span_tokenize(chunk):
+        reason, text = _check_sentence(chunk[s:e], min_len, max_symbol_ratio)
+        spans.append((offset + s, offset + e, reason, text))
+    return spans
+
+
+def _merge_chunk_spans(raw, chunk_spans, min_len, max_symbol_ratio):
+    """
+    Concatenate per-chunk spans in order, re-tokenizing every seam so that a
+    sentence Punkt would have carried across a paragraph break is rejoined
+    exactly as the serial tokenizer would produce it.
+    """
+    merged = []
+    for spans in chunk_spans:
+        if merged and spans:
+            left, right = merged[-1], spans[0]
+            window = raw[left[0]:right[1]]
+            seam = list(_punkt().span_tokenize(window))
+            if seam != [(0, left[1] - left[0]), (right[0] - left[0], right[1] - left[0])]:
+                merged.pop()
+                spans = spans[1:]
+                for s, e in seam:
+                    reason, text = _check_sentence(window[s:e], min_len, max_symbol_ratio)
+                    merged.append((left[0] + s, left[0] + e, reason, text))
+        merged.extend(spans)
+    return merged
+
+
+def preprocess_parallel(raw, workers, min_len=3, max_symbol_ratio=0.5, near_dup_threshold=None):
+    """
+    Sentence-split and preprocess raw text in a process pool.
+    Produces exactly the output of preprocess(sent_tokenize(raw)).
+    """
+    chunks = _split_paragraph_chunks(raw, workers * _CHUNKS_PER_WORKER)
+    logger.debug(f"Segmenting {len(chunks)} chunks with {workers} workers")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk_spans = list(pool.map(
+            _segment_chunk,
+            [offset for offset, _ in chunks],
+            [chunk for _, chunk in chunks],
+            [min_len] * len(chunks),
+            [max_symbol_ratio] * len(chunks),
+        ))
+    merged = _merge_chunk_spans(raw, chunk_spans, min_len, max_symbol_ratio)
+    return _dedup_checked(((reason, text) for _, _, reason, text in merged), near_dup_threshold)
+
+
+def _file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(cache_dir, path, **params):
+    """Cache file for path's content under the current extractor version and params."""
+    key = json.dumps({"sha256": _file_digest(path), "version": EXTRACTOR_VERSION, **params},
+                     sort_keys=True)
+    name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, name[:2], f"{name}.json")
+
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cache entry {cache_file}: {e}")
+        return None
+
+
+def _write_cache(cache_file, sentences):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(sentences, f, ensure_ascii=False)
+    os.replace(tmp, cache_file)
+
+
+def load_and_preprocess(path: str, workers: int = 1, cache_dir: str = None,
+                        near_dup_threshold: float = None, profiler=None):
+    """
+    Extract, sentence-split and preprocess a document.
+    With cache_dir set, the resulting sentences are cached by file content
+    hash and EXTRACTOR_VERSION, and later calls skip extraction entirely.
+    A profiling.StageProfiler passed as profiler records each stage.
+    """
+    cache_file = (_cache_path(cache_dir, path, near_dup_threshold=near_dup_threshold)
+                  if cache_dir else None)
+    if cache_file:
+        cached = _read_cache(cache_file)
+        if cached is not None:
+            logger.info(f"Loaded {len(cached)} sentences for {path} from cache")
+            return cached
+
+    with maybe_stage(profiler, "extraction") as stage:
+        raw = extract_text(path, workers=workers)
+        stage["items"] = len(raw)
+    if workers > 1 and len(raw) >= _PARALLEL_MIN_CHARS:
+        # Segmentation and filtering run together in the worker processes.
+        with maybe_stage(profiler, "segmentation") as stage:
+            sentences = preprocess_parallel(raw, workers, near_dup_threshold=near_dup_threshold)
+            stage["items"] = len(sentences)
+    else:
+        with maybe_stage(profiler, "segmentation") as stage:
+            sents = nltk.tokenize.sent_tokenize(raw)
+            stage["items"] = len(sents)
+        with maybe_stage(profiler, "preprocessing", items=len(sents)):
+            sentences = preprocess(sents, near_dup_threshold=near_dup_threshold)
+
+    if cache_file:
+        _write_cache(cache_file, sentences)
+    return sentences
+
+
+def _is_heading(paragraph):
+    if _SECTION_HEADING.match(paragraph):
+        return True
+    text = paragraph.strip()
+    return len(text) <= _HEADING_MAX_CHARS and not text.endswith((".", "!", "?", ":", ";", "…", '"', "»"))
+
+
+def _paragraph_blocks(paragraphs, level):
+    """Block id of each paragraph: the paragraph itself, or the section it belongs to."""
+    if level == "paragraph":
+        return list(range(len(paragraphs)))
+    ids, current = [], 0
+    for k, paragraph in enumerate(paragraphs):
+        if k and _is_heading(paragraph):
+            current += 1
+        ids.append(current)
+    if current == 0:
+        logger.info("No section headings found; using paragraphs as blocks")
+        return list(range(len(paragraphs)))
+    return ids
+
+
+def _segment_paragraphs(paragraphs, min_len, max_symbol_ratio):
+    """Worker: sentence-split and filter each paragraph of a chunk separately."""
+    return [[_check_sentence(s, min_len, max_symbol_ratio) for s in _punkt().tokenize(p)]
+            for p in paragraphs]
+
+
+def load_structured(path: str, workers: int = 1, cache_dir: str = None, near_dup_threshold: float = None,
+                    level: str = "section", profiler=None):
+    """
+    Like load_and_preprocess, but keeps the document structure: sentences
+    never span a paragraph break, and each comes with the id of its block,
+    i.e. the section (opened by a heading) or paragraph it is in. Documents
+    without headings fall back to paragraph blocks.
+    :return: (sentences, block_ids); block_ids are non-decreasing from 0.
+    """
+    if level not in BLOCK_LEVELS:
+        raise ValueError(f"Unknown block level '{level}'; expected one of {', '.join(BLOCK_LEVELS)}")
+    cache_file = (_cache_path(cache_dir, path, near_dup_threshold=near_dup_threshold, structure=level)
+                  if cache_dir else None)
+    if cache_file:
+        cached = _read_cache(cache_file)
+        if cached is not None:
+            logger.info(f"Loaded {len(cached['sentences'])} sentences for {path} from cache")
+            return cached["sentences"], cached["blocks"]
+
+    with maybe_stage(profiler, "extraction") as stage:
+        raw = extract_text(path, workers=workers)
+        stage["items"] = len(raw)
+    paragraphs = [p for p in _PARAGRAPH_BREAK.split(raw) if p.strip()]
+    paragraph_blocks = _paragraph_blocks(paragraphs, level)
+    min_len, max_symbol_ratio = 3, 0.5  # the preprocess() defaults
+
+    with maybe_stage(profiler, "segmentation") as stage:
+        if workers > 1 and len(raw) >= _PARALLEL_MIN_CHARS:
+            step = -(-len(paragraphs) // (workers * _CHUNKS_PER_WORKER))
+            chunks = [paragraphs[i:i + step] for i in range(0, len(paragraphs), step)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                checked = [sents for chunk in pool.map(_segment_paragraphs, chunks, [min_len] * len(chunks),
+                                                       [max_symbol_ratio] * len(chunks))
+                           for sents in chunk]
+        else:
+            checked = [[_check_sentence(s, min_len, max_symbol_ratio) for s in nltk.tokenize.sent_tokenize(p)]
+                       for p in paragraphs]
+        stage["items"] = sum(map(len, checked))
+
+    with maybe_stage(profiler, "preprocessing", items=stage["items"]):
+        first_block = {}
+        for block, sents in zip(paragraph_blocks, checked):
+            for reason, text in sents:
+                if reason is None:
+                    first_block.setdefault(text, block)
+        sentences = _dedup_checked((item for sents in checked for item in sents), near_dup_threshold)
+        # Renumber so blocks left without sentences do not leave gaps
+        renumbered = {}
+        blocks = [renumbered.setdefault(first_block[s], len(renumbered)) for s in sentences]
+    logger.info(f"{path}: {len(sentences)} sentences in {len(renumbered)} {level} blocks")
+
+    if cache_file:
+        _write_cache(cache_file, {"sentences": sentences, "blocks": blocks})
+    return sentences, blocks
+
+
+_XML_NS = "http://www.w3.org/XML/1998/namespace"
+# TMX inline elements that wrap native formatting codes rather than text.
+_TMX_CODE_TAGS = {"bpt", "ept", "ph", "it", "ut"}
+
+
+def _seg_text(el):
+    """Text of a <seg>, keeping <hi> content and dropping native-code markup."""
+    parts = [el.text or ""]
+    for child in el:
+        if isinstance(child.tag, str) and etree.QName(child).localname not in _TMX_CODE_TAGS:
+            parts.append(_seg_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def iter_tmx(source, src_code: str, tgt_code: str):
+    """
+    Stream (src, tgt) pairs from a TMX file path (optionally compressed) or
+    binary file object.
+    Each <tu> is discarded once read, so memory stays constant in file size.
+    """
+    if isinstance(source, str):
+        with open_binary(source) as f:
+            yield from iter_tmx(f, src_code, tgt_code)
+        return
+
+    for _, tu in etree.iterparse(source, events=("end",), tag="{*}tu"):
         src_text = None
         tgt_text = None
 
-        for tuv in tu.findall("{*}tuv"):
-            lang = tuv.get(f"{{{XML_NS}}}lang")
+        for tuv in tu.iterfind("{*}tuv"):
+            lang = tuv.get(f"{{{_XML_NS}}}lang")
             seg = tuv.find("{*}seg")
-            if seg is None or seg.text is None:
+            if seg is None:
                 continue
 
-            text = seg.text.strip()
+            text = _seg_text(seg).strip()
             if lang == src_code:
                 src_text = text
             elif lang == tgt_code:
                 tgt_text = text
 
+        tu.clear(keep_tail=True)
+        while tu.getprevious() is not None:
+            del tu.getparent()[0]
+
         # Only keep if we have both sides
         if src_text and tgt_text:
-            src_sents.append(src_text)
-            tgt_sents.append(tgt_text)
+            yield src_text, tgt_text
+
+
+def dedup_pairs(pairs):
+    """
+    Drop repeated (src, tgt) pairs from a stream, keeping first occurrences.
+    Only a 16-byte digest per distinct pair is held in memory.
+    """
+    seen = set()
+    for src, tgt in pairs:
+        key = hashlib.blake2b(f"{src}\0{tgt}".encode("utf-8"), digest_size=16).digest()
+        if key in seen:
+            continue
+        seen.add(key)
+        yield src, tgt
+
+
+def parse_tmx(path: str, src_code: str, tgt_code: str, dedup: bool = False):
+    """
+    Source and target sentence lists of a TMX file. The file is streamed
+    through iter_tmx (and dedup_pairs), so only the kept sentences are held
+    in memory, never the document tree; alignment needs both full lists.
+    """
+    pairs = iter_tmx(path, src_code, tgt_code)
+    if dedup:
+        pairs = dedup_pairs(pairs)
+
+    src_sents, tgt_sents = [], []
+    for src_text, tgt_text in pairs:
+        src_sents.append(src_text)
+        tgt_sents.append(tgt_text)
 
-    logging.getLogger(__name__).info(f"Parsed {len(src_sents)} units from TMX")
+    logger.info(f"Parsed {len(src_sents)} units from TMX")
     return src_sents, tgt_sents
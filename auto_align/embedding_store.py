@@ -0,0 +1,153 @@
+"""
+Precomputed sentence embeddings stored as memory-mappable .npy shards.
+
+A store is a directory holding shard_00000.npy, shard_00001.npy, ... (rows
+L2-normalized, float16 or float32), hashes.npy with a 64-bit hash per
+sentence, and manifest.json describing the encoder, language, count and
+dimension. Alignment reads the shards through memory mapping, so it needs
+neither the encoder model nor all embeddings in RAM at once.
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from auto_align.checkpoint import sentences_digest
+from auto_align.encoders.base_encoder import as_embedding_matrix, l2_normalize_
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+HASHES_NAME = "hashes.npy"
+STORE_FORMAT = 1
+DTYPES = ("float16", "float32")
+
+
+def sentence_hashes(sentences: List[str]) -> np.ndarray:
+    return np.fromiter((int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+                        for s in sentences), dtype=np.uint64, count=len(sentences))
+
+
+def _save_atomic(path: str, array: np.ndarray):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def write_embedding_store(out_dir: str, encode: Callable[[List[str]], object], sentences: List[str],
+                          encoder_name: str, lang: str, shard_size: int = 50000,
+                          dtype: str = "float16", on_shard: Optional[Callable[[int], None]] = None) -> str:
+    """
+    Encode sentences shard by shard with `encode` and write a store to out_dir.
+    Shards already present from an interrupted run with the same sentences
+    and settings are kept.
+    :return: path of the written manifest.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported embedding dtype '{dtype}'; expected one of {', '.join(DTYPES)}")
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    digest = sentences_digest(sentences)
+    settings = {"encoder": encoder_name, "lang": lang, "dtype": dtype, "shard_size": shard_size,
+                "sentences_sha256": digest}
+
+    # A partial manifest records the settings, so a rerun can tell whether
+    # shards already in out_dir belong to it.
+    reuse = False
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        reuse = all(previous.get(key) == value for key, value in settings.items())
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(dict(settings, format=STORE_FORMAT, complete=False), f, indent=2)
+
+    shards = []
+    dim = None
+    for k, start in enumerate(range(0, len(sentences), shard_size)):
+        name = f"shard_{k:05d}.npy"
+        path = os.path.join(out_dir, name)
+        batch = sentences[start:start + shard_size]
+        shard = np.load(path, mmap_mode="r") if reuse and os.path.exists(path) else None
+        if shard is None or len(shard) != len(batch):
+            shard = l2_normalize_(as_embedding_matrix(encode(batch))).astype(dtype, copy=False)
+            _save_atomic(path, shard)
+        dim = shard.shape[1]
+        shards.append({"file": name, "count": len(batch)})
+        if on_shard is not None:
+            on_shard(len(batch))
+
+    _save_atomic(os.path.join(out_dir, HASHES_NAME), sentence_hashes(sentences))
+    manifest = dict(settings, format=STORE_FORMAT, complete=True, count=len(sentences), dim=dim,
+                    normalized=True, shards=shards, sentence_hashes=HASHES_NAME)
+    tmp = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path)
+    logger.info(f"Wrote {len(sentences)} {lang} embeddings ({encoder_name}, {dtype}, "
+                f"{len(shards)} shard(s)) to {out_dir}")
+    return manifest_path
+
+
+class EmbeddingStore:
+    """
+    Read side of a store. Behaves like a read-only (count, dim) matrix for the
+    aligner: len(), .shape and row slicing, which returns float32 rows read
+    from the memory-mapped shards.
+    """
+
+    def __init__(self, path: str):
+        self.root = os.path.dirname(path) if path.endswith(".json") else path
+        manifest_path = os.path.join(self.root, MANIFEST_NAME)
+        if not os.path.exists(manifest_path):
+            raise ValueError(f"No embedding manifest found in {self.root}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format") != STORE_FORMAT or not self.manifest.get("complete"):
+            raise ValueError(f"Embedding store {self.root} is incomplete or has an unsupported format")
+        self.encoder = self.manifest["encoder"]
+        self.lang = self.manifest["lang"]
+        self.shape = (self.manifest["count"], self.manifest["dim"] or 0)
+        self._shards = [np.load(os.path.join(self.root, s["file"]), mmap_mode="r")
+                        for s in self.manifest["shards"]]
+        self._offsets = np.cumsum([0] + [len(s) for s in self._shards])
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, rows: slice) -> np.ndarray:
+        if not isinstance(rows, slice) or rows.step not in (None, 1):
+            raise TypeError("EmbeddingStore only supports contiguous row slices")
+        start, stop, _ = rows.indices(len(self))
+        if start >= stop:
+            return np.empty((0, self.shape[1]), dtype=np.float32)
+        first = int(np.searchsorted(self._offsets, start, side="right")) - 1
+        parts = []
+        k = first
+        while k < len(self._shards) and self._offsets[k] < stop:
+            lo = max(start - self._offsets[k], 0)
+            hi = min(stop - self._offsets[k], len(self._shards[k]))
+            parts.append(self._shards[k][lo:hi])
+            k += 1
+        block = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return np.ascontiguousarray(block, dtype=np.float32)
+
+    def digest(self) -> str:
+        return self.manifest["sentences_sha256"]
+
+    def verify(self, sentences: List[str]):
+        """Raise ValueError unless `sentences` are exactly the sentences that were embedded."""
+        if len(sentences) != len(self):
+            raise ValueError(f"Embedding store {self.root} holds {len(self)} sentences, got {len(sentences)}; "
+                             "were they preprocessed with the same settings?")
+        stored = np.load(os.path.join(self.root, self.manifest["sentence_hashes"]), mmap_mode="r")
+        mismatch = np.flatnonzero(stored != sentence_hashes(sentences))
+        if len(mismatch):
+            raise ValueError(f"Sentence {mismatch[0]} differs from the one embedded in {self.root} "
+                             f"({len(mismatch)} mismatches in total)")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.root!r}, encoder={self.encoder}, lang={self.lang}, shape={self.shape})"
@@ -1,11 +1,20 @@
 import logging
 from typing import List, Optional
 
+import numpy as np
+import torch
+
 logger = logging.getLogger(__name__)
 
 
 class BaseEncoder:
- 
+    """
+    Encoders return an (n, d) matrix that is either a C-contiguous float32
+    NumPy array or a float32 CPU torch tensor. The caller takes ownership:
+    the buffer is normalized in place and handed to the search without
+    further copies, so an encoder must not keep or reuse it.
+    """
+
     def __init__(self):
         pass
 
@@ -15,3 +24,22 @@ class BaseEncoder:
 
     def __repr__(self):
         return f"{self.__class__.__name__}()"
+
+
+def as_embedding_matrix(embeddings) -> np.ndarray:
+    """
+    Encoder output as a C-contiguous float32 NumPy array. Outputs that follow
+    the BaseEncoder contract come back as the same buffer (CPU tensors as a
+    view sharing their memory); anything else is copied exactly once.
+    """
+    if isinstance(embeddings, torch.Tensor):
+        embeddings = embeddings.detach().to("cpu", dtype=torch.float32).numpy()
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def l2_normalize_(embeddings: np.ndarray) -> np.ndarray:
+    """Scale the rows of a float32 matrix to unit length in place (all-zero rows stay zero)."""
+    norms = np.sqrt(np.einsum("ij,ij->i", embeddings, embeddings))
+    np.maximum(norms, 1e-12, out=norms)
+    embeddings /= norms[:, None]
+    return embeddings
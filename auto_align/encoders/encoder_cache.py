@@ -0,0 +1,188 @@
+"""
+Thread-safe, memory-bounded LRU cache of loaded encoder models.
+"""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_model_bytes(obj, _depth: int = 0, _seen=None) -> int:
+    """
+    Approximate memory held by an encoder: parameters and buffers of every
+    torch module, plus NumPy arrays, reachable through its attributes.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen or _depth > 4:
+        return 0
+    _seen.add(id(obj))
+
+    if isinstance(obj, torch.nn.Module):
+        total = 0
+        for t in list(obj.parameters()) + list(obj.buffers()):
+            if id(t) not in _seen:  # tied weights count once
+                _seen.add(id(t))
+                total += t.numel() * t.element_size()
+        return total
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (list, tuple)):
+        return sum(estimate_model_bytes(v, _depth + 1, _seen) for v in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_model_bytes(v, _depth + 1, _seen) for v in obj.values())
+    if hasattr(obj, "__dict__") and not isinstance(obj, type):
+        return sum(estimate_model_bytes(v, _depth + 1, _seen) for v in vars(obj).values())
+    return 0
+
+
+class EncoderCache:
+    """
+    LRU cache of encoders keyed by registry name, bounded by max_bytes of
+    estimated model memory (None for no bound). Before a model is loaded, the
+    least recently used unpinned ones are evicted until its expected size fits:
+    the size measured when it was last loaded, else size_hints[key] (0 if
+    neither is known); after loading, the measured size replaces the estimate
+    and eviction runs again if needed. Concurrent requests for a
+    model that is not loaded yet wait for a single load instead of each
+    loading their own copy. Only pinned models are protected from eviction:
+    use is not tracked, so evicting a model a caller still holds only drops
+    the cache's reference, and its memory is freed once that caller lets go.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, size_hints: Optional[Dict[str, int]] = None):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        # Expected bytes per key: the given hints, overwritten by measured sizes (kept after eviction)
+        self._size_hints: Dict[str, int] = dict(size_hints or {})
+        # Expected bytes of models being loaded, counted against the budget until they are measured
+        self._reserved: Dict[str, int] = {}
+        self._pinned = set()
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0, "load_errors": 0}
+        self._load_seconds: Dict[str, float] = {}
+
+    def get_or_load(self, key: str, load: Callable[[], object]):
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    logger.debug(f"Returning cached encoder instance for '{key}'")
+                    return self._entries[key]
+                pending = self._loading.get(key)
+                if pending is None:
+                    self._stats["misses"] += 1
+                    pending = self._loading[key] = threading.Event()
+                    # Make room first, so cached models and the new one are never all resident at once
+                    self._reserved[key] = self._size_hints.get(key, 0)
+                    evicted = self._evict(keep=key)
+                    break
+            # Another thread is loading this model; use its result (or retry if it failed)
+            pending.wait()
+        self._release(evicted)
+
+        try:
+            started = time.perf_counter()
+            encoder = load()
+            elapsed = time.perf_counter() - started
+        except BaseException:
+            with self._lock:
+                self._stats["load_errors"] += 1
+                del self._loading[key]
+                del self._reserved[key]
+            pending.set()
+            raise
+
+        size = estimate_model_bytes(encoder)
+        with self._lock:
+            del self._reserved[key]
+            self._entries[key] = encoder
+            self._sizes[key] = self._size_hints[key] = size
+            self._stats["loads"] += 1
+            self._load_seconds[key] = self._load_seconds.get(key, 0.0) + elapsed
+            # The estimate may have been low; evict again with the measured size
+            evicted = self._evict(keep=key)
+            del self._loading[key]
+        pending.set()
+        logger.info(f"Encoder '{key}' initialized and cached ({size / 2**20:.0f} MB, loaded in {elapsed:.1f}s).")
+        self._release(evicted)
+        return encoder
+
+    def _evict(self, keep: str):
+        if self.max_bytes is None:
+            return []
+        evicted = []
+        for key in list(self._entries):
+            if self._total_bytes() <= self.max_bytes:
+                break
+            if key == keep or key in self._pinned:
+                continue
+            del self._entries[key]
+            evicted.append((key, self._sizes.pop(key)))
+            self._stats["evictions"] += 1
+        if self._total_bytes() > self.max_bytes:
+            logger.warning(f"Encoder cache holds {self._total_bytes() / 2**20:.0f} MB of pinned or loading "
+                           f"models, above its {self.max_bytes / 2**20:.0f} MB budget")
+        return evicted
+
+    @staticmethod
+    def _release(evicted):
+        if not evicted:
+            return
+        for key, size in evicted:
+            logger.info(f"Evicted encoder '{key}' ({size / 2**20:.0f} MB) from the cache")
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def _total_bytes(self) -> int:
+        return sum(self._sizes.values()) + sum(self._reserved.values())
+
+    def pin(self, key: str):
+        """Never evict `key` (it may be pinned before it is loaded)."""
+        with self._lock:
+            self._pinned.add(key)
+
+    def unpin(self, key: str):
+        with self._lock:
+            self._pinned.discard(key)
+
+    def set_budget(self, max_bytes: Optional[int]):
+        with self._lock:
+            self.max_bytes = max_bytes
+            evicted = self._evict(keep=None)
+        self._release(evicted)
+
+    def clear(self):
+        with self._lock:
+            evicted = list(self._sizes.items())
+            self._entries.clear()
+            self._sizes.clear()
+        self._release(evicted)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self._stats,
+                        resident={key: self._sizes[key] for key in self._entries},
+                        resident_bytes=sum(self._sizes.values()),
+                        max_bytes=self.max_bytes,
+                        pinned=sorted(self._pinned),
+                        load_seconds=dict(self._load_seconds))
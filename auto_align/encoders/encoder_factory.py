@@ -1,18 +1,33 @@
 import logging
-from typing import Optional, Tuple
+import os
+from typing import Dict, Optional, Tuple
 
 from auto_align.constants.language_pairs_encoder import PREFERRED_ENCODER, DEFAULT_ENCODER
+from auto_align.encoders.encoder_cache import EncoderCache
 from auto_align.encoders.labse_encoder import LabseEncoder
 from auto_align.encoders.sbert_encoder import SbertEncoder
 from auto_align.encoders.laser_encoder_custom import LaserEncoder
+from auto_align.encoders.stub_encoder import StubEncoder
 
 logger = logging.getLogger(__name__)
 
-_encoder_cache = {}
 
+def _budget_from_env() -> Optional[int]:
+    value = os.environ.get("UKRAA_ENCODER_CACHE_MB")
+    return int(float(value) * 2**20) if value else None
 
-def get_encoder(encoder_name: Optional[str] = None, languages: Optional[Tuple[str, str]] = None):
 
+# Approximate float32 weight memory, used to make room in the cache before a
+# model's first load; later loads use the size measured on the previous one
+_ESTIMATED_MODEL_MB = {"labse": 1800, "sbert": 450, "laser": 180, "stub": 16}
+
+# Bounded by $UKRAA_ENCODER_CACHE_MB (unbounded if unset); see configure_encoder_cache
+_encoder_cache = EncoderCache(max_bytes=_budget_from_env(),
+                              size_hints={key: mb * 2**20 for key, mb in _ESTIMATED_MODEL_MB.items()})
+
+
+def resolve_encoder_name(encoder_name: Optional[str] = None, languages: Optional[Tuple[str, str]] = None) -> str:
+    """Registry key of the encoder get_encoder would use for these arguments."""
     if encoder_name:
         key = encoder_name.strip().lower()
     else:
@@ -32,23 +47,47 @@ def get_encoder(encoder_name: Optional[str] = None, languages: Optional[Tuple[st
         key = DEFAULT_ENCODER
         logger.info(f"No encoder specified; using default '{key}'")
 
-    key = key.lower()
+    return key.lower()
 
-    # Use caching to avoid duplicate model loads
-    if key in _encoder_cache:
-        logger.debug(f"Returning cached encoder instance for '{key}'")
-        return _encoder_cache[key]
 
-    encoder_instance = None
+def _create_encoder(key: str, encoder_name: Optional[str]):
     if key == "labse":
-        encoder_instance = LabseEncoder()
+        return LabseEncoder()
     elif key == "sbert":
-        encoder_instance = SbertEncoder()
+        return SbertEncoder()
     elif key == "laser":
-        encoder_instance = LaserEncoder()
-    else:
-        raise ValueError(f"Unknown encoder name '{encoder_name}'")
+        return LaserEncoder()
+    elif key == "stub":
+        return StubEncoder()
+    raise ValueError(f"Unknown encoder name '{encoder_name}'")
+
+
+def get_encoder(encoder_name: Optional[str] = None, languages: Optional[Tuple[str, str]] = None):
+
+    key = resolve_encoder_name(encoder_name, languages)
+
+    # Use caching to avoid duplicate model loads; concurrent first calls share one load
+    return _encoder_cache.get_or_load(key, lambda: _create_encoder(key, encoder_name))
+
+
+def configure_encoder_cache(max_mb: Optional[float] = None, pinned: Tuple[str, ...] = ()):
+    """
+    Bound loaded encoders to max_mb of model memory (None: unbounded), evicting
+    least recently used ones first; encoders named in `pinned` are never evicted.
+    """
+    _encoder_cache.set_budget(int(max_mb * 2**20) if max_mb is not None else None)
+    for name in pinned:
+        _encoder_cache.pin(name.strip().lower())
+
+
+def pin_encoder(encoder_name: str):
+    _encoder_cache.pin(encoder_name.strip().lower())
+
+
+def unpin_encoder(encoder_name: str):
+    _encoder_cache.unpin(encoder_name.strip().lower())
+
 
-    _encoder_cache[key] = encoder_instance
-    logger.info(f"Encoder '{key}' initialized and cached.")
-    return encoder_instance
+def encoder_cache_stats() -> Dict[str, object]:
+    """Hits, misses, loads, evictions, per-encoder load seconds and resident bytes."""
+    return _encoder_cache.stats()
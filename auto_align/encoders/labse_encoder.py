@@ -27,5 +27,5 @@ class LabseEncoder(BaseEncoder):
 
     def encode(self, sentences: List[str], lang: Optional[str] = None):
         logger.debug(f"Encoding {len(sentences)} sentences with LaBSE")
-        embeddings = self.model.encode(sentences, convert_to_tensor=True)
+        embeddings = self.model.encode(sentences, convert_to_numpy=True)
         return embeddings
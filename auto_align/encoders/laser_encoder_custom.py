@@ -1,5 +1,5 @@
 import logging
-import torch
+import numpy as np
 from typing import List, Optional
 
 from .base_encoder import BaseEncoder
@@ -25,16 +25,6 @@ class LaserEncoder(BaseEncoder):
         if lang is None:
             raise ValueError("Language code must be specified when using LASER encoder.")
 
+        # laserembeddings already returns a float32 NumPy matrix
         embeddings = self._laser.embed_sentences(sentences, lang=lang)
-
-        if torch.backends.mps.is_available():
-            device = "mps"
-        elif torch.cuda.is_available():
-            device = "cuda"
-        else:
-            device = "cpu"
-
-        embeddings_tensor = torch.tensor(embeddings)
-        embeddings_tensor = embeddings_tensor.to(device)
-
-        return embeddings_tensor
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
@@ -26,5 +26,5 @@ class SbertEncoder(BaseEncoder):
 
     def encode(self, sentences: List[str], lang: Optional[str] = None):
         logger.debug(f"Encoding {len(sentences)} sentences with SBERT model")
-        embeddings = self.model.encode(sentences, convert_to_tensor=True)
+        embeddings = self.model.encode(sentences, convert_to_numpy=True)
         return embeddings
@@ -0,0 +1,44 @@
+import logging
+import re
+import zlib
+from typing import List, Optional
+
+import numpy as np
+
+from .base_encoder import BaseEncoder
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+
+
+class StubEncoder(BaseEncoder):
+    """
+    Deterministic, model-free encoder for offline tests and benchmarks.
+    Each token is hashed (crc32) to a fixed random direction; a sentence is the
+    sum of its token directions. Sentences sharing most tokens therefore get a
+    high cosine similarity, whatever the language argument, and the output is
+    identical across runs and machines.
+    """
+
+    def __init__(self, dim: int = 256, buckets: int = 1 << 14, seed: int = 0):
+        super().__init__()
+        self.dim = dim
+        self.buckets = buckets
+        rng = np.random.default_rng(seed)
+        self._directions = rng.standard_normal((buckets, dim)).astype(np.float32)
+        logger.info(f"Stub encoder: dim={dim}, {buckets} hash buckets, seed={seed}")
+
+    def encode(self, sentences: List[str], lang: Optional[str] = None):
+        logger.debug(f"Encoding {len(sentences)} sentences with the stub encoder")
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            ids = [zlib.crc32(t.encode("utf-8")) % self.buckets for t in _TOKEN.findall(sentence.lower())]
+            if ids:
+                out[i] = self._directions[ids].sum(axis=0)
+            else:
+                out[i, 0] = 1.0
+        return out
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(dim={self.dim})"
@@ -1,12 +1,89 @@
+import hashlib
 import logging
-from typing import List, Tuple, Set, Dict
+import numbers
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Set, Dict, Iterable, Union, Optional
 
+import numpy as np
 import sacrebleu
-from bert_score import score as bert_score
+from bert_score import BERTScorer
 from nltk.tokenize import word_tokenize
 
+from auto_align.writers import read_pair_index
+
 logger = logging.getLogger(__name__)
 
+_bert_scorers = {}
+
+# Metrics whose per-segment sufficient statistics sum exactly to the corpus
+# statistics, so they can be sharded across processes.
+_CORPUS_METRICS = {
+    'ter': sacrebleu.metrics.TER,
+    'bleu': sacrebleu.metrics.BLEU,
+    'chrf': sacrebleu.metrics.CHRF,
+}
+
+
+class CachedBertScorer:
+    """
+    BERTScore with the model loaded once and reused, length-sorted batches,
+    and per-(hyp, ref) results cached by hash across calls.
+    """
+
+    def __init__(self, lang: str = "en", model_type: Optional[str] = None,
+                 batch_size: int = 64, device: Optional[str] = None):
+        self.lang = lang
+        self.model_type = model_type
+        self.batch_size = batch_size
+        self.device = device
+        self._scorer = None
+        self._cache = {}
+
+    @property
+    def scorer(self) -> BERTScorer:
+        if self._scorer is None:
+            logger.info(f"Loading BERTScore model (lang={self.lang}, model_type={self.model_type or 'default'})")
+            self._scorer = BERTScorer(lang=self.lang, model_type=self.model_type,
+                                      batch_size=self.batch_size, device=self.device)
+        return self._scorer
+
+    @staticmethod
+    def _key(hyp: str, ref: str) -> bytes:
+        return hashlib.blake2b(f"{hyp}\0{ref}".encode("utf-8"), digest_size=16).digest()
+
+    def score(self, hyp_texts: List[str], ref_texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """:return: per-pair precision, recall and F1 arrays aligned with the inputs."""
+        keys = [self._key(h, r) for h, r in zip(hyp_texts, ref_texts)]
+        missing = {}
+        for key, hyp, ref in zip(keys, hyp_texts, ref_texts):
+            if key not in self._cache and key not in missing:
+                missing[key] = (hyp, ref)
+        logger.debug(f"BERTScore: {len(keys) - len(missing)} cached, {len(missing)} to compute")
+
+        # Similar lengths in a batch keep padding (and wasted compute) low.
+        todo = sorted(missing.items(), key=lambda item: len(item[1][0]) + len(item[1][1]))
+        chunk = self.batch_size * 16
+        for start in range(0, len(todo), chunk):
+            part = todo[start:start + chunk]
+            P, R, F1 = self.scorer.score([h for _, (h, _) in part], [r for _, (_, r) in part],
+                                         batch_size=self.batch_size)
+            for (key, _), p, r, f in zip(part, P.tolist(), R.tolist(), F1.tolist()):
+                self._cache[key] = (p, r, f)
+
+        scores = np.array([self._cache[key] for key in keys], dtype=np.float64).reshape(-1, 3)
+        return scores[:, 0], scores[:, 1], scores[:, 2]
+
+    def clear_cache(self):
+        self._cache.clear()
+
+
+def get_bert_scorer(lang: str = "en") -> CachedBertScorer:
+    """Process-wide scorer for lang, so repeated evaluations load the model once."""
+    if lang not in _bert_scorers:
+        _bert_scorers[lang] = CachedBertScorer(lang=lang)
+    return _bert_scorers[lang]
+
 
 def load_gold_alignment(gold_file_path: str) -> Set[Tuple[str, str]]:
 
@@ -30,76 +107,299 @@ def load_gold_alignment(gold_file_path: str) -> Set[Tuple[str, str]]:
     return gold_pairs
 
 
+def load_gold_index_alignment(gold_file_path: str) -> Set[Tuple[int, int]]:
+    """
+    Load gold alignments given as sentence indices, one "src_idx<TAB>tgt_idx"
+    (or "src_idx-tgt_idx") pair per line.
+    """
+    gold_pairs = set()
+    with open(gold_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            fields = line.split('-', 1) if '-' in line else line.split()
+            try:
+                src_idx, tgt_idx = (int(x) for x in fields)
+            except ValueError:
+                logger.warning(f"Gold alignment line not recognized format: {line}")
+                continue
+            gold_pairs.add((src_idx, tgt_idx))
+    logger.info(f"Loaded {len(gold_pairs)} gold index pairs from {gold_file_path}")
+    return gold_pairs
+
+
+def load_predicted_index(path: str) -> Tuple[List[Tuple[int, int, float]], List[str], List[str]]:
+    """
+    Load predicted pairs from a binary index file (--output-format index)
+    together with the sentence tables they refer to, ready for
+    evaluate_alignment; no text is parsed to recover the pairs.
+    """
+    pairs, source_sentences, target_sentences, _ = read_pair_index(path)
+    predicted = pairs.tolist()
+    logger.info(f"Loaded {len(predicted)} predicted pairs ({len(source_sentences)} source, "
+                f"{len(target_sentences)} target sentences) from {path}")
+    return predicted, source_sentences, target_sentences
+
+
+def _gold_set(gold_pairs: Iterable[tuple]) -> Set[tuple]:
+    """Gold pairs as a set of (src, tgt) tuples, with NumPy integer indices turned into ints."""
+    return {tuple(int(x) if isinstance(x, numbers.Integral) else x for x in pair) for pair in gold_pairs}
+
+
+def _is_index_gold(gold_pairs: Set[tuple]) -> bool:
+    """True for (src_idx, tgt_idx) gold, False for (src_text, tgt_text) gold; anything else is rejected."""
+    kinds = set()
+    for pair in gold_pairs:
+        if len(pair) == 2 and all(isinstance(x, numbers.Integral) for x in pair):
+            kinds.add("index")
+        elif len(pair) == 2 and all(isinstance(x, str) for x in pair):
+            kinds.add("text")
+        else:
+            raise ValueError(f"Gold pair {pair!r} is neither two sentence indices nor two sentences")
+    if len(kinds) > 1:
+        raise ValueError("Gold pairs mix sentence indices and sentence texts")
+    return kinds == {"index"}
+
+
+def _best_by_source(predicted_pairs: Iterable[Tuple[int, int, float]], src_key, tgt_key) -> dict:
+    """
+    Map src_key(src_idx) to tgt_key(tgt_idx) of that source's highest-scoring
+    predicted pair; ties go to the lowest target index.
+    """
+    best = {}
+    for i, j, score in predicted_pairs:
+        key = src_key(i)
+        if key not in best or (score, -j) > best[key][:2]:
+            best[key] = (score, -j, tgt_key(j))
+    return {key: tgt for key, (_, _, tgt) in best.items()}
+
+
+def _segment_statistics(name: str, hyp_texts: List[str], ref_texts: List[str]):
+    """Worker: sacrebleu segment statistics for one shard, plus seconds spent."""
+    start = time.process_time()
+    stats = _CORPUS_METRICS[name]()._extract_corpus_statistics(hyp_texts, [ref_texts])
+    return stats, time.process_time() - start
+
+
+def _shardable(name: str) -> bool:
+    """
+    Whether sacrebleu exposes the per-segment statistics sharding relies on.
+    They are not public API (sacrebleu is pinned below 3 for them), so
+    without them the metric is scored serially with corpus_score instead.
+    """
+    metric = _CORPUS_METRICS[name]()
+    return hasattr(metric, "_extract_corpus_statistics") and hasattr(metric, "_aggregate_and_compute")
+
+
+def corpus_metrics(hyp_texts: List[str], ref_texts: List[str], workers: int = 1,
+                   timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    TER, BLEU and chrF (scaled to 0..1) for a corpus.
+    With workers > 1 every metric is split into shards scored concurrently in
+    a process pool; shard statistics are concatenated in order and aggregated
+    once, which gives exactly the serial corpus score.
+    :param timings: optional dict filled with CPU seconds spent per metric.
+    """
+    sharded = [name for name in _CORPUS_METRICS if workers > 1 and _shardable(name)]
+    serial = [name for name in _CORPUS_METRICS if name not in sharded]
+    if workers > 1 and serial:
+        logger.warning(f"sacrebleu {sacrebleu.__version__} has no segment statistics for "
+                       f"{', '.join(serial)}; scoring them without sharding")
+    metrics = {}
+    for name in serial:
+        start = time.process_time()
+        metrics[name] = _CORPUS_METRICS[name]().corpus_score(hyp_texts, [ref_texts]).score / 100
+        if timings is not None:
+            timings[name] = time.process_time() - start
+    if not sharded:
+        return metrics
+
+    size = -(-len(hyp_texts) // workers)
+    bounds = [(i, i + size) for i in range(0, len(hyp_texts), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            name: [pool.submit(_segment_statistics, name, hyp_texts[a:b], ref_texts[a:b]) for a, b in bounds]
+            for name in sharded
+        }
+        results = {name: [f.result() for f in fs] for name, fs in futures.items()}
+
+    for name in sharded:
+        start = time.process_time()
+        stats = [seg for shard_stats, _ in results[name] for seg in shard_stats]
+        metrics[name] = _CORPUS_METRICS[name]()._aggregate_and_compute(stats).score / 100
+        elapsed = time.process_time() - start + sum(t for _, t in results[name])
+        if timings is not None:
+            timings[name] = elapsed
+    return {name: metrics[name] for name in _CORPUS_METRICS}
+
+
 def evaluate_alignment(predicted_pairs: List[Tuple[int, int, float]],
                        source_sentences: List[str],
                        target_sentences: List[str],
-                       gold_pairs: Set[Tuple[str, str]]) -> Dict[str, float]:
-   
-    gold_pairs = set(gold_pairs)
+                       gold_pairs: Union[Set[Tuple[str, str]], Set[Tuple[int, int]]],
+                       text_metrics: bool = True,
+                       bertscore: bool = True,
+                       bert_scorer: Optional[CachedBertScorer] = None,
+                       workers: int = 1,
+                       timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Score predicted (src_idx, tgt_idx, score) pairs against a gold alignment.
+    gold_pairs holds either (src_text, tgt_text) pairs or (src_idx, tgt_idx)
+    pairs; index pairs are matched without any string comparison.
+    Precision/recall/F1 are always computed. text_metrics adds TER, BLEU and
+    chrF; bertscore adds BERTScore using bert_scorer (default: the shared
+    English scorer). Skipped metrics are left out of the result. Text
+    metrics compare each gold target with the target of its source's
+    highest-scoring predicted pair (ties: lowest target index).
+    TER/BLEU/chrF are sharded over `workers` processes; per-metric seconds
+    are logged and stored in `timings` if given.
+    """
+    timings = {} if timings is None else timings
+    gold_pairs = _gold_set(gold_pairs)
 
-    pred_pairs_text = {(source_sentences[i].strip(), target_sentences[j].strip()) for i, j, _ in predicted_pairs}
     logger.info(f"Predicted pairs count = {len(predicted_pairs)}")
 
     if not gold_pairs:
         logger.warning("No gold pairs provided. Cannot compute metrics.")
         return {}
 
-    true_positives = pred_pairs_text & gold_pairs
-    num_pred = len(pred_pairs_text)
+    if _is_index_gold(gold_pairs):
+        pred_keys = {(i, j) for i, j, _ in predicted_pairs}
+        pred_by_src = _best_by_source(predicted_pairs, int, int)
+        matched = [(tgt, pred_by_src[src]) for src, tgt in gold_pairs if src in pred_by_src]
+        ref_texts = [target_sentences[j].strip() for j, _ in matched]
+        hyp_texts = [target_sentences[j].strip() for _, j in matched]
+    else:
+        pred_keys = {(source_sentences[i].strip(), target_sentences[j].strip()) for i, j, _ in predicted_pairs}
+        pred_by_src = _best_by_source(predicted_pairs, lambda i: source_sentences[i].strip(),
+                                      lambda j: target_sentences[j].strip())
+        matched = [(tgt, pred_by_src[src]) for src, tgt in gold_pairs if src in pred_by_src]
+        ref_texts = [ref for ref, _ in matched]
+        hyp_texts = [hyp for _, hyp in matched]
+
+    num_pred = len(pred_keys)
     num_gold = len(gold_pairs)
-    num_tp = len(true_positives)
+    num_tp = len(pred_keys & gold_pairs)
 
     precision = num_tp / num_pred if num_pred > 0 else 0.0
     recall = num_tp / num_gold if num_gold > 0 else 0.0
     f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
 
-
-    ref_texts = []
-    hyp_texts = []
-
-    for src, tgt in gold_pairs:
-        for pred_src, pred_tgt in pred_pairs_text:
-            if src == pred_src:
-                ref_texts.append(tgt)
-                hyp_texts.append(pred_tgt)
-                break
-
-    if not hyp_texts:
-        logger.warning("No overlap between gold and predicted sources for text-based metrics.")
-        return {
-            'precision': precision,
-            'recall': recall,
-            'f1': f1,
-            'ter': 1.0,
-            'bleu': 0.0,
-            'chrf': 0.0,
-            'bertscore_precision': 0.0,
-            'bertscore_recall': 0.0,
-            'bertscore_f1': 0.0,
-        }
-
-    ter = sacrebleu.metrics.TER().corpus_score(hyp_texts, [ref_texts]).score / 100
-    bleu = sacrebleu.corpus_bleu(hyp_texts, [ref_texts]).score / 100
-    chrf = sacrebleu.metrics.CHRF().corpus_score(hyp_texts, [ref_texts]).score / 100
-
-    P, R, F1 = bert_score(hyp_texts, ref_texts, lang="en", verbose=False)
-    bert_p = P.mean().item()
-    bert_r = R.mean().item()
-    bert_f1 = F1.mean().item()
-
     metrics = {
         'precision': precision,
         'recall': recall,
         'f1': f1,
-        'ter': ter,
-        'bleu': bleu,
-        'chrf': chrf,
-        'bertscore_precision': bert_p,
-        'bertscore_recall': bert_r,
-        'bertscore_f1': bert_f1
     }
 
+    if not hyp_texts:
+        if text_metrics or bertscore:
+            logger.warning("No overlap between gold and predicted sources for text-based metrics.")
+        if text_metrics:
+            metrics.update({'ter': 1.0, 'bleu': 0.0, 'chrf': 0.0})
+        if bertscore:
+            metrics.update({'bertscore_precision': 0.0, 'bertscore_recall': 0.0, 'bertscore_f1': 0.0})
+        return metrics
+
+    if text_metrics:
+        metrics.update(corpus_metrics(hyp_texts, ref_texts, workers=workers, timings=timings))
+
+    if bertscore:
+        start = time.perf_counter()
+        P, R, F1 = (bert_scorer or get_bert_scorer("en")).score(hyp_texts, ref_texts)
+        timings['bertscore'] = time.perf_counter() - start
+        metrics['bertscore_precision'] = float(P.mean())
+        metrics['bertscore_recall'] = float(R.mean())
+        metrics['bertscore_f1'] = float(F1.mean())
+
+    if timings:
+        logger.info("Metric timings: " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
     for key, value in metrics.items():
         logger.info(f"{key.upper()}: {value:.3f}")
 
     return metrics
+
+
+def threshold_sweep(predicted_pairs: List[Tuple[int, int, float]],
+                    source_sentences: List[str],
+                    target_sentences: List[str],
+                    gold_pairs: Union[Set[Tuple[str, str]], Set[Tuple[int, int]]],
+                    thresholds: Iterable[float] = (0.3, 0.5, 0.7, 0.8, 0.9)) -> Dict[str, object]:
+    """
+    Precision/recall/F1 at many thresholds from a single alignment run.
+    predicted_pairs must come from one align_sentences call at a threshold no
+    higher than min(thresholds); the pairs a run at threshold t would return
+    are exactly those with score >= t, so each point matches the P/R/F1 of
+    evaluate_alignment on a separate run at that threshold.
+    :return: dict with per-threshold 'points', the full PR 'curve' (one point
+             per distinct score) and the 'best' F1 operating point on that curve.
+    """
+    gold_pairs = _gold_set(gold_pairs)
+    thresholds = sorted(float(t) for t in thresholds)
+    if not gold_pairs:
+        logger.warning("No gold pairs provided. Cannot compute metrics.")
+        return {}
+
+    # A predicted key is present at threshold t iff its best score is >= t.
+    best = {}
+    if _is_index_gold(gold_pairs):
+        keys = ((i, j) for i, j, _ in predicted_pairs)
+    else:
+        keys = ((source_sentences[i].strip(), target_sentences[j].strip()) for i, j, _ in predicted_pairs)
+    for key, (_, _, score) in zip(keys, predicted_pairs):
+        if score > best.get(key, float("-inf")):
+            best[key] = score
+
+    scores = np.fromiter(best.values(), dtype=np.float64, count=len(best))
+    is_tp = np.fromiter((key in gold_pairs for key in best), dtype=np.int64, count=len(best))
+    order = np.argsort(-scores, kind="stable")
+    scores = scores[order]
+    # cum_tp[n] = true positives among the n highest-scoring keys
+    cum_tp = np.concatenate(([0], np.cumsum(is_tp[order])))
+    num_gold = len(gold_pairs)
+
+    def prf(num_pred):
+        num_pred = np.asarray(num_pred, dtype=np.int64)
+        tp = cum_tp[num_pred]
+        precision = np.divide(tp, num_pred, out=np.zeros(num_pred.shape), where=num_pred > 0)
+        recall = tp / num_gold
+        denom = precision + recall
+        f1 = np.divide(2 * precision * recall, denom, out=np.zeros(num_pred.shape), where=denom > 0)
+        return precision, recall, f1
+
+    # Number of keys with score >= t, via binary search on the descending scores.
+    counts = np.searchsorted(-scores, -np.asarray(thresholds), side="right")
+    precision, recall, f1 = prf(counts)
+    points = [
+        {'threshold': t, 'precision': float(p), 'recall': float(r), 'f1': float(f), 'num_pred': int(n)}
+        for t, p, r, f, n in zip(thresholds, precision, recall, f1, counts)
+    ]
+
+    # Full curve: one point at the end of every run of equal scores.
+    ends = np.flatnonzero(np.diff(scores) != 0) + 1
+    if len(scores):
+        ends = np.append(ends, len(scores))
+    curve_p, curve_r, curve_f1 = prf(ends)
+    curve = {
+        'threshold': scores[ends - 1].tolist() if len(ends) else [],
+        'precision': curve_p.tolist(),
+        'recall': curve_r.tolist(),
+        'f1': curve_f1.tolist(),
+        'num_pred': ends.tolist(),
+    }
+
+    if len(ends):
+        b = int(np.argmax(curve_f1))
+        best_point = {'threshold': curve['threshold'][b], 'precision': curve['precision'][b],
+                      'recall': curve['recall'][b], 'f1': curve['f1'][b], 'num_pred': curve['num_pred'][b]}
+    else:
+        best_point = {'threshold': None, 'precision': 0.0, 'recall': 0.0, 'f1': 0.0, 'num_pred': 0}
+
+    for point in points:
+        logger.info(f"Threshold {point['threshold']:.3f}: P={point['precision']:.3f} "
+                    f"R={point['recall']:.3f} F1={point['f1']:.3f}")
+    if best_point['threshold'] is not None:
+        logger.info(f"Best F1={best_point['f1']:.3f} @ threshold {best_point['threshold']:.4f}")
+
+    return {'points': points, 'curve': curve, 'best': best_point}
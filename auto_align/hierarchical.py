@@ -0,0 +1,169 @@
+"""
+Hierarchical alignment of structured documents.
+
+Blocks (sections or paragraphs, as returned by data.load_structured) are
+matched first, by the normalized mean of their sentence embeddings; sentences
+are then only compared with the sentences of their block's matched target
+blocks instead of with the whole target document.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from auto_align.aligner import encode_normalized
+from auto_align.encoders.encoder_factory import get_encoder
+from auto_align.prefilter import CandidateFilter
+from auto_align.profiling import maybe_stage
+from auto_align.progress import AlignmentObserver, make_reporter
+
+logger = logging.getLogger(__name__)
+
+
+def block_spans(block_ids: List[int]) -> List[Tuple[int, int]]:
+    """(start, stop) sentence range of each block; block_ids must be non-decreasing."""
+    ids = np.asarray(block_ids)
+    if len(ids) == 0:
+        return []
+    steps = np.diff(ids)
+    if np.any(steps < 0):
+        raise ValueError("Block ids must be non-decreasing (sentences in document order)")
+    bounds = np.flatnonzero(steps) + 1
+    starts = np.concatenate(([0], bounds))
+    stops = np.concatenate((bounds, [len(ids)]))
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def block_embeddings(embeddings: np.ndarray, spans: List[Tuple[int, int]]) -> np.ndarray:
+    """Normalized mean of the sentence embeddings of each block."""
+    starts = np.array([start for start, _ in spans], dtype=np.int64)
+    counts = np.array([stop - start for start, stop in spans], dtype=np.float32)
+    means = np.add.reduceat(embeddings, starts, axis=0) / counts[:, None]
+    means = np.ascontiguousarray(means, dtype=np.float32)
+    faiss.normalize_L2(means)
+    return means
+
+
+def match_blocks(src_blocks: np.ndarray, tgt_blocks: np.ndarray, block_topk: int = 2,
+                 window: int = 1) -> List[np.ndarray]:
+    """
+    Target blocks to search for each source block: its block_topk most
+    similar target blocks, each widened by `window` neighbours on either side
+    to catch sections that were split or merged in translation.
+    """
+    if block_topk < 1:
+        raise ValueError(f"block_topk must be at least 1, got {block_topk}")
+    if window < 0:
+        raise ValueError(f"window must be non-negative, got {window}")
+    idx = faiss.IndexFlatIP(tgt_blocks.shape[1])
+    idx.add(tgt_blocks)
+    _, I = idx.search(src_blocks, min(block_topk, len(tgt_blocks)))
+    offsets = np.arange(-window, window + 1)
+    return [np.unique(np.clip(row[:, None] + offsets, 0, len(tgt_blocks) - 1)) for row in I]
+
+
+def _topk_pairs(scores: np.ndarray, threshold: float, topk: int) -> List[Tuple[int, int, float]]:
+    """(row, column, score) of the best topk columns of each row scoring >= threshold, best first."""
+    k = min(topk, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    pairs = []
+    for r in range(len(scores)):
+        for c in order[r]:
+            score = float(top_scores[r, c])
+            if score < threshold:
+                break
+            pairs.append((r, int(top[r, c]), score))
+    return pairs
+
+
+def align_hierarchical(source_sentences: List[str], target_sentences: List[str],
+                       source_blocks: List[int], target_blocks: List[int],
+                       src_lang: str, tgt_lang: str, encoder_name: str = None,
+                       threshold: float = 0.7, topk=5, block_topk: int = 2, block_window: int = 1,
+                       batch_size=512, profiler=None,
+                       observer: Optional[AlignmentObserver] = None,
+                       prefilter: Optional[CandidateFilter] = None) -> List[Tuple[int, int, float]]:
+    """
+    Align two structured documents block by block.
+    :param source_sentences: Source sentences, as returned by data.load_structured.
+    :param target_sentences: Target sentences.
+    :param source_blocks: Block id of each source sentence (non-decreasing).
+    :param target_blocks: Block id of each target sentence.
+    :param src_lang: Source language code (for encoders that require it).
+    :param tgt_lang: Target language code.
+    :param encoder_name: Optional encoder name to use (overrides default selection).
+    :param threshold: Similarity threshold for considering a pair as aligned.
+    :param topk: Number of nearest neighbors to keep for each source sentence.
+    :param block_topk: Target blocks matched to each source block.
+    :param block_window: Neighbouring target blocks also searched on each side of a matched block.
+    :param batch_size: Most source sentences of a block scored at once (longer blocks are split).
+    :param profiler: Optional profiling.StageProfiler recording encoding, block alignment and search.
+    :param observer: Optional progress.AlignmentObserver, notified as in aligner.align_sentences;
+                     each searched slice of a source block counts as one search block.
+    :param prefilter: Optional prefilter.CandidateFilter; rejected pairs are masked before top-k
+                      selection, and those the unrestricted search would have returned are
+                      collected in prefilter.dropped.
+    :return: List of tuples (src_index, tgt_index, score) with indices into the sentence lists,
+             as from aligner.align_sentences.
+    """
+    if len(source_blocks) != len(source_sentences) or len(target_blocks) != len(target_sentences):
+        raise ValueError("Every sentence needs a block id")
+    if block_topk < 1:
+        raise ValueError(f"block_topk must be at least 1, got {block_topk}")
+    if block_window < 0:
+        raise ValueError(f"block_window must be non-negative, got {block_window}")
+    if topk < 1 or batch_size < 1:
+        raise ValueError(f"topk and batch_size must be at least 1, got {topk} and {batch_size}")
+    src_spans, tgt_spans = block_spans(source_blocks), block_spans(target_blocks)
+    logger.info(f"Starting hierarchical alignment: {len(source_sentences)} source sentences in "
+                f"{len(src_spans)} blocks, {len(target_sentences)} target sentences in {len(tgt_spans)} blocks")
+    if not src_spans or not tgt_spans:
+        return []
+
+    encoder = get_encoder(encoder_name, languages=(src_lang, tgt_lang))
+    reporter = make_reporter(observer, len(source_sentences), len(target_sentences))
+    with maybe_stage(profiler, "encoding", items=len(source_sentences) + len(target_sentences)):
+        src_emb = encode_normalized(encoder, source_sentences, src_lang)
+        if reporter is not None:
+            reporter.encoded(len(source_sentences))
+        tgt_emb = encode_normalized(encoder, target_sentences, tgt_lang)
+        if reporter is not None:
+            reporter.encoded(len(target_sentences))
+
+    with maybe_stage(profiler, "block_alignment", items=len(src_spans)):
+        candidates = match_blocks(block_embeddings(src_emb, src_spans), block_embeddings(tgt_emb, tgt_spans),
+                                  block_topk=block_topk, window=block_window)
+
+    # Long source blocks are scored batch_size rows at a time to bound the score matrix
+    slices = [(first, min(first + batch_size, stop), blocks)
+              for (start, stop), blocks in zip(src_spans, candidates)
+              for first in range(start, stop, batch_size)]
+    if reporter is not None:
+        reporter.start_search(len(slices))
+
+    aligned = []
+    compared = 0
+    with maybe_stage(profiler, "search", items=len(source_sentences)):
+        for start, stop, blocks in slices:
+            cols = np.concatenate([np.arange(*tgt_spans[b]) for b in blocks])
+            scores = src_emb[start:stop] @ tgt_emb[cols].T
+            compared += scores.size
+            if prefilter is not None:
+                allowed = prefilter.keep(np.arange(start, stop)[:, None], cols[None, :])
+                prefilter.dropped.extend((start + r, int(cols[c]), score)
+                                         for r, c, score in _topk_pairs(scores, threshold, topk)
+                                         if not allowed[r, c])
+                scores[~allowed] = -np.inf
+            block_pairs = [(start + r, int(cols[c]), score) for r, c, score in _topk_pairs(scores, threshold, topk)]
+            aligned.extend(block_pairs)
+            if reporter is not None:
+                reporter.searched(stop - start, block_pairs)
+
+    total = len(source_sentences) * len(target_sentences)
+    logger.info(f"Compared {compared} of {total} sentence pairs ({compared / total:.2%}) within matched blocks")
+    if reporter is not None:
+        reporter.finish()
+    return aligned
@@ -0,0 +1,175 @@
+"""
+Sparse source-target similarity graph and one-to-one resolution.
+
+align_sentences returns up to topk targets per source sentence, so a target
+may be claimed by several sources. The candidates are kept as a CSR graph
+(memory linear in the number of pairs) and resolved into a one-to-one
+alignment either greedily (heaviest pair first; scales to millions of nodes)
+or with a sparse linear assignment that maximizes the total similarity.
+"""
+import logging
+from typing import List, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("greedy", "lsa")
+
+
+class SimilarityGraph:
+    """
+    Bipartite graph in CSR form: the targets of source row i are
+    indices[indptr[i]:indptr[i + 1]] with similarities data[...] (best first).
+    """
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray, shape: Tuple[int, int]):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @classmethod
+    def from_pairs(cls, pairs: List[Tuple[int, int, float]], num_src: int, num_tgt: int) -> "SimilarityGraph":
+        """Graph of (src_index, tgt_index, score) pairs, e.g. from align_sentences."""
+        src = np.fromiter((p[0] for p in pairs), dtype=np.int64, count=len(pairs))
+        tgt = np.fromiter((p[1] for p in pairs), dtype=np.int64, count=len(pairs))
+        score = np.fromiter((p[2] for p in pairs), dtype=np.float32, count=len(pairs))
+        if len(pairs) and (src.max() >= num_src or tgt.max() >= num_tgt):
+            raise ValueError(f"Pair indices exceed the graph shape ({num_src}, {num_tgt})")
+        order = np.lexsort((-score, src))
+        indptr = np.zeros(num_src + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_src), out=indptr[1:])
+        return cls(indptr, tgt[order].astype(np.int32), score[order], (num_src, num_tgt))
+
+    @property
+    def nnz(self) -> int:
+        return len(self.data)
+
+    def rows(self) -> np.ndarray:
+        """Source index of every stored pair."""
+        return np.repeat(np.arange(self.shape[0], dtype=np.int64), np.diff(self.indptr))
+
+    def to_pairs(self) -> List[Tuple[int, int, float]]:
+        return list(zip(self.rows().tolist(), self.indices.tolist(), self.data.tolist()))
+
+    def to_scipy(self):
+        """The graph as a scipy.sparse.csr_matrix of similarities."""
+        try:
+            from scipy.sparse import csr_matrix
+        except ImportError:
+            raise ImportError("scipy is not installed; install it with: pip install scipy")
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def save(self, path: str):
+        np.savez(path, indptr=self.indptr, indices=self.indices, data=self.data, shape=np.array(self.shape))
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityGraph":
+        with np.load(path) as f:
+            return cls(f["indptr"], f["indices"], f["data"], tuple(int(n) for n in f["shape"]))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(shape={self.shape}, nnz={self.nnz})"
+
+
+def resolve_greedy(graph: SimilarityGraph) -> List[Tuple[int, int, float]]:
+    """
+    Take pairs from the most to the least similar, skipping any whose source
+    or target is already used. At least half the optimal total similarity;
+    O(E log E) for E pairs.
+    """
+    order = np.argsort(-graph.data, kind="stable")
+    rows, cols, scores = graph.rows()[order].tolist(), graph.indices[order].tolist(), graph.data[order].tolist()
+    src_used, tgt_used = bytearray(graph.shape[0]), bytearray(graph.shape[1])
+    resolved = []
+    for i, j, score in zip(rows, cols, scores):
+        if not src_used[i] and not tgt_used[j]:
+            src_used[i] = tgt_used[j] = 1
+            resolved.append((i, j, score))
+    resolved.sort()
+    return resolved
+
+
+def _assign(rows: np.ndarray, cols: np.ndarray, scores: np.ndarray, num_src: int, num_tgt: int):
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+    # Every source also gets a private "unaligned" column costing as much as a
+    # zero-similarity pair, so a full matching exists and real pairs are only
+    # taken when they add similarity. Costs stay positive (explicit zeros would
+    # still count as edges, but are best avoided).
+    ceiling = float(scores.max()) + 1.0
+    dummies = np.arange(num_src)
+    matrix = csr_matrix((np.concatenate([ceiling - scores.astype(np.float64), np.full(num_src, ceiling)]),
+                         (np.concatenate([rows, dummies]), np.concatenate([cols, num_tgt + dummies]))),
+                        shape=(num_src, num_tgt + num_src))
+    row_ind, col_ind = min_weight_full_bipartite_matching(matrix)
+    real = col_ind < num_tgt
+    return row_ind[real], col_ind[real]
+
+
+def resolve_assignment(graph: SimilarityGraph) -> List[Tuple[int, int, float]]:
+    """
+    Maximum-total-similarity one-to-one alignment (sparse linear assignment).
+    The graph is split into connected components: those with a single source
+    or target just keep their best pair, and the rest are solved separately
+    with scipy's LAPJVsp. Exact, but a single huge component can take far
+    longer than resolve_greedy.
+    """
+    try:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+    except ImportError:
+        raise ImportError("scipy is not installed; install it with: pip install scipy")
+    if graph.nnz == 0:
+        return []
+    num_src, num_tgt = graph.shape
+    rows, cols, scores = graph.rows(), graph.indices.astype(np.int64), graph.data
+    bipartite = coo_matrix((np.ones(graph.nnz, dtype=np.int8), (rows, num_src + cols)),
+                           shape=(num_src + num_tgt, num_src + num_tgt))
+    _, labels = connected_components(bipartite, directed=False)
+    component = labels[rows]
+    src_count = np.bincount(labels[:num_src], minlength=labels.max() + 1)
+    tgt_count = np.bincount(labels[num_src:], minlength=labels.max() + 1)
+
+    # Star-shaped components: the single shared node takes its best pair
+    star = (src_count[component] == 1) | (tgt_count[component] == 1)
+    edges = np.flatnonzero(star)
+    edges = edges[np.lexsort((-scores[edges], component[edges]))]
+    first = np.ones(len(edges), dtype=bool)
+    first[1:] = component[edges[1:]] != component[edges[:-1]]
+    chosen = [edges[first]]
+
+    edges = np.flatnonzero(~star)
+    edges = edges[np.argsort(component[edges], kind="stable")]
+    bounds = np.flatnonzero(np.diff(component[edges])) + 1
+    solved = 0
+    for part in np.split(edges, bounds) if len(edges) else []:
+        src_ids, local_rows = np.unique(rows[part], return_inverse=True)
+        tgt_ids, local_cols = np.unique(cols[part], return_inverse=True)
+        r, c = _assign(local_rows, local_cols, scores[part], len(src_ids), len(tgt_ids))
+        # Map the chosen (row, col) back to edge positions within the component
+        keys = local_rows * len(tgt_ids) + local_cols
+        order = np.argsort(keys)
+        chosen.append(part[order[np.searchsorted(keys, r * len(tgt_ids) + c, sorter=order)]])
+        solved += 1
+    logger.debug(f"Assignment: {int(first.sum())} star components, {solved} solved with LAPJVsp")
+
+    chosen = np.concatenate(chosen)
+    return sorted(zip(rows[chosen].tolist(), cols[chosen].tolist(), scores[chosen].tolist()))
+
+
+def resolve_one_to_one(pairs: Union[SimilarityGraph, List[Tuple[int, int, float]]], method: str = "greedy",
+                       num_src: int = None, num_tgt: int = None) -> List[Tuple[int, int, float]]:
+    """
+    One-to-one subset of aligned pairs (a SimilarityGraph, or pairs plus the
+    sentence counts), by method 'greedy' or 'lsa'.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown one-to-one method '{method}'; expected one of {', '.join(METHODS)}")
+    graph = pairs if isinstance(pairs, SimilarityGraph) else SimilarityGraph.from_pairs(pairs, num_src, num_tgt)
+    resolved = resolve_greedy(graph) if method == "greedy" else resolve_assignment(graph)
+    logger.info(f"One-to-one ({method}): kept {len(resolved)} of {graph.nnz} pairs, "
+                f"total similarity {sum(score for _, _, score in resolved):.2f}")
+    return resolved
@@ -0,0 +1,99 @@
+"""
+Near-duplicate sentence removal with MinHash signatures and LSH banding.
+"""
+import logging
+import re
+import zlib
+from typing import List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Universal hashing (a*x + b) mod p with p < 2**31 keeps a*x below 2**62,
+# so the permutations can be evaluated in uint64 without overflow.
+_PRIME = np.uint64((1 << 31) - 1)
+_DIGITS = re.compile(r"\d")
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    # Lowercase and map every digit to 0 so boilerplate that differs only by
+    # a date or a number shares all of its shingles.
+    return _SPACES.sub(" ", _DIGITS.sub("0", text.lower())).strip()
+
+
+def _choose_bands(num_perm: int, threshold: float):
+    """Pick (bands, rows) whose LSH S-curve midpoint (1/b)**(1/r) is closest to threshold."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands < 1:
+            break
+        midpoint = (1.0 / bands) ** (1.0 / rows)
+        err = abs(midpoint - threshold)
+        if best is None or err < best[0]:
+            best = (err, bands, rows)
+    return best[1], best[2]
+
+
+class MinHasher:
+    """Computes MinHash signatures over character shingles."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+    def shingles(self, text: str):
+        norm = _normalize(text)
+        k = self.shingle_size
+        if len(norm) <= k:
+            return {norm}
+        return {norm[i:i + k] for i in range(len(norm) - k + 1)}
+
+    def signature(self, text: str) -> np.ndarray:
+        shingles = self.shingles(text)
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles)) % _PRIME
+        return ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1)
+
+
+def remove_near_duplicates(sentences: List[str], threshold: float = 0.8,
+                           num_perm: int = 64, shingle_size: int = 5) -> List[str]:
+    """
+    Keep the first sentence of every group whose estimated Jaccard similarity
+    over character shingles is >= threshold.
+    Each sentence is only compared with kept sentences sharing an LSH bucket,
+    so the cost grows linearly with the number of sentences.
+    """
+    if not 0.0 < threshold <= 1.0:
+        raise ValueError(f"Near-duplicate threshold must be in (0, 1], got {threshold}")
+
+    hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+    bands, rows = _choose_bands(num_perm, threshold)
+    buckets = [dict() for _ in range(bands)]
+    kept_signatures = []
+    kept = []
+
+    for sentence in sentences:
+        sig = hasher.signature(sentence)
+        keys = [sig[b * rows:(b + 1) * rows].tobytes() for b in range(bands)]
+
+        candidates = set()
+        for b, key in enumerate(keys):
+            candidates.update(buckets[b].get(key, ()))
+        if any(np.mean(kept_signatures[c] == sig) >= threshold for c in candidates):
+            continue
+
+        idx = len(kept)
+        kept.append(sentence)
+        kept_signatures.append(sig)
+        for b, key in enumerate(keys):
+            buckets[b].setdefault(key, []).append(idx)
+
+    logger.debug(f"MinHash LSH with {bands} bands x {rows} rows: "
+                 f"kept {len(kept)} of {len(sentences)} sentences")
+    return kept
@@ -0,0 +1,126 @@
+"""
+Cheap rejection of source/target candidates before or after embedding search.
+
+Features are computed once per sentence; pairs are then compared with NumPy
+broadcasting. A pair is rejected when
+  - its character lengths differ by more than max_length_ratio, after scaling
+    source lengths by the corpus-level target/source length ratio (so scripts
+    with denser writing are not penalized),
+  - both sentences contain numbers (including dates) but share none,
+  - both contain URLs but share none,
+  - with punctuation=True, only one of them is a question.
+Numbers and URLs are kept as 64-bit hashed bit sets, so "share none" is exact
+when it says so and only errs towards keeping a pair.
+"""
+import logging
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Digits with thousands separators (1,000 / 1 000 / 1.000) and a decimal part
+_NUMBER = re.compile(r"\d+(?:[.,'\u00a0\u202f ]\d{3})*(?:[.,]\d+)?")
+_URL = re.compile(r"(?:https?://|www\.)[^\s<>\"]+", re.IGNORECASE)
+_QUESTION = re.compile(r"[?\uff1f\u037e]\s*$|^\s*\u00bf")
+# Added to both lengths so short sentences are not rejected over a few characters
+_LENGTH_SMOOTHING = 10.0
+# Target columns compared at once when masking a whole source block
+_MASK_CHUNK = 16384
+
+
+def _numbers(sentence: str) -> List[str]:
+    # Digits only, without leading zeros: "3,5" == "3.5", "1 000" == "1,000", "05" == "5"
+    return [re.sub(r"\D", "", n).lstrip("0") or "0" for n in _NUMBER.findall(sentence)]
+
+
+def _urls(sentence: str) -> List[str]:
+    return [u.rstrip(".,;:!?)").lower() for u in _URL.findall(sentence)]
+
+
+def _bitsets(sentences: List[str], extract) -> np.ndarray:
+    out = np.zeros(len(sentences), dtype=np.uint64)
+    for i, sentence in enumerate(sentences):
+        bits = 0
+        for token in extract(sentence):
+            bits |= 1 << (zlib.crc32(token.encode("utf-8")) & 63)
+        out[i] = bits
+    return out
+
+
+class CandidateFilter:
+    """
+    Pair prefilter for a source and a target sentence list (as produced by
+    data.load_and_preprocess). Counts every pair it checks and rejects.
+    """
+
+    def __init__(self, source: List[str], target: List[str], max_length_ratio: float = 3.0,
+                 numbers: bool = True, urls: bool = True, punctuation: bool = False):
+        if max_length_ratio < 1.0:
+            raise ValueError(f"max_length_ratio must be >= 1, got {max_length_ratio}")
+        self.settings = {"max_length_ratio": max_length_ratio, "numbers": numbers, "urls": urls,
+                         "punctuation": punctuation}
+        self.num_tgt = len(target)
+
+        src_len = np.fromiter(map(len, source), dtype=np.float64, count=len(source))
+        tgt_len = np.fromiter(map(len, target), dtype=np.float64, count=len(target))
+        scale = tgt_len.sum() / src_len.sum() if src_len.sum() > 0 and tgt_len.sum() > 0 else 1.0
+        self._src_len = np.log(src_len * scale + _LENGTH_SMOOTHING)
+        self._tgt_len = np.log(tgt_len + _LENGTH_SMOOTHING)
+        self._max_log_ratio = np.log(max_length_ratio)
+
+        self._anchors = []
+        if numbers:
+            self._anchors.append((_bitsets(source, _numbers), _bitsets(target, _numbers)))
+        if urls:
+            self._anchors.append((_bitsets(source, _urls), _bitsets(target, _urls)))
+        self._questions = None
+        if punctuation:
+            self._questions = (np.array([bool(_QUESTION.search(s)) for s in source], dtype=bool),
+                               np.array([bool(_QUESTION.search(t)) for t in target], dtype=bool))
+        self.checked = 0
+        self.pruned = 0
+        # Retrieved pairs rejected by filter_pairs inside the aligner, for recall analysis
+        self.dropped: List[Tuple[int, int, float]] = []
+
+    def keep(self, src_idx: np.ndarray, tgt_idx: np.ndarray) -> np.ndarray:
+        """Boolean mask of allowed pairs; src_idx and tgt_idx broadcast against each other."""
+        keep = np.abs(self._src_len[src_idx] - self._tgt_len[tgt_idx]) <= self._max_log_ratio
+        for src_bits, tgt_bits in self._anchors:
+            a, b = src_bits[src_idx], tgt_bits[tgt_idx]
+            keep &= ((a & b) != 0) | (a == 0) | (b == 0)
+        if self._questions is not None:
+            keep &= self._questions[0][src_idx] == self._questions[1][tgt_idx]
+        self.checked += keep.size
+        self.pruned += keep.size - int(np.count_nonzero(keep))
+        return keep
+
+    def block_mask(self, start: int, stop: int) -> np.ndarray:
+        """(stop - start, num_tgt) mask of allowed targets for a block of source rows."""
+        rows = np.arange(start, stop)[:, None]
+        mask = np.empty((stop - start, self.num_tgt), dtype=bool)
+        for col in range(0, self.num_tgt, _MASK_CHUNK):
+            cols = np.arange(col, min(col + _MASK_CHUNK, self.num_tgt))[None, :]
+            mask[:, col:col + _MASK_CHUNK] = self.keep(rows, cols)
+        return mask
+
+    def filter_pairs(self, pairs: List[Tuple[int, int, float]]) -> Tuple[List[Tuple[int, int, float]],
+                                                                     List[Tuple[int, int, float]]]:
+        """Split retrieved (src, tgt, score) pairs into (kept, dropped)."""
+        if not pairs:
+            return [], []
+        idx = np.array([(i, j) for i, j, _ in pairs], dtype=np.int64)
+        keep = self.keep(idx[:, 0], idx[:, 1])
+        kept = [p for p, k in zip(pairs, keep) if k]
+        dropped = [p for p, k in zip(pairs, keep) if not k]
+        return kept, dropped
+
+    @property
+    def pruning_ratio(self) -> float:
+        return self.pruned / self.checked if self.checked else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {"checked": self.checked, "pruned": self.pruned, "pruning_ratio": self.pruning_ratio,
+                "dropped_pairs": len(self.dropped)}
@@ -0,0 +1,203 @@
+"""
+Per-stage wall time, CPU time, peak RSS and throughput for alignment runs.
+"""
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds between RSS samples while a stage runs
+_RSS_INTERVAL_S = 0.05
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+STAGES = ("extraction", "segmentation", "preprocessing", "encoding", "reduction",
+          "block_alignment", "index_build", "search", "resolution", "writing",
+          "evaluation")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Lifetime RSS high-water mark of this process or its reaped children (e.g. one benchmark case)."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _current_rss_mb() -> Optional[float]:
+    """Resident set size of this process now (from /proc, else psutil if installed)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / 2**20
+
+
+class _RssSampler:
+    """Samples RSS in a background thread; start_mb and peak_mb cover the with-block only."""
+
+    def __init__(self, interval: float = _RSS_INTERVAL_S):
+        self.interval = interval
+        self.start_mb = self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = _current_rss_mb()
+        if rss is not None and (self.peak_mb is None or rss > self.peak_mb):
+            self.peak_mb = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = _current_rss_mb()
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+
+
+def _children_cpu() -> float:
+    # Worker processes are only accounted once they have been reaped, which
+    # the process pools in this package do before their stage ends.
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageProfiler:
+    """
+    Accumulates wall time, CPU time (this process and its reaped workers),
+    memory and item throughput per named stage. Repeated stages (e.g. source
+    and target extraction) add up. peak_rss_mb is the highest RSS of this
+    process sampled while the stage ran (worker processes are not included),
+    and rss_growth_mb how far that peak rose above the RSS at the stage's
+    start; for repeated stages both are the maximum over calls. A stage
+    entered inside another (e.g. writing streamed pairs during the search)
+    is recorded on its own and its time is not counted in the outer stage.
+    With profile_code=True each stage also runs under its own cProfile
+    profiler so the hottest one can be dumped.
+    """
+
+    def __init__(self, profile_code: bool = False):
+        self.profile_code = profile_code
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        # Per running stage: [cProfile profiler or None, wall s, cpu s spent in nested stages]
+        self._active: List[list] = []
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        """Time a block; the yielded dict's "items" may be updated inside it."""
+        counters = {"items": items}
+        profile = None
+        if self.profile_code:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+        outer = self._active[-1] if self._active else None
+        frame = [profile, 0.0, 0.0]
+        self._active.append(frame)
+        wall = time.perf_counter()
+        cpu = time.process_time() + _children_cpu()
+        try:
+            with _RssSampler() as rss:
+                # Only one cProfile profiler can run at a time
+                if outer is not None and outer[0] is not None:
+                    outer[0].disable()
+                if profile is not None:
+                    profile.enable()
+                try:
+                    yield counters
+                finally:
+                    if profile is not None:
+                        profile.disable()
+                    if outer is not None and outer[0] is not None:
+                        outer[0].enable()
+        finally:
+            self._active.pop()
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() + _children_cpu() - cpu
+            if outer is not None:
+                outer[1] += wall
+                outer[2] += cpu
+            record = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "items": 0, "calls": 0,
+                                                   "peak_rss_mb": None, "rss_growth_mb": None})
+            record["wall_s"] += wall - frame[1]
+            record["cpu_s"] += cpu - frame[2]
+            record["items"] += counters["items"]
+            record["calls"] += 1
+            if rss.peak_mb is not None:
+                record["peak_rss_mb"] = max(record["peak_rss_mb"] or 0.0, rss.peak_mb)
+                record["rss_growth_mb"] = max(record["rss_growth_mb"] or 0.0, rss.peak_mb - rss.start_mb)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        order = [s for s in STAGES if s in self.stages] + [s for s in self.stages if s not in STAGES]
+        report = {}
+        for name in order:
+            record = dict(self.stages[name])
+            record["items_per_s"] = record["items"] / record["wall_s"] if record["wall_s"] > 0 else None
+            report[name] = record
+        return report
+
+    def hottest(self) -> Optional[str]:
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda name: self.stages[name]["wall_s"])
+
+    def format_table(self) -> str:
+        report = self.report()
+        total = sum(r["wall_s"] for r in report.values()) or 1.0
+        lines = [f"{'stage':<14}{'wall s':>10}{'cpu s':>10}{'share':>8}{'peak MB':>10}{'+MB':>8}"
+                 f"{'items':>11}{'items/s':>12}"]
+        for name, r in report.items():
+            rss = f"{r['peak_rss_mb']:.0f}" if r["peak_rss_mb"] is not None else "-"
+            growth = f"{r['rss_growth_mb']:.0f}" if r["rss_growth_mb"] is not None else "-"
+            rate = f"{r['items_per_s']:.1f}" if r["items_per_s"] and r["items"] else "-"
+            lines.append(f"{name:<14}{r['wall_s']:>10.3f}{r['cpu_s']:>10.3f}{r['wall_s'] / total:>8.1%}"
+                         f"{rss:>10}{growth:>8}{r['items']:>11}{rate:>12}")
+        return "\n".join(lines)
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"stages": self.report(), "hottest": self.hottest()}, f, indent=2)
+
+    def dump_hottest(self, path: str) -> Optional[str]:
+        """Write the hottest stage's cProfile stats (pstats format) to path."""
+        name = self.hottest()
+        if name is None or name not in self._profiles:
+            return None
+        self._profiles[name].dump_stats(path)
+        return name
+
+
+def maybe_stage(profiler: Optional[StageProfiler], name: str, items: int = 0):
+    """profiler.stage(...) when profiling, otherwise a no-op context."""
+    if profiler is None:
+        return nullcontext({"items": items})
+    return profiler.stage(name, items)
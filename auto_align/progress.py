@@ -0,0 +1,152 @@
+"""
+Progress and throughput hooks for long alignment runs.
+"""
+import logging
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AlignmentObserver:
+    """
+    Receives progress from align_sentences. Subclass and override any hook;
+    the defaults do nothing. `stats` holds:
+      phase               "encoding" or "search"
+      sentences_encoded   / sentences_total
+      blocks_searched     / blocks_total
+      pairs_emitted
+      sentences_per_s     throughput of the current phase
+      elapsed_s           since the run started
+      eta_s               estimated seconds left in the current phase (None if unknown)
+    """
+
+    def on_start(self, num_src: int, num_tgt: int):
+        pass
+
+    def on_progress(self, stats: Dict[str, object]):
+        pass
+
+    def on_pairs(self, pairs: List[Tuple[int, int, float]]):
+        """Pairs emitted by one finished search block, in output order."""
+        pass
+
+    def on_finish(self, stats: Dict[str, object]):
+        pass
+
+
+class ProgressReporter:
+    """Turns raw counters into the stats passed to an AlignmentObserver."""
+
+    def __init__(self, observer: AlignmentObserver, num_src: int, num_tgt: int):
+        self.observer = observer
+        self.started = time.perf_counter()
+        self._phase_started = self.started
+        self._phase_done = 0
+        self.stats = {
+            "phase": "encoding",
+            "sentences_encoded": 0,
+            "sentences_total": num_src + num_tgt,
+            "blocks_searched": 0,
+            "blocks_total": 0,
+            "pairs_emitted": 0,
+            "sentences_per_s": 0.0,
+            "elapsed_s": 0.0,
+            "eta_s": None,
+        }
+        observer.on_start(num_src, num_tgt)
+
+    def _emit(self, done: int, total: int, rows: int):
+        now = time.perf_counter()
+        phase_elapsed = now - self._phase_started
+        rate = rows / phase_elapsed if phase_elapsed > 0 else 0.0
+        self.stats["sentences_per_s"] = rate
+        self.stats["elapsed_s"] = now - self.started
+        if done and total:
+            self.stats["eta_s"] = phase_elapsed * (total - done) / done
+        self.observer.on_progress(dict(self.stats))
+
+    def encoded(self, count: int):
+        self.stats["sentences_encoded"] += count
+        self._emit(self.stats["sentences_encoded"], self.stats["sentences_total"],
+                   self.stats["sentences_encoded"])
+
+    def start_search(self, blocks_total: int):
+        self.stats.update(phase="search", blocks_total=blocks_total, eta_s=None)
+        self._phase_started = time.perf_counter()
+        self._phase_done = 0
+
+    def searched(self, rows: int, pairs: List[Tuple[int, int, float]]):
+        self.stats["blocks_searched"] += 1
+        self.stats["pairs_emitted"] += len(pairs)
+        self._phase_done += rows
+        if pairs:
+            self.observer.on_pairs(pairs)
+        self._emit(self.stats["blocks_searched"], self.stats["blocks_total"], self._phase_done)
+
+    def finish(self):
+        self.stats["elapsed_s"] = time.perf_counter() - self.started
+        self.stats["eta_s"] = 0.0
+        self.observer.on_finish(dict(self.stats))
+
+
+class ConsoleProgress(AlignmentObserver):
+    """Single-line progress bar on a terminal stream (stderr by default)."""
+
+    def __init__(self, stream=None, width: int = 30, min_interval: float = 0.2):
+        self.stream = stream or sys.stderr
+        self.width = width
+        self.min_interval = min_interval
+        self._last = 0.0
+
+    def _draw(self, stats, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last < self.min_interval:
+            return
+        self._last = now
+        if stats["phase"] == "encoding":
+            done, total, unit = stats["sentences_encoded"], stats["sentences_total"], "sent"
+        else:
+            done, total, unit = stats["blocks_searched"], stats["blocks_total"], "blocks"
+        frac = done / total if total else 1.0
+        bar = "#" * int(frac * self.width)
+        eta = f"{stats['eta_s']:.0f}s" if stats["eta_s"] is not None else "?"
+        self.stream.write(f"\r{stats['phase']:<9}[{bar:<{self.width}}] {done}/{total} {unit} "
+                          f"{stats['sentences_per_s']:.0f} sent/s, {stats['pairs_emitted']} pairs, ETA {eta}   ")
+        self.stream.flush()
+
+    def on_progress(self, stats):
+        self._draw(stats)
+
+    def on_finish(self, stats):
+        self._draw(stats, force=True)
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+class ObserverGroup(AlignmentObserver):
+    """Forwards every hook to several observers, e.g. a progress bar and a writers.PairWriter."""
+
+    def __init__(self, observers: List[AlignmentObserver]):
+        self.observers = list(observers)
+
+    def on_start(self, num_src, num_tgt):
+        for observer in self.observers:
+            observer.on_start(num_src, num_tgt)
+
+    def on_progress(self, stats):
+        for observer in self.observers:
+            observer.on_progress(stats)
+
+    def on_pairs(self, pairs):
+        for observer in self.observers:
+            observer.on_pairs(pairs)
+
+    def on_finish(self, stats):
+        for observer in self.observers:
+            observer.on_finish(stats)
+
+
+def make_reporter(observer: Optional[AlignmentObserver], num_src: int, num_tgt: int) -> Optional[ProgressReporter]:
+    return ProgressReporter(observer, num_src, num_tgt) if observer is not None else None
@@ -0,0 +1,179 @@
+"""
+Learned dimensionality reduction (PCA or OPQ) of sentence embeddings before indexing.
+
+A transform is fitted on sample embeddings of a language pair, saved as a
+faiss VectorTransform file and applied to both sides in align_sentences.
+Which pairs use one, and at what size, is configured in
+constants/language_pairs_encoder.py (PREFERRED_REDUCTION).
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from auto_align.constants.language_pairs_encoder import PREFERRED_REDUCTION
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("pca", "opq")
+_APPLY_CHUNK = 65536
+
+
+def fit_reduction(sample: np.ndarray, method: str = "pca", dim: int = 256) -> faiss.VectorTransform:
+    """Fit a method ('pca' or 'opq') projection from sample.shape[1] to dim dimensions."""
+    sample = np.ascontiguousarray(sample, dtype=np.float32)
+    d_in = sample.shape[1]
+    if not 0 < dim < d_in:
+        raise ValueError(f"Reduced dimension must be between 1 and {d_in - 1}, got {dim}")
+    if len(sample) < d_in:
+        raise ValueError(f"Fitting a {d_in}-dimensional reduction needs at least {d_in} sample embeddings, "
+                         f"got {len(sample)}")
+    if method == "pca":
+        transform = faiss.PCAMatrix(d_in, dim)
+    elif method == "opq":
+        # OPQ learns a rotation for dim/4 sub-quantizers of 4 dimensions each
+        subquantizers = next(m for m in (dim // 4, 16, 8, 4, 2, 1) if m and dim % m == 0)
+        transform = faiss.OPQMatrix(d_in, subquantizers, dim)
+    else:
+        raise ValueError(f"Unknown reduction method '{method}'; expected one of {', '.join(METHODS)}")
+    logger.info(f"Fitting {method.upper()} {d_in} -> {dim} on {len(sample)} embeddings")
+    transform.train(sample)
+    return transform
+
+
+def apply_reduction(transform: faiss.VectorTransform, embeddings) -> np.ndarray:
+    """
+    Project embeddings (an array or embedding_store.EmbeddingStore) in chunks
+    and re-normalize the rows, returning a new float32 matrix.
+    """
+    if embeddings.shape[1] != transform.d_in:
+        raise ValueError(f"Reduction expects {transform.d_in}-dimensional embeddings, "
+                         f"got {embeddings.shape[1]}")
+    out = np.empty((len(embeddings), transform.d_out), dtype=np.float32)
+    for start in range(0, len(embeddings), _APPLY_CHUNK):
+        block = np.ascontiguousarray(embeddings[start:start + _APPLY_CHUNK], dtype=np.float32)
+        out[start:start + len(block)] = transform.apply(block)
+    faiss.normalize_L2(out)
+    return out
+
+
+def transform_digest(transform: faiss.VectorTransform) -> str:
+    """Content hash of a linear transform, for checkpoint fingerprints."""
+    linear = faiss.downcast_VectorTransform(transform)
+    h = hashlib.sha256(f"{type(linear).__name__}:{linear.d_in}:{linear.d_out}".encode("utf-8"))
+    h.update(faiss.vector_to_array(linear.A).tobytes())
+    h.update(faiss.vector_to_array(linear.b).tobytes())
+    return h.hexdigest()
+
+
+def load_reduction(reduction) -> faiss.VectorTransform:
+    """A fitted transform, or the path of one written by save_reduction."""
+    if isinstance(reduction, faiss.VectorTransform):
+        return reduction
+    if not os.path.exists(reduction):
+        raise ValueError(f"Reduction file not found: {reduction}")
+    return faiss.read_VectorTransform(str(reduction))
+
+
+def check_reduction(reduction, encoder: Optional[str] = None, dim: Optional[int] = None) -> faiss.VectorTransform:
+    """
+    Load a reduction and make sure it fits the embeddings it will be applied to:
+    its input dimension must equal dim and, when its save_reduction report
+    records one, its encoder must equal encoder. Raises ValueError otherwise.
+    """
+    transform = load_reduction(reduction)
+    if dim and transform.d_in != dim:
+        raise ValueError(f"Reduction expects {transform.d_in}-dimensional embeddings, got {dim}-dimensional ones")
+    if encoder and not isinstance(reduction, faiss.VectorTransform):
+        report_path = os.path.splitext(reduction)[0] + ".json"
+        if os.path.exists(report_path):
+            with open(report_path, "r", encoding="utf-8") as f:
+                fitted = json.load(f).get("encoder")
+            if fitted and fitted != encoder:
+                raise ValueError(f"Reduction {reduction} was fitted on '{fitted}' embeddings, not '{encoder}'")
+    return transform
+
+
+def reduction_filename(encoder: str, src_lang: str, tgt_lang: str, method: str, dim: int) -> str:
+    # Fitted on both sides, so the file serves both directions of a pair
+    first, second = sorted((src_lang, tgt_lang))
+    return f"{encoder}_{first}-{second}_{method}{dim}.vt"
+
+
+def save_reduction(transform: faiss.VectorTransform, path: str, report: Optional[Dict[str, object]] = None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    faiss.write_VectorTransform(transform, str(path))
+    if report is not None:
+        with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    logger.info(f"Reduction saved to {path}")
+
+
+def preferred_reduction(src_lang: str, tgt_lang: str) -> Optional[Tuple[str, int]]:
+    pair = (src_lang.lower(), tgt_lang.lower())
+    return PREFERRED_REDUCTION.get(pair) or PREFERRED_REDUCTION.get((pair[1], pair[0]))
+
+
+def resolve_reduction(reduction_dir: Optional[str], encoder: str, src_lang: str, tgt_lang: str) -> Optional[str]:
+    """Path of the configured reduction for this encoder and pair in reduction_dir, if one is configured and fitted."""
+    preferred = preferred_reduction(src_lang, tgt_lang)
+    if preferred is None or not reduction_dir:
+        return None
+    method, dim = preferred
+    path = os.path.join(reduction_dir, reduction_filename(encoder, src_lang, tgt_lang, method, dim))
+    if not os.path.exists(path):
+        logger.warning(f"{method.upper()}-{dim} reduction is configured for {src_lang}-{tgt_lang} but {path} "
+                       f"has not been fitted; searching full-dimensional embeddings")
+        return None
+    return path
+
+
+def reduction_report(transform: faiss.VectorTransform, src_emb: np.ndarray, tgt_emb: np.ndarray,
+                     threshold: float = 0.7, topk: int = 5, batch_size: int = 512) -> Dict[str, object]:
+    """
+    Align sample embeddings at full and at reduced dimension and compare
+    index size, search time and how many of the full-dimension pairs survive.
+    """
+    from auto_align.aligner import search_aligned
+
+    def timed(src, tgt):
+        started = time.perf_counter()
+        pairs = search_aligned(src, tgt, threshold=threshold, topk=topk, batch_size=batch_size)
+        return pairs, time.perf_counter() - started
+
+    full_pairs, full_s = timed(src_emb, tgt_emb)
+    reduced_src, reduced_tgt = apply_reduction(transform, src_emb), apply_reduction(transform, tgt_emb)
+    reduced_pairs, reduced_s = timed(reduced_src, reduced_tgt)
+
+    full_set = {(i, j) for i, j, _ in full_pairs}
+    reduced_set = {(i, j) for i, j, _ in reduced_pairs}
+    full_top1 = {i: j for i, j, _ in reversed(full_pairs)}
+    reduced_top1 = {i: j for i, j, _ in reversed(reduced_pairs)}
+    report = {
+        "dim_in": transform.d_in,
+        "dim_out": transform.d_out,
+        "sample_src": len(src_emb),
+        "sample_tgt": len(tgt_emb),
+        "threshold": threshold,
+        "full_search_s": full_s,
+        "reduced_search_s": reduced_s,
+        "speedup": full_s / reduced_s if reduced_s > 0 else None,
+        "index_bytes_full": int(tgt_emb.shape[1]) * len(tgt_emb) * 4,
+        "index_bytes_reduced": transform.d_out * len(tgt_emb) * 4,
+        "full_pairs": len(full_set),
+        "reduced_pairs": len(reduced_set),
+        "pairs_retained": len(full_set & reduced_set) / len(full_set) if full_set else None,
+        "top1_agreement": (sum(reduced_top1.get(i) == j for i, j in full_top1.items()) / len(full_top1)
+                           if full_top1 else None),
+    }
+    logger.info(f"Reduction {report['dim_in']} -> {report['dim_out']}: search {full_s:.3f}s -> {reduced_s:.3f}s, "
+                f"{report['pairs_retained'] or 0:.1%} of {len(full_set)} pairs retained, "
+                f"top-1 agreement {report['top1_agreement'] or 0:.1%}")
+    return report
@@ -0,0 +1,304 @@
+"""
+Streaming writers for aligned pairs.
+
+Every writer takes batches of (src_idx, tgt_idx, score) pairs as they are
+produced and writes them out immediately, so results need not be kept in
+memory. Writers are AlignmentObservers: passed (alone or in a
+progress.ObserverGroup) as align_sentences' observer, they receive each
+search block's pairs as soon as it finishes.
+
+The "index" format stores only the pairs, as 12-byte records, plus one table
+of each side's sentences; read_pair_index memory-maps the pairs back:
+    magic, header length (uint32), JSON header (padded to 8 bytes)
+    source table: (num_src + 1) uint64 byte offsets, UTF-8 blob (padded)
+    target table: same
+    pairs: PAIR_DTYPE records, appended while aligning
+    footer: pair count (uint64), magic
+"""
+import json
+import logging
+import os
+import struct
+from contextlib import ExitStack
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from lxml import etree
+
+from auto_align.profiling import maybe_stage
+from auto_align.progress import AlignmentObserver
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("tsv", "jsonl", "tmx", "parquet", "arrow", "index")
+PAIR_DTYPE = np.dtype([("src", "<u4"), ("tgt", "<u4"), ("score", "<f4")])
+INDEX_MAGIC = b"UKRAAPI1"
+INDEX_FORMAT = 1
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+# Rows buffered per Parquet row group / Arrow record batch
+_ARROW_BATCH = 65536
+
+
+class PairWriter(AlignmentObserver):
+    """
+    Base class: write(pairs) appends a batch, close() finalizes the file and
+    abort() deletes it after a failure. As a context manager it closes the
+    file on success and aborts it when an exception escapes. With a profiler
+    (a profiling.StageProfiler), pairs received as an observer are timed as
+    the "writing" stage, apart from the search that streams them.
+    """
+
+    def __init__(self, path: str, source_sentences: List[str], target_sentences: List[str],
+                 src_lang: Optional[str] = None, tgt_lang: Optional[str] = None):
+        self.path = str(path)
+        self.source_sentences = source_sentences
+        self.target_sentences = target_sentences
+        self.src_lang = src_lang
+        self.tgt_lang = tgt_lang
+        self.count = 0
+        self.profiler = None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, pairs: List[Tuple[int, int, float]]):
+        if pairs:
+            self._write(pairs)
+            self.count += len(pairs)
+
+    def _write(self, pairs):
+        raise NotImplementedError
+
+    def on_pairs(self, pairs: List[Tuple[int, int, float]]):
+        with maybe_stage(self.profiler, "writing", items=len(pairs)):
+            self.write(pairs)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Release the file without finalizing it (no closing tags or footer) and delete it."""
+        self._discard()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+            logger.warning(f"Removed incomplete output file {self.path}")
+
+    def _discard(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class TsvWriter(PairWriter):
+    """src<TAB>tgt<TAB>score lines, as data.save_aligned_pairs writes them."""
+
+    def __init__(self, path, source_sentences, target_sentences, src_lang=None, tgt_lang=None):
+        super().__init__(path, source_sentences, target_sentences, src_lang, tgt_lang)
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def _write(self, pairs):
+        src, tgt = self.source_sentences, self.target_sentences
+        self._file.writelines(f"{src[i]}\t{tgt[j]}\t{score:.4f}\n" for i, j, score in pairs)
+
+    def close(self):
+        self._file.close()
+
+    _discard = close
+
+
+class JsonlWriter(PairWriter):
+    """One {"src_idx", "tgt_idx", "score", "src", "tgt"} object per line."""
+
+    def __init__(self, path, source_sentences, target_sentences, src_lang=None, tgt_lang=None):
+        super().__init__(path, source_sentences, target_sentences, src_lang, tgt_lang)
+        self._file = open(self.path, "w", encoding="utf-8")
+
+    def _write(self, pairs):
+        src, tgt = self.source_sentences, self.target_sentences
+        self._file.writelines(
+            json.dumps({"src_idx": i, "tgt_idx": j, "score": round(score, 4), "src": src[i], "tgt": tgt[j]},
+                       ensure_ascii=False) + "\n"
+            for i, j, score in pairs)
+
+    def close(self):
+        self._file.close()
+
+    _discard = close
+
+
+class TmxWriter(PairWriter):
+    """TMX 1.4 written element by element; the score is kept as an x-score prop."""
+
+    def __init__(self, path, source_sentences, target_sentences, src_lang=None, tgt_lang=None):
+        if not (src_lang and tgt_lang):
+            raise ValueError("TMX output needs source and target language codes")
+        super().__init__(path, source_sentences, target_sentences, src_lang, tgt_lang)
+        # The file is owned here so abort() can close it without the closing tags
+        self._file = open(self.path, "wb")
+        self._stack = ExitStack()
+        self._xf = self._stack.enter_context(etree.xmlfile(self._file, encoding="utf-8"))
+        self._xf.write_declaration()
+        self._stack.enter_context(self._xf.element("tmx", version="1.4"))
+        self._xf.write(etree.Element("header", creationtool="ukraa", creationtoolversion="0.1.0",
+                                     segtype="sentence", adminlang="en", srclang=src_lang,
+                                     datatype="plaintext", **{"o-tmf": "ukraa"}))
+        self._stack.enter_context(self._xf.element("body"))
+
+    def _write(self, pairs):
+        for i, j, score in pairs:
+            tu = etree.Element("tu")
+            etree.SubElement(tu, "prop", type="x-score").text = f"{score:.4f}"
+            for lang, text in ((self.src_lang, self.source_sentences[i]), (self.tgt_lang, self.target_sentences[j])):
+                tuv = etree.SubElement(tu, "tuv", {_XML_LANG: lang})
+                etree.SubElement(tuv, "seg").text = text
+            self._xf.write(tu)
+        self._xf.flush()
+
+    def close(self):
+        self._stack.close()
+        self._file.close()
+
+    def _discard(self):
+        self._file.close()
+
+
+class ArrowWriter(PairWriter):
+    """Parquet (parquet=True) or Arrow IPC file with src_idx, tgt_idx, score, src and tgt columns."""
+
+    def __init__(self, path, source_sentences, target_sentences, src_lang=None, tgt_lang=None,
+                 parquet: bool = True):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("pyarrow is not installed; install it with: pip install pyarrow")
+        super().__init__(path, source_sentences, target_sentences, src_lang, tgt_lang)
+        self._pa = pa
+        metadata = {"src_lang": src_lang or "", "tgt_lang": tgt_lang or ""}
+        self._schema = pa.schema([("src_idx", pa.int32()), ("tgt_idx", pa.int32()), ("score", pa.float32()),
+                                  ("src", pa.string()), ("tgt", pa.string())], metadata=metadata)
+        self._sink = None
+        if parquet:
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression="zstd")
+        else:
+            self._sink = pa.OSFile(self.path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+        self._buffer = []
+
+    def _write(self, pairs):
+        self._buffer.extend(pairs)
+        if len(self._buffer) >= _ARROW_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        src_idx, tgt_idx, scores = zip(*self._buffer)
+        self._writer.write_table(self._pa.table({
+            "src_idx": src_idx,
+            "tgt_idx": tgt_idx,
+            "score": scores,
+            "src": [self.source_sentences[i] for i in src_idx],
+            "tgt": [self.target_sentences[j] for j in tgt_idx],
+        }, schema=self._schema))
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._discard()
+
+    def _discard(self):
+        self._writer.close()
+        if self._sink is not None:
+            self._sink.close()
+
+
+class IndexWriter(PairWriter):
+    """Compact binary index format (see the module docstring); read with read_pair_index."""
+
+    def __init__(self, path, source_sentences, target_sentences, src_lang=None, tgt_lang=None):
+        super().__init__(path, source_sentences, target_sentences, src_lang, tgt_lang)
+        header = json.dumps({"format": INDEX_FORMAT, "src_lang": src_lang, "tgt_lang": tgt_lang,
+                             "num_src": len(source_sentences), "num_tgt": len(target_sentences),
+                             "pair_dtype": PAIR_DTYPE.descr}).encode("utf-8")
+        header += b" " * (-(len(INDEX_MAGIC) + 4 + len(header)) % 8)
+        self._file = open(self.path, "wb")
+        self._file.write(INDEX_MAGIC + struct.pack("<I", len(header)) + header)
+        for sentences in (source_sentences, target_sentences):
+            encoded = [s.encode("utf-8") for s in sentences]
+            offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            blob = b"".join(encoded)
+            self._file.write(offsets.tobytes())
+            self._file.write(blob + b"\0" * (-len(blob) % 8))
+
+    def _write(self, pairs):
+        records = np.array(pairs, dtype=[("src", "<i8"), ("tgt", "<i8"), ("score", "<f8")]).astype(PAIR_DTYPE)
+        self._file.write(records.tobytes())
+
+    def close(self):
+        self._file.write(struct.pack("<Q", self.count) + INDEX_MAGIC)
+        self._file.close()
+
+    def _discard(self):
+        self._file.close()
+
+
+def open_writer(fmt: str, path: str, source_sentences: List[str], target_sentences: List[str],
+                src_lang: Optional[str] = None, tgt_lang: Optional[str] = None, profiler=None) -> PairWriter:
+    """Writer for one of OUTPUT_FORMATS; profiler times the pairs it receives as an observer."""
+    if fmt == "tsv":
+        writer = TsvWriter(path, source_sentences, target_sentences, src_lang, tgt_lang)
+    elif fmt == "jsonl":
+        writer = JsonlWriter(path, source_sentences, target_sentences, src_lang, tgt_lang)
+    elif fmt == "tmx":
+        writer = TmxWriter(path, source_sentences, target_sentences, src_lang, tgt_lang)
+    elif fmt in ("parquet", "arrow"):
+        writer = ArrowWriter(path, source_sentences, target_sentences, src_lang, tgt_lang, parquet=fmt == "parquet")
+    elif fmt == "index":
+        writer = IndexWriter(path, source_sentences, target_sentences, src_lang, tgt_lang)
+    else:
+        raise ValueError(f"Unknown output format '{fmt}'; expected one of {', '.join(OUTPUT_FORMATS)}")
+    writer.profiler = profiler
+    return writer
+
+
+def _read_table(data: np.memmap, offset: int, count: int) -> Tuple[List[str], int]:
+    offsets = np.frombuffer(data, dtype="<u8", count=count + 1, offset=offset)
+    start = offset + offsets.nbytes
+    blob = data[start:start + int(offsets[-1])].tobytes()
+    sentences = [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    return sentences, start + int(offsets[-1]) + (-int(offsets[-1]) % 8)
+
+
+def read_pair_index(path: str) -> Tuple[np.ndarray, List[str], List[str], Dict[str, object]]:
+    """
+    Read a file written by IndexWriter.
+    :return: (pairs, source_sentences, target_sentences, header); pairs is a
+             read-only memory-mapped PAIR_DTYPE array with fields src, tgt, score.
+    """
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    if data[:len(INDEX_MAGIC)].tobytes() != INDEX_MAGIC:
+        raise ValueError(f"{path} is not an alignment index file")
+    header_len = struct.unpack("<I", data[8:12].tobytes())[0]
+    header = json.loads(data[12:12 + header_len].tobytes())
+    if header.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{path} has unsupported index format {header.get('format')}")
+    source, offset = _read_table(data, 12 + header_len, header["num_src"])
+    target, offset = _read_table(data, offset, header["num_tgt"])
+
+    footer = len(data) - 8 - len(INDEX_MAGIC)
+    if footer >= offset and data[-len(INDEX_MAGIC):].tobytes() == INDEX_MAGIC:
+        count = struct.unpack("<Q", data[footer:footer + 8].tobytes())[0]
+    else:
+        count = (len(data) - offset) // PAIR_DTYPE.itemsize
+        logger.warning(f"{path} was not closed properly; reading the {count} complete pairs it holds")
+    pairs = np.ndarray((count,), dtype=PAIR_DTYPE, buffer=data, offset=offset)
+    return pairs, source, target, header
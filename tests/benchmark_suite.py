@@ -0,0 +1,247 @@
+"""
+Offline, deterministic benchmark suite.
+
+Uses the hash-based "stub" encoder and synthetic parallel corpora, so it needs
+no model or dataset downloads and gives comparable numbers across runs.
+For every corpus size it measures, each case in a fresh process so peak RSS
+is per case:
+  encode      raw encoder time and the normalization overhead of encode_normalized
+  faiss       align_sentences (FAISS) end to end, its search share and recall
+  torch       align_sentences_no_faiss end to end, its search share and recall
+  evaluation  evaluate_alignment (P/R/F1, TER, BLEU, chrF; no BERTScore)
+
+    python tests/benchmark_suite.py --sizes 1000,10000,100000 --output bench.json
+    python tests/benchmark_suite.py --save-baseline tests/benchmark_baseline.json
+    python tests/benchmark_suite.py --baseline tests/benchmark_baseline.json
+
+With --baseline the exit status is 1 when any timing or memory figure grew by
+more than --tolerance, or recall dropped, compared with the baseline.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger(__name__)
+
+CASES = ("encode", "faiss", "torch", "evaluation")
+SEED = 1234
+VOCAB_SIZE = 20000
+UNPAIRED_FRACTION = 0.1
+WORD_NOISE = 0.15
+
+
+def make_corpus(size: int, seed: int = SEED) -> Tuple[List[str], List[str], Set[Tuple[int, int]]]:
+    """
+    `size` source sentences and `size` target sentences over a pseudo-word
+    vocabulary. Most targets are noisy copies of a source sentence (some words
+    replaced), shuffled; the rest on both sides have no counterpart.
+    :return: (source, target, gold index pairs)
+    """
+    rng = np.random.default_rng(seed + size)
+    syllables = ["ka", "lo", "mi", "ne", "su", "ra", "te", "vo", "zi", "pa", "do", "gu", "be", "fi", "ho", "ju"]
+    vocab = ["".join(rng.choice(syllables, size=rng.integers(2, 5))) + str(i % 97) for i in range(VOCAB_SIZE)]
+    # Zipf-like word frequencies, as in real text
+    weights = 1.0 / np.arange(1, VOCAB_SIZE + 1)
+    weights /= weights.sum()
+
+    def sentence():
+        return rng.choice(VOCAB_SIZE, size=rng.integers(5, 26), p=weights)
+
+    paired = size - int(size * UNPAIRED_FRACTION)
+    source_words = [sentence() for _ in range(size)]
+    target_words = []
+    for words in source_words[:paired]:
+        noisy = words.copy()
+        mask = rng.random(len(noisy)) < WORD_NOISE
+        noisy[mask] = rng.choice(VOCAB_SIZE, size=int(mask.sum()), p=weights)
+        target_words.append(noisy)
+    target_words.extend(sentence() for _ in range(size - paired))
+
+    order = rng.permutation(size)
+    position = np.empty(size, dtype=np.int64)
+    position[order] = np.arange(size)
+    source = [" ".join(vocab[w] for w in words) + "." for words in source_words]
+    target = [" ".join(vocab[w] for w in target_words[k]) + "." for k in order]
+    gold = {(i, int(position[i])) for i in range(paired)}
+    return source, target, gold
+
+
+def _recall(pairs, gold) -> float:
+    found = {(i, j) for i, j, _ in pairs} & gold
+    return len(found) / len(gold) if gold else 0.0
+
+
+def _encode_seconds(encoder, source, target) -> float:
+    t0 = time.perf_counter()
+    encoder.encode(source, lang="en")
+    encoder.encode(target, lang="uk")
+    return time.perf_counter() - t0
+
+
+def run_case(case: str, size: int, threshold: float, topk: int, batch_size: int) -> Dict[str, float]:
+    """Run one case in the current (fresh) process and return its metrics."""
+    from auto_align.profiling import peak_rss_mb
+    from auto_align.encoders.encoder_factory import get_encoder
+
+    source, target, gold = make_corpus(size)
+    encoder = get_encoder("stub")
+    result = {"sentences": 2 * size}
+
+    if case == "encode":
+        from auto_align.aligner import encode_normalized
+        encode_s = _encode_seconds(encoder, source, target)
+        t0 = time.perf_counter()
+        encode_normalized(encoder, source, "en")
+        encode_normalized(encoder, target, "uk")
+        normalized_s = time.perf_counter() - t0
+        result.update(encode_s=encode_s, normalize_overhead_s=max(normalized_s - encode_s, 0.0),
+                      sentences_per_sec=2 * size / encode_s)
+
+    elif case in ("faiss", "torch"):
+        if case == "faiss":
+            from auto_align.aligner import align_sentences as align
+        else:
+            from auto_align.aligner_no_faiss import align_sentences_no_faiss as align
+        encode_s = _encode_seconds(encoder, source, target)
+        t0 = time.perf_counter()
+        pairs = align(source, target, "en", "uk", encoder_name="stub",
+                      threshold=threshold, topk=topk, batch_size=batch_size)
+        align_s = time.perf_counter() - t0
+        # The stub encoder is deterministic and stateless, so the separately
+        # timed encode is a fair estimate of the encode share of align_s.
+        result.update(align_s=align_s, search_s=max(align_s - encode_s, 0.0),
+                      pairs=len(pairs), recall=_recall(pairs, gold))
+
+    elif case == "evaluation":
+        from auto_align.aligner import encode_normalized, search_aligned
+        from auto_align.evaluation import evaluate_alignment
+        pairs = search_aligned(encode_normalized(encoder, source, "en"), encode_normalized(encoder, target, "uk"),
+                               threshold=threshold, topk=topk, batch_size=batch_size)
+        t0 = time.perf_counter()
+        metrics = evaluate_alignment(pairs, source, target, gold, bertscore=False)
+        result.update(evaluation_s=time.perf_counter() - t0, pairs=len(pairs), f1=metrics.get("f1", 0.0))
+
+    else:
+        raise ValueError(f"Unknown benchmark case '{case}'")
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def run_suite(sizes: List[int], cases: List[str], threshold: float, topk: int, batch_size: int,
+              max_torch_size: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        for case in cases:
+            if case == "torch" and size > max_torch_size:
+                logger.info(f"Skipping torch@{size} (above --max-torch-size {max_torch_size})")
+                continue
+            logger.info(f"Running {case}@{size}")
+            # A fresh process per case keeps peak RSS and caches independent.
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                metrics = pool.submit(run_case, case, size, threshold, topk, batch_size).result()
+            logger.info(f"  {metrics}")
+            results[f"{case}@{size}"] = metrics
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float, min_seconds: float) -> List[str]:
+    """Regression messages for metrics that got worse than baseline by more than tolerance."""
+    regressions = []
+    for key, metrics in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for name, value in metrics.items():
+            old = base.get(name)
+            if old is None or value is None:
+                continue
+            if name.endswith("_s"):
+                # Ignore timings too short to measure reliably
+                if value > old * (1 + tolerance) and value - old > min_seconds:
+                    regressions.append(f"{key} {name}: {old:.3f}s -> {value:.3f}s")
+            elif name == "peak_rss_mb":
+                if value > old * (1 + tolerance):
+                    regressions.append(f"{key} {name}: {old:.0f} -> {value:.0f} MB")
+            elif name in ("recall", "f1"):
+                if value < old - 0.01:
+                    regressions.append(f"{key} {name}: {old:.4f} -> {value:.4f}")
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    info = {"python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "numpy": np.__version__}
+    for module in ("faiss", "torch", "sacrebleu"):
+        try:
+            info[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            info[module] = None
+    return info
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline alignment benchmark with a deterministic stub encoder.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated corpus sizes (sentences per side). Default=1000,10000,100000; "
+                             "add 1000000 for the full scale run")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"Comma-separated subset of {', '.join(CASES)}")
+    parser.add_argument("--threshold", type=float, default=0.7)
+    parser.add_argument("--topk", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--max-torch-size", type=int, default=100000,
+                        help="Largest size run with the no-FAISS aligner. Default=100000")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", help="Baseline results JSON to compare against")
+    parser.add_argument("--save-baseline", help="Also write the results to this path as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative slowdown / memory growth before flagging. Default=0.25")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Ignore timing changes smaller than this many seconds. Default=0.05")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown case(s): {', '.join(sorted(unknown))}")
+
+    results = run_suite(sizes, cases, args.threshold, args.topk, args.batch_size, args.max_torch_size)
+    report = {
+        "environment": environment(),
+        "config": {"seed": SEED, "threshold": args.threshold, "topk": args.topk, "batch_size": args.batch_size},
+        "results": results,
+    }
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            logger.warning(f"Baseline config {baseline.get('config')} differs from this run's {report['config']}")
+        regressions = compare(results, baseline.get("results", {}), args.tolerance, args.min_seconds)
+        if regressions:
+            logger.error(f"{len(regressions)} regression(s) against {args.baseline}:")
+            for line in regressions:
+                logger.error(f"  {line}")
+            sys.exit(1)
+        logger.info(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ import logging
 from typing import Dict, List, Tuple, Any
 from datasets import load_dataset
 from auto_align.aligner import align_sentences
-from auto_align.evaluation import evaluate_alignment
+from auto_align.evaluation import evaluate_alignment, threshold_sweep
 from auto_align.encoders.encoder_factory import get_encoder
 from auto_align.constants.language_pairs_encoder import LANGUAGE_PAIRS_ENCODER
 
@@ -85,38 +85,40 @@ class FloresEvaluator:
                 
                 split_results = {}
                 
-                for threshold in thresholds:
-                    logger.info(f"  Testing threshold {threshold}")
-                    
-                    start_time = time.time()
-                    
-                    aligned = align_sentences(
-                        source_sentences=src_sent,
-                        target_sentences=tgt_shuffled,
-                        src_lang=src_code.split("_")[0].lower(),
-                        tgt_lang=tgt_code.split("_")[0].lower(),
-                        threshold=threshold
-                    )
-                    
-                    end_time = time.time()
-                    
-                    metrics = evaluate_alignment(
-                        predicted_pairs=aligned,
-                        source_sentences=src_sent,
-                        target_sentences=tgt_shuffled,
-                        gold_pairs=gold_pairs
-                    )
-                    
-                    split_results[threshold] = {
-                        'precision': metrics.get('precision', 0.0),
-                        'recall': metrics.get('recall', 0.0),
-                        'f1': metrics.get('f1', 0.0),
-                        'num_aligned': len(aligned),
+                # One search at the lowest threshold; every other threshold is a score cut-off.
+                logger.info(f"  Aligning once at threshold {min(thresholds)}")
+                
+                start_time = time.time()
+                
+                aligned = align_sentences(
+                    source_sentences=src_sent,
+                    target_sentences=tgt_shuffled,
+                    src_lang=src_code.split("_")[0].lower(),
+                    tgt_lang=tgt_code.split("_")[0].lower(),
+                    threshold=min(thresholds)
+                )
+                
+                end_time = time.time()
+                
+                sweep = threshold_sweep(
+                    predicted_pairs=aligned,
+                    source_sentences=src_sent,
+                    target_sentences=tgt_shuffled,
+                    gold_pairs=gold_pairs,
+                    thresholds=thresholds
+                )
+                
+                for point in sweep['points']:
+                    split_results[point['threshold']] = {
+                        'precision': point['precision'],
+                        'recall': point['recall'],
+                        'f1': point['f1'],
+                        'num_aligned': sum(1 for _, _, score in aligned if score >= point['threshold']),
                         'processing_time': end_time - start_time,
                         'sentences_per_second': len(src_sent) / (end_time - start_time)
                     }
                     
-                    logger.info(f"    P={metrics.get('precision', 0.0):.3f} R={metrics.get('recall', 0.0):.3f} F1={metrics.get('f1', 0.0):.3f}")
+                    logger.info(f"    @{point['threshold']}: P={point['precision']:.3f} R={point['recall']:.3f} F1={point['f1']:.3f}")
                 
                 results[split_name] = split_results
                 
@@ -0,0 +1,237 @@
+"""
+Search-scaling benchmark across index types, corpus sizes and embedding dimensions.
+
+Feeds synthetic L2-normalized embeddings into every available search backend:
+  flat    faiss.IndexFlatIP, exact (what auto_align.aligner uses); also the recall reference
+  torch   blocked torch.mm + topk, exact (what auto_align.aligner_no_faiss uses)
+  ivf     faiss.IndexIVFFlat, inner product, nlist ~ 4*sqrt(n)
+  hnsw    faiss.IndexHNSWFlat, inner product, M=32
+  ivfpq   faiss.IndexIVFPQ, inner product, d/16 sub-quantizers of 8 bits
+and records build time, query throughput, peak RSS, recall@k against flat and
+match@k, the share of queries whose planted counterpart is among the k results.
+Targets are random unit vectors; queries are noisy copies of targets, like
+translations landing near their counterparts. Each run happens in a fresh
+process so peak RSS belongs to one backend.
+
+    python tests/search_benchmark.py --sizes 10000,100000,1000000 --dims 512,768,1024 \\
+        --output search_results.json --plot search_scaling.png
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("flat", "torch", "ivf", "hnsw", "ivfpq")
+SEED = 1234
+QUERY_NOISE = 0.5
+
+
+def make_embeddings(size: int, dim: int, num_queries: int, seed: int = SEED):
+    """
+    (targets, queries, picks) as float32 unit vectors; query i is a noisy copy
+    of targets[picks[i]], its planted match.
+    """
+    rng = np.random.default_rng(seed + size * 7 + dim)
+    targets = rng.standard_normal((size, dim), dtype=np.float32)
+    targets /= np.linalg.norm(targets, axis=1, keepdims=True)
+    picks = rng.choice(size, size=num_queries, replace=False)
+    noise = rng.standard_normal((num_queries, dim), dtype=np.float32)
+    queries = targets[picks] + np.float32(QUERY_NOISE / np.sqrt(dim)) * noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return targets, queries, picks
+
+
+def _rss_mb() -> float:
+    import psutil
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def _build(backend: str, targets: np.ndarray, nprobe: int, ef_search: int):
+    import faiss
+    n, d = targets.shape
+    if backend == "flat":
+        index = faiss.IndexFlatIP(d)
+    elif backend == "hnsw":
+        index = faiss.IndexHNSWFlat(d, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = ef_search
+    elif backend in ("ivf", "ivfpq"):
+        nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatIP(d)
+        if backend == "ivf":
+            index = faiss.IndexIVFFlat(quantizer, d, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, d, nlist, d // 16, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(targets)
+        index.nprobe = nprobe
+    else:
+        raise ValueError(f"Unknown faiss backend '{backend}'")
+    index.add(targets)
+    return index
+
+
+def _torch_search(targets: np.ndarray, queries: np.ndarray, k: int, batch_size: int) -> np.ndarray:
+    import torch
+    tgt = torch.from_numpy(targets)
+    out = []
+    for i in range(0, len(queries), batch_size):
+        scores = torch.mm(torch.from_numpy(queries[i:i + batch_size]), tgt.t())
+        out.append(torch.topk(scores, k, dim=1).indices.numpy())
+    return np.concatenate(out)
+
+
+def run_backend(backend: str, size: int, dim: int, num_queries: int, k: int, batch_size: int,
+                nprobe: int, ef_search: int, truth_path: str) -> Dict[str, float]:
+    """Build and query one backend in the current (fresh) process."""
+    from auto_align.profiling import peak_rss_mb
+
+    targets, queries, picks = make_embeddings(size, dim, num_queries)
+    if backend == "torch":
+        # Import torch and run one small matmul first, so neither is counted as build or search time
+        import torch
+        torch.topk(torch.mm(torch.from_numpy(queries[:batch_size]), torch.from_numpy(targets[:batch_size]).t()),
+                   min(k, len(targets), batch_size), dim=1)
+    rss_before = _rss_mb()
+
+    t0 = time.perf_counter()
+    index = None
+    if backend != "torch":
+        index = _build(backend, targets, nprobe, ef_search)
+    build_s = time.perf_counter() - t0
+    index_mb = _rss_mb() - rss_before
+
+    t0 = time.perf_counter()
+    if index is None:
+        found = _torch_search(targets, queries, k, batch_size)
+    else:
+        found = np.concatenate([index.search(queries[i:i + batch_size], k)[1]
+                                for i in range(0, num_queries, batch_size)])
+    search_s = time.perf_counter() - t0
+
+    if backend == "flat":
+        np.save(truth_path, found)
+        recall = 1.0
+    else:
+        truth = np.load(truth_path)
+        recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(found, truth)]))
+    # What alignment cares about: is the planted match among the k results?
+    hit_rate = float(np.mean((found == picks[:, None]).any(axis=1)))
+
+    return {"backend": backend, "size": size, "dim": dim, "queries": num_queries,
+            "build_s": build_s, "search_s": search_s, "qps": num_queries / search_s if search_s > 0 else None,
+            f"recall_at_{k}": recall, f"match_at_{k}": hit_rate, "index_mb": index_mb, "peak_rss_mb": peak_rss_mb()}
+
+
+def available_backends(requested: List[str]) -> List[str]:
+    # find_spec instead of importing: each case imports its library in its own
+    # spawned worker, so the parent does not need to load torch or faiss at all.
+    backends = []
+    for backend in requested:
+        if importlib.util.find_spec("torch" if backend == "torch" else "faiss") is None:
+            logger.warning(f"Skipping backend '{backend}': its library is not installed")
+        else:
+            backends.append(backend)
+    return backends
+
+
+def format_table(results: List[Dict[str, float]], k: int) -> str:
+    lines = [f"{'backend':<8}{'size':>10}{'dim':>6}{'build s':>10}{'QPS':>11}{f'recall@{k}':>11}{f'match@{k}':>10}"
+             f"{'index MB':>10}{'peak MB':>10}"]
+    for r in results:
+        lines.append(f"{r['backend']:<8}{r['size']:>10}{r['dim']:>6}{r['build_s']:>10.2f}{r['qps'] or 0:>11.0f}"
+                     f"{r[f'recall_at_{k}']:>11.3f}{r[f'match_at_{k}']:>10.3f}{r['index_mb']:>10.0f}{r['peak_rss_mb'] or 0:>10.0f}")
+    return "\n".join(lines)
+
+
+def plot(results: List[Dict[str, float]], k: int, path: str):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError("Plotting needs matplotlib. Install with `pip install matplotlib`.")
+
+    dims = sorted({r["dim"] for r in results})
+    fig, axes = plt.subplots(2, len(dims), figsize=(5 * len(dims), 8), squeeze=False)
+    for col, dim in enumerate(dims):
+        for backend in BACKENDS:
+            rows = sorted((r for r in results if r["dim"] == dim and r["backend"] == backend),
+                          key=lambda r: r["size"])
+            if not rows:
+                continue
+            sizes = [r["size"] for r in rows]
+            axes[0][col].plot(sizes, [r["qps"] for r in rows], marker="o", label=backend)
+            axes[1][col].plot(sizes, [r[f"recall_at_{k}"] for r in rows], marker="o", label=backend)
+        axes[0][col].set(title=f"dim={dim}", xscale="log", yscale="log", ylabel="queries/s")
+        axes[1][col].set(xscale="log", xlabel="corpus size", ylabel=f"recall@{k}")
+        axes[0][col].legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    logger.info(f"Plot saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare search backends on synthetic normalized embeddings.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated target corpus sizes")
+    parser.add_argument("--dims", default="512,768,1024",
+                        help="Comma-separated embedding dimensions (512 SBERT, 768 LaBSE, 1024 LASER)")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help=f"Subset of {', '.join(BACKENDS)}")
+    parser.add_argument("--queries", type=int, default=2000, help="Query vectors per run. Default=2000")
+    parser.add_argument("--topk", "-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--nprobe", type=int, default=16, help="IVF lists probed per query. Default=16")
+    parser.add_argument("--ef-search", type=int, default=64, help="HNSW efSearch. Default=64")
+    parser.add_argument("--output", default="search_benchmark.json")
+    parser.add_argument("--plot", help="Also save QPS and recall curves to this image (needs matplotlib)")
+    args = parser.parse_args()
+
+    requested = [b for b in args.backends.split(",") if b]
+    unknown = set(requested) - set(BACKENDS)
+    if unknown:
+        parser.error(f"Unknown backend(s): {', '.join(sorted(unknown))}")
+    # flat always runs first: its results are the recall reference
+    backends = available_backends(["flat"] + [b for b in requested if b != "flat"])
+    if "flat" not in backends:
+        parser.error("faiss is required for the exact reference search")
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for dim in (int(d) for d in args.dims.split(",") if d):
+            for size in (int(s) for s in args.sizes.split(",") if s):
+                num_queries = min(args.queries, size)
+                truth_path = os.path.join(tmp, f"truth_{size}_{dim}.npy")
+                for backend in backends:
+                    logger.info(f"Running {backend} size={size} dim={dim}")
+                    try:
+                        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                            result = pool.submit(run_backend, backend, size, dim, num_queries, args.topk,
+                                                 args.batch_size, args.nprobe, args.ef_search,
+                                                 truth_path).result()
+                    except Exception as e:
+                        logger.error(f"{backend} size={size} dim={dim} failed: {e}")
+                        continue
+                    if backend != "flat" or "flat" in requested:
+                        results.append(result)
+
+    logger.info("Search scaling:\n" + format_table(results, args.topk))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": results}, f, indent=2)
+    logger.info(f"Results written to {args.output}")
+    if args.plot:
+        plot(results, args.topk, args.plot)
+
+
+if __name__ == "__main__":
+    main()